@@ -1,26 +1,16 @@
-import json
-import boto3
-from botocore.exceptions import ClientError
+from storage import stage_path
+from s3_transfer import S3_BUCKET, create_s3_client, object_key, download_file, download_partitions
+from partitions import RAW_LAYOUT, requested_window
+from instrumentation import run_recorder
 
 
-# Load secrets from secrets.json
-with open('.vscode/secrets.json') as f:
-    secrets = json.load(f)
+s3_client = create_s3_client()
+run_recorder.start('download')
 
 
-
-# Security Credentials
-
-
-access_key = secrets['AWS_ACCESS_KEY']
-secret_key = secrets['AWS_SECRET_KEY']
-
-# Connect with AWS S3 Client
-s3_client = boto3.client(
-    's3',
-    aws_access_key_id=access_key,
-    aws_secret_access_key=secret_key
-    )
-
-
-s3_client.download_file('senticonomy', 'raw_data.csv', 'downloaded_data.csv')  #(Bucket name, File Name, Downloading Path)
+with run_recorder.step('download'):
+    if RAW_LAYOUT == 'partitioned':
+        # Only the monthly partitions overlapping the requested window (RAW_WINDOW_START/END, the watermark)
+        download_partitions(s3_client, 'raw', 'downloaded', *requested_window(), bucket=S3_BUCKET)
+    else:
+        download_file(s3_client, stage_path('downloaded'), S3_BUCKET, object_key(stage_path('raw')))  #(Client, Downloading Path, Bucket name, File Name)
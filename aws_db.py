@@ -1,28 +1,60 @@
 # Import required packages
-import pandas as pd
-import numpy as np
-import os
-import psycopg2
-from datetime import datetime
-from sqlalchemy import create_engine
-import json
+from storage import read_frame, iter_frames
+from db import get_engine, pool_metrics
+from db_schema import (DB_PROCESSED_DATA_TABLE_NAME, TERM_FREQUENCY_TABLE_NAME, TERM_FREQUENCY_COLUMNS,
+                       create_term_frequency_table_sql)
+from bulk_loader import bulk_replace_table, bulk_upsert, bulk_load_table, BULK_LOAD_CHUNK_SIZE
+from incremental import INCREMENTAL_MODE, commit_watermark
+from instrumentation import run_recorder
 
-# Load secrets from secrets.json
-with open('.vscode/secrets.json') as f:
-    secrets = json.load(f)
+run_recorder.start('load')
 
-# PostgreSQL DB Connection Parameters
-DB_HOST = os.getenv("DB_HOST", "database-1.c3eic0i08xdc.ap-south-1.rds.amazonaws.com")
-DB_NAME = os.getenv("DB_NAME", "postgres")
-DB_USER = os.getenv("DB_USER", "postgres")
-DB_PASSWORD = secrets['db_password']
-DB_PORT = os.getenv("DB_PORT", "5432")
+# Pooled engine shared with the rest of the pipeline (connection settings live in db.py)
+engine = get_engine()
 
-engine_string = f'postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
 
-engine = create_engine(engine_string)
+if INCREMENTAL_MODE:
+    # Upsert only the new batch: COPY it into a temporary table, then replace any rows with the same
+    # web_url and refresh the aggregate views in one transaction
+    df = read_frame('final_increment', categorical=False)
+    if df.empty:
+        print("Incremental mode: no new articles to load.")
+    else:
+        raw_conn = engine.raw_connection()
+        try:
+            with run_recorder.step('bulk_upsert', rows=len(df)):
+                rows = bulk_upsert(raw_conn, DB_PROCESSED_DATA_TABLE_NAME, 'web_url', [df], df['category'].unique())
+        finally:
+            raw_conn.close()
+        print(f"Upserted {rows} articles into '{DB_PROCESSED_DATA_TABLE_NAME}'.")
+else:
+    # Full load: stream the final hand-off in batches through COPY into a staging table, index it and
+    # swap it in atomically together with its indexes and aggregate views, so the dashboard never sees
+    # a missing or half-loaded table
+    raw_conn = engine.raw_connection()
+    try:
+        categories = read_frame('final', columns=['category'], categorical=False)['category'].unique()
+        with run_recorder.step('bulk_replace') as measure:
+            rows = bulk_replace_table(raw_conn, DB_PROCESSED_DATA_TABLE_NAME,
+                                      iter_frames('final', batch_size=BULK_LOAD_CHUNK_SIZE, categorical=False),
+                                      categories)
+            measure['rows'] = rows
+    finally:
+        raw_conn.close()
+    print(f"Loaded {rows} articles into '{DB_PROCESSED_DATA_TABLE_NAME}'.")
 
+# Word cloud term counts computed by model.py (small, replaced on every run)
+term_frequencies = read_frame('term_frequencies', categorical=False)
+raw_conn = engine.raw_connection()
+try:
+    with run_recorder.step('term_frequencies_load', rows=len(term_frequencies)):
+        rows = bulk_load_table(raw_conn, TERM_FREQUENCY_TABLE_NAME, create_term_frequency_table_sql(),
+                               TERM_FREQUENCY_COLUMNS, [term_frequencies])
+finally:
+    raw_conn.close()
+print(f"Loaded {rows} term counts into '{TERM_FREQUENCY_TABLE_NAME}'.")
 
-df = pd.read_csv("news_data_final.csv")
+print(f"Connection pool: {pool_metrics(engine)}")
 
-df.to_sql("news_data_final", con=engine, if_exists='replace')
+# The loaded batch is now in the database, so the next run starts after it
+print(f"Watermark: {commit_watermark()}")
@@ -1,7 +1,8 @@
-import os
-import json
-import boto3
 from botocore.exceptions import ClientError
+from storage import stage_path
+from s3_transfer import S3_BUCKET, create_s3_client, upload_file, upload_partitions
+from partitions import RAW_LAYOUT, partition_dir
+from instrumentation import run_recorder
 
 # file_size = os.path.getsize('raw_data.csv')
 
@@ -15,29 +16,17 @@ from botocore.exceptions import ClientError
 # Output: The size of the CSV file is: 325.68 MB
 
 
-# Load secrets from secrets.json
-with open('.vscode/secrets.json') as f:
-    secrets = json.load(f)
+s3_client = create_s3_client()
+run_recorder.start('upload')
 
 
-
-# Security Credentials
-
-
-access_key = secrets['AWS_ACCESS_KEY']
-secret_key = secrets['AWS_SECRET_KEY']
-
-# Connect with AWS S3 Client
-s3_client = boto3.client(
-    's3',
-    aws_access_key_id=access_key,
-    aws_secret_access_key=secret_key
-    )
-
-
-file = "raw_data.csv"
+file = partition_dir('raw') if RAW_LAYOUT == 'partitioned' else stage_path('raw')
 try:
-    s3_client.upload_file(file, 'senticonomy', 'raw_data.csv')
-    print(f"File {file} uploaded successfully to S3 bucket 'senticonomy'")
+    with run_recorder.step('upload'):
+        if RAW_LAYOUT == 'partitioned':
+            upload_partitions(s3_client, 'raw', S3_BUCKET)
+        else:
+            upload_file(s3_client, file, S3_BUCKET)
+    print(f"File {file} uploaded successfully to S3 bucket '{S3_BUCKET}'")
 except ClientError as e:
-    print(f"Error uploading file {file} to S3 bucket 'senticonomy': {e}")
+    print(f"Error uploading file {file} to S3 bucket '{S3_BUCKET}': {e}")
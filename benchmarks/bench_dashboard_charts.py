@@ -0,0 +1,150 @@
+"""
+Benchmark of the per-rerun work of the dashboard's year/month, year/quarter, month/year comparison
+and category bar charts (data_visualisation.py).
+
+"before" is the previous implementation: one boolean mask over the filtered articles per selected
+year x period (or category x year) followed by a groupby. "after" filters the sentiment cube and
+builds every chart with one roll-up (sentiment_cube.py). Building the cube happens once per data
+refresh and is reported separately. Both paths must produce the same traces.
+
+    python benchmarks/bench_dashboard_charts.py --rows 3000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sentiment_cube import (build_cube, filter_cube, category_means_by_period, monthly_means_by_category_year,
+                            category_means_by_year)
+
+
+CATEGORIES = ["Food", "Health", "Science", "Sports", "Technology", "Travel"]
+N_CLUSTERS = 6
+
+
+def synthetic_articles(rows, seed=42):
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp('2015-01-01') + pd.to_timedelta(rng.integers(0, 3800, rows), unit='D')
+    return pd.DataFrame({
+        'date': dates,
+        'category': rng.choice(CATEGORIES, rows),
+        'cluster': rng.integers(0, N_CLUSTERS, rows).astype(np.int16),
+        'compound': rng.uniform(-1, 1, rows).astype(np.float32),
+        'neg': rng.random(rows).astype(np.float32),
+        'neu': rng.random(rows).astype(np.float32),
+        'pos': rng.random(rows).astype(np.float32),
+    })
+
+
+def charts_before(filtered_df, years, months, quarters, categories):
+    """The previous nested loops over the filtered articles, returning {chart: {trace: values}}."""
+    traces = {'month': {}, 'quarter': {}, 'comparison': {}, 'bar': {}}
+    for year in years:
+        for month_num in months:
+            df_month_filtered = filtered_df[(filtered_df['year'] == year) & (filtered_df['month'] == month_num)]
+            if not df_month_filtered.empty:
+                avg_compound = df_month_filtered.groupby(['category'])['compound'].mean().reset_index()
+                traces['month'][(year, month_num)] = avg_compound['compound'].to_numpy()
+    for year in years:
+        for quarter_num in quarters:
+            df_quarter_filtered = filtered_df[(filtered_df['year'] == year) & (filtered_df['quarter'] == quarter_num)]
+            if not df_quarter_filtered.empty:
+                avg_compound = df_quarter_filtered.groupby(['category'])['compound'].mean().reset_index()
+                traces['quarter'][(year, quarter_num)] = avg_compound['compound'].to_numpy()
+    for category in categories:
+        for year in years:
+            df_comp_filtered = filtered_df[(filtered_df['category'] == category) & (filtered_df['year'] == year)]
+            if not df_comp_filtered.empty:
+                avg_compound_comp = df_comp_filtered.groupby(['month'])['compound'].mean().reset_index().sort_values(by='month')
+                traces['comparison'][(category, year)] = avg_compound_comp['compound'].to_numpy()
+    for year in years:
+        category_values = []
+        for category in categories:
+            df_bar_filtered = filtered_df[(filtered_df['category'] == category) & (filtered_df['year'] == year)]
+            if not df_bar_filtered.empty:
+                category_values.append(df_bar_filtered['compound'].mean().round(2))
+            else:
+                category_values.append(0)
+        traces['bar'][year] = np.array(category_values, dtype=np.float64)
+    return traces
+
+
+def charts_after(filtered_cube, years, months, quarters, categories):
+    """The grouped roll-ups of the sentiment cube, returning {chart: {trace: values}}."""
+    traces = {
+        'month': {key: frame['mean_compound'].to_numpy()
+                  for key, frame in category_means_by_period(filtered_cube, 'month', years, months)},
+        'quarter': {key: frame['mean_compound'].to_numpy()
+                    for key, frame in category_means_by_period(filtered_cube, 'quarter', years, quarters)},
+        'comparison': {key: frame['mean_compound'].to_numpy()
+                       for key, frame in monthly_means_by_category_year(filtered_cube, categories, years)},
+    }
+    bar_table = category_means_by_year(filtered_cube, years, categories)
+    traces['bar'] = {year: bar_table.loc[year].to_numpy(dtype=np.float64) for year in years}
+    return traces
+
+
+def count_mismatches(expected, actual):
+    mismatches = 0
+    for chart, expected_traces in expected.items():
+        if list(expected_traces) != list(actual[chart]):
+            mismatches += 1
+            continue
+        for key, values in expected_traces.items():
+            # The bar chart rounds to 2 decimals, a mean right at a rounding boundary may differ by 0.01
+            atol = 0.010001 if chart == 'bar' else 1e-6
+            if not np.allclose(values, actual[chart][key], atol=atol):
+                mismatches += 1
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=3000000, help="Number of synthetic articles")
+    parser.add_argument('--reruns', type=int, default=3, help="Timed reruns per implementation")
+    args = parser.parse_args()
+
+    df = synthetic_articles(args.rows)
+    start_date, end_date = df['date'].min().date(), df['date'].max().date()
+    categories, clusters = CATEGORIES, list(range(N_CLUSTERS))
+    print(f"{len(df)} articles, {df['date'].dt.year.nunique()} years")
+
+    start = time.perf_counter()
+    cube = build_cube(df)
+    cube_seconds = time.perf_counter() - start
+    print(f"Cube build (once per data refresh): {cube_seconds:.2f} s, {len(cube)} cells")
+
+    # The previous dashboard added the calendar columns to the loaded frame once, outside the reruns
+    df = df.assign(year=df['date'].dt.year, month=df['date'].dt.month, quarter=df['date'].dt.quarter)
+    years = sorted(df['year'].unique().tolist())
+    months, quarters = list(range(1, 13)), [1, 2, 3, 4]
+
+    before_times, after_times = [], []
+    for _ in range(args.reruns):
+        start = time.perf_counter()
+        filtered_df = df[(df['date'] >= pd.to_datetime(start_date)) & (df['date'] <= pd.to_datetime(end_date))]
+        filtered_df = filtered_df[filtered_df['category'].isin(categories) & filtered_df['cluster'].isin(clusters)]
+        expected = charts_before(filtered_df, years, months, quarters, categories)
+        before_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        filtered_cube = filter_cube(cube, start_date, end_date, categories, clusters)
+        actual = charts_after(filtered_cube, years, months, quarters, categories)
+        after_times.append(time.perf_counter() - start)
+
+    before, after = min(before_times), min(after_times)
+    mismatches = count_mismatches(expected, actual)
+    print(f"Per rerun, nested loops over articles : {before:.3f} s")
+    print(f"Per rerun, grouped cube roll-ups      : {after:.3f} s ({before / after:.0f}x faster)")
+    print(f"Mismatching traces                    : {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark of the headline 'main' extraction used in data_cleaning.py.
+
+Compares the previous per-row ast.literal_eval against headline_parser.extract_main_headlines
+on the same sample. That both return identical headlines is tested in tests/test_headline_parser.py.
+
+    python benchmarks/bench_headline_parser.py --rows 1000000
+    python benchmarks/bench_headline_parser.py --from-data --rows 200000
+"""
+import argparse
+import ast
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from headline_parser import extract_main_headlines
+
+
+# Headline dicts as they appear in nyt-metadata.csv, including the quoting and escaping variants
+SAMPLE_HEADLINES = [
+    "{'main': 'Apple Unveils a Bigger iPhone', 'kicker': None, 'content_kicker': None, 'print_headline': 'Apple Unveils a Bigger iPhone', 'name': None, 'seo': None, 'sub': None}",
+    "{'main': 'A Chef’s Guide to Summer Tomatoes', 'kicker': 'Eat', 'content_kicker': None, 'print_headline': 'Summer Tomatoes', 'name': None, 'seo': None, 'sub': None}",
+    "{'main': \"Serena Williams's Comeback Bid Ends in Paris\", 'kicker': None, 'content_kicker': None, 'print_headline': None, 'name': None, 'seo': None, 'sub': None}",
+    "{'main': 'The \"Best\" Time to Visit Japan\\'s Temples', 'kicker': None, 'content_kicker': None, 'print_headline': None, 'name': None, 'seo': None, 'sub': None}",
+    "{'main': 'Measles Cases Rise Again\\nIn 2019', 'kicker': None, 'content_kicker': None, 'print_headline': None, 'name': None, 'seo': None, 'sub': None}",
+    "{'main': None, 'kicker': None, 'content_kicker': None, 'print_headline': 'Corrections', 'name': None, 'seo': None, 'sub': None}",
+    "{'main': '', 'kicker': None, 'content_kicker': None, 'print_headline': None, 'name': None, 'seo': None, 'sub': None}",
+    "{'print_headline': 'Keys in a Different Order', 'main': 'Keys in a Different Order', 'kicker': None}",
+]
+
+
+def load_sample(rows, from_data):
+    if from_data:
+        from storage import read_frame
+        headlines = read_frame('downloaded', columns=['headline'])['headline']
+        return headlines.sample(n=min(rows, len(headlines)), random_state=42).reset_index(drop=True)
+    repeats = rows // len(SAMPLE_HEADLINES) + 1
+    return pd.Series(SAMPLE_HEADLINES * repeats).head(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=500000, help="Number of headlines to parse")
+    parser.add_argument('--from-data', action='store_true', help="Sample real headlines from the downloaded hand-off")
+    args = parser.parse_args()
+
+    headlines = load_sample(args.rows, args.from_data)
+    print(f"Parsing {len(headlines)} headlines")
+
+    start = time.perf_counter()
+    headlines.apply(lambda x: ast.literal_eval(x)['main'])
+    literal_eval_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    extract_main_headlines(headlines)
+    fast_seconds = time.perf_counter() - start
+
+    print(f"ast.literal_eval per row : {literal_eval_seconds:.2f} s")
+    print(f"extract_main_headlines   : {fast_seconds:.2f} s ({literal_eval_seconds / fast_seconds:.1f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+import io
+import csv
+import os
+import db_schema
+from instrumentation import run_recorder
+
+
+# --- Bulk Loader Configuration ---
+# Rows are streamed into PostgreSQL with COPY FROM STDIN, BULK_LOAD_CHUNK_SIZE rows per COPY.
+BULK_LOAD_CHUNK_SIZE = int(os.getenv("BULK_LOAD_CHUNK_SIZE", "50000"))
+
+STAGING_SUFFIX = '_staging'
+
+# Written for missing values (NaN, None). Non-numeric values are quoted, so FORCE_NULL makes COPY
+# match the quoted marker too, while an empty string stays an empty string.
+COPY_NULL_MARKER = r'\N'
+
+
+def copy_frames(cur, table_name, columns, frames, chunk_size=None):
+    """
+    Streams DataFrames into a table with COPY FROM STDIN, at most chunk_size rows per COPY so the
+    CSV buffer stays small. Returns the number of rows copied.
+    """
+    chunk_size = chunk_size or BULK_LOAD_CHUNK_SIZE
+    column_list = ', '.join(f'"{col}"' for col in columns)
+    copy_sql = (f"COPY {table_name} ({column_list}) FROM STDIN "
+                f"WITH (FORMAT csv, NULL '{COPY_NULL_MARKER}', FORCE_NULL ({column_list}))")
+
+    rows_copied = 0
+    for frame in frames:
+        for start in range(0, len(frame), chunk_size):
+            rows = min(chunk_size, len(frame) - start)
+            buffer = io.StringIO()
+            with run_recorder.step('copy_serialize_csv', rows=rows):
+                frame[columns].iloc[start:start + chunk_size].to_csv(
+                    buffer, index=False, header=False, quoting=csv.QUOTE_NONNUMERIC, na_rep=COPY_NULL_MARKER)
+                buffer.seek(0)
+            with run_recorder.step('copy_from_stdin', rows=rows):
+                cur.copy_expert(copy_sql, buffer)
+            rows_copied += rows
+    return rows_copied
+
+
+def bulk_replace_table(raw_conn, table_name, frames, categories):
+    """
+    Replaces the managed table (see db_schema) without it ever being missing for readers:
+    1. create a staging table and COPY all rows into it,
+    2. build the indexes and aggregate views on the staging table,
+    3. in one transaction, drop the old table (and its views) and rename every staging object.
+    raw_conn is a DB-API (psycopg2) connection, categories the category values present in frames.
+    Returns the number of rows loaded.
+    """
+    staging_table = f"{table_name}{STAGING_SUFFIX}"
+    cur = raw_conn.cursor()
+    try:
+        db_schema.ensure_types(cur, categories)
+        raw_conn.commit()
+
+        cur.execute(f"DROP TABLE IF EXISTS {staging_table} CASCADE;")
+        cur.execute(db_schema.create_table_sql(staging_table))
+        rows_loaded = copy_frames(cur, staging_table, db_schema.LOADED_COLUMNS, frames)
+        raw_conn.commit()
+
+        # Indexes and views are cheaper to build once over the loaded table than to maintain row by row
+        for statement in db_schema.create_indexes_sql(staging_table):
+            cur.execute(statement)
+        cur.execute(f"ANALYZE {staging_table};")
+        for statement in db_schema.create_views_sql(staging_table, view_suffix=STAGING_SUFFIX):
+            cur.execute(statement)
+        raw_conn.commit()
+
+        cur.execute(f"DROP TABLE IF EXISTS {table_name} CASCADE;")
+        for kind, staging_name, final_name in db_schema.staged_renames(table_name, STAGING_SUFFIX):
+            cur.execute(f"ALTER {kind} {staging_name} RENAME TO {final_name};")
+        db_schema.record_data_version(cur)
+        raw_conn.commit()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return rows_loaded
+
+
+def bulk_load_table(raw_conn, table_name, create_statements, columns, frames):
+    """
+    Replaces a small table in a single transaction: drop, create (create_statements may include
+    its indexes) and COPY. Readers see either the old or the new rows. Returns the number of rows loaded.
+    """
+    cur = raw_conn.cursor()
+    try:
+        cur.execute(f"DROP TABLE IF EXISTS {table_name};")
+        for statement in create_statements:
+            cur.execute(statement)
+        rows_loaded = copy_frames(cur, table_name, columns, frames)
+        db_schema.record_data_version(cur)
+        raw_conn.commit()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return rows_loaded
+
+
+def bulk_upsert(raw_conn, table_name, key_column, frames, categories):
+    """
+    Upserts rows of the managed table by key_column: COPY them into a temporary table, then delete
+    the matching rows, insert the new ones and refresh the aggregate views in one transaction.
+    Returns the number of rows upserted.
+    """
+    temp_table = f"{table_name}_increment"
+    columns = db_schema.LOADED_COLUMNS
+    column_list = ', '.join(f'"{col}"' for col in columns)
+    cur = raw_conn.cursor()
+    try:
+        db_schema.ensure_types(cur, categories)
+        raw_conn.commit()
+
+        cur.execute(f"CREATE TEMP TABLE {temp_table} (LIKE {table_name}) ON COMMIT DROP;")
+        rows_loaded = copy_frames(cur, temp_table, columns, frames)
+        cur.execute(f'DELETE FROM {table_name} WHERE "{key_column}" IN (SELECT "{key_column}" FROM {temp_table});')
+        cur.execute(f"INSERT INTO {table_name} ({column_list}) SELECT {column_list} FROM {temp_table};")
+        db_schema.refresh_views(cur)
+        db_schema.record_data_version(cur)
+        raw_conn.commit()
+    except Exception:
+        raw_conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return rows_loaded
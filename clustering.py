@@ -0,0 +1,170 @@
+import os
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+from sklearn.metrics.pairwise import euclidean_distances
+from parallel import worker_pool
+
+
+# --- Clustering Configuration ---
+# 'kmeans' runs full Lloyd iterations over the whole matrix (the original behaviour).
+# 'minibatch' streams chunks of document vectors through MiniBatchKMeans.partial_fit,
+# so runtime and memory scale with the chunk size instead of the corpus.
+CLUSTERING_ENGINE = os.getenv("CLUSTERING_ENGINE", "kmeans")
+CLUSTERING_CHUNK_SIZE = int(os.getenv("CLUSTERING_CHUNK_SIZE", "50000"))
+MINIBATCH_EPOCHS = int(os.getenv("MINIBATCH_EPOCHS", "2"))
+KMEANS_RANDOM_STATE = 42
+KMEANS_N_INIT = 10
+CLUSTERING_ENGINES = ('kmeans', 'minibatch')
+
+# Number of clusters: 'categories' (one per news category, the original behaviour),
+# 'auto' (K selection on a stratified sample, see select_k) or a fixed integer
+N_CLUSTERS = os.getenv("N_CLUSTERS", "categories")
+K_SELECTION_MIN = int(os.getenv("K_SELECTION_MIN", "2"))
+K_SELECTION_MAX = int(os.getenv("K_SELECTION_MAX", "12"))
+K_SELECTION_SAMPLE_SIZE = int(os.getenv("K_SELECTION_SAMPLE_SIZE", "20000"))
+K_SELECTION_SILHOUETTE_SIZE = int(os.getenv("K_SELECTION_SILHOUETTE_SIZE", "5000"))
+K_SELECTION_WORKERS = int(os.getenv("K_SELECTION_WORKERS", str(os.cpu_count() or 1)))
+
+
+def iter_row_chunks(document_vectors, chunk_size=None):
+    """Yields consecutive row slices of a (sparse) document matrix."""
+    chunk_size = chunk_size or CLUSTERING_CHUNK_SIZE
+    for start in range(0, document_vectors.shape[0], chunk_size):
+        yield document_vectors[start:start + chunk_size]
+
+
+def assign_clusters(cluster_centers, chunks):
+    """
+    Assigns every document of a stream of chunks to its nearest centroid.
+    Returns (labels, inertia), inertia being the sum of squared distances to the assigned
+    centroids, i.e. the same quantity as KMeans.inertia_.
+    """
+    labels = []
+    inertia = 0.0
+    for chunk in chunks:
+        distances = euclidean_distances(chunk, cluster_centers, squared=True)
+        chunk_labels = distances.argmin(axis=1)
+        labels.append(chunk_labels)
+        inertia += float(distances[np.arange(len(chunk_labels)), chunk_labels].sum())
+    if not labels:
+        return np.empty(0, dtype=np.int64), 0.0
+    return np.concatenate(labels), inertia
+
+
+def fit_minibatch(make_chunks, n_clusters, epochs=None):
+    """
+    Fits MiniBatchKMeans with partial_fit over streamed chunks. make_chunks is called once per
+    epoch and must return a fresh iterator of document vector chunks.
+    """
+    epochs = epochs or MINIBATCH_EPOCHS
+    model = MiniBatchKMeans(n_clusters=n_clusters, random_state=KMEANS_RANDOM_STATE, n_init=3)
+    for _ in range(epochs):
+        for chunk in make_chunks():
+            if chunk.shape[0] >= n_clusters or hasattr(model, 'cluster_centers_'):
+                model.partial_fit(chunk)
+    return model
+
+
+def fit_clusters(document_vectors, n_clusters, engine=None, chunk_size=None):
+    """
+    Clusters documents with the selected engine. document_vectors is either a document matrix or
+    a callable returning a fresh iterator of document vector chunks (e.g. a streaming feature
+    extractor), which the minibatch engine consumes without ever building the full matrix.
+    Returns (model, labels, inertia). Inertia is computed the same way for both engines.
+    """
+    engine = engine or CLUSTERING_ENGINE
+    if engine not in CLUSTERING_ENGINES:
+        raise ValueError(f"Unknown clustering engine '{engine}'. Expected one of {CLUSTERING_ENGINES}.")
+
+    if callable(document_vectors):
+        make_chunks = document_vectors
+    else:
+        make_chunks = lambda: iter_row_chunks(document_vectors, chunk_size)
+
+    if engine == 'kmeans':
+        matrix = sp.vstack(list(make_chunks())).tocsr() if callable(document_vectors) else document_vectors
+        model = KMeans(n_clusters=n_clusters, random_state=KMEANS_RANDOM_STATE, n_init=KMEANS_N_INIT)
+        labels = model.fit_predict(matrix)
+        return model, labels, float(model.inertia_)
+
+    model = fit_minibatch(make_chunks, n_clusters)
+    labels, inertia = assign_clusters(model.cluster_centers_, make_chunks())
+    return model, labels, inertia
+
+
+def update_centroids(cluster_centers, cluster_counts, chunks):
+    """
+    Online update of saved centroids with a new batch, without revisiting earlier documents.
+    Each centroid moves to the running mean of all documents assigned to it so far.
+    Returns (new_centers, new_counts, labels, inertia); inertia is measured before the update.
+    """
+    centers = np.array(cluster_centers, dtype=np.float64)
+    counts = np.array(cluster_counts, dtype=np.float64)
+    labels = []
+    inertia = 0.0
+    for chunk in chunks:
+        distances = euclidean_distances(chunk, centers, squared=True)
+        chunk_labels = distances.argmin(axis=1)
+        inertia += float(distances[np.arange(len(chunk_labels)), chunk_labels].sum())
+        labels.append(chunk_labels)
+
+        for cluster in np.unique(chunk_labels):
+            members = chunk[chunk_labels == cluster]
+            n_new = members.shape[0]
+            member_sum = np.asarray(members.sum(axis=0)).ravel()
+            centers[cluster] = (centers[cluster] * counts[cluster] + member_sum) / (counts[cluster] + n_new)
+            counts[cluster] += n_new
+
+    labels = np.concatenate(labels) if labels else np.empty(0, dtype=np.int64)
+    return centers, counts.astype(np.int64), labels, inertia
+
+
+def stratified_sample(strata, sample_size, random_state=KMEANS_RANDOM_STATE):
+    """
+    Returns sorted positional indices of a sample of about sample_size rows that keeps the
+    proportions of each stratum (e.g. news category).
+    """
+    strata = pd.Series(np.asarray(strata))
+    if len(strata) <= sample_size:
+        return np.arange(len(strata))
+    fraction = sample_size / len(strata)
+    sampled = strata.groupby(strata, sort=False).sample(frac=fraction, random_state=random_state)
+    return np.sort(sampled.index.to_numpy())
+
+
+def _evaluate_k(sample_vectors, k):
+    """Fits K-Means with k clusters on the sample and scores it with inertia and silhouette."""
+    model = KMeans(n_clusters=k, random_state=KMEANS_RANDOM_STATE, n_init=KMEANS_N_INIT)
+    labels = model.fit_predict(sample_vectors)
+    silhouette = silhouette_score(sample_vectors, labels,
+                                  sample_size=min(K_SELECTION_SILHOUETTE_SIZE, sample_vectors.shape[0]),
+                                  random_state=KMEANS_RANDOM_STATE)
+    return {'k': int(k), 'inertia': float(model.inertia_), 'silhouette': float(silhouette)}
+
+
+def evaluate_k_range(sample_vectors, k_values, n_workers=None):
+    """Evaluates every candidate K on the sample in parallel. Returns the curve as a list of dicts."""
+    n_workers = n_workers or K_SELECTION_WORKERS
+    candidates = list(k_values)
+    k_values = [k for k in candidates if 1 < k < sample_vectors.shape[0]]
+    if not k_values:
+        raise ValueError(f"No candidate K in {candidates} fits a sample of {sample_vectors.shape[0]} rows: "
+                         f"K selection needs 1 < K < number of sampled rows.")
+    if n_workers == 1 or len(k_values) == 1:
+        return [_evaluate_k(sample_vectors, k) for k in k_values]
+    with worker_pool(min(n_workers, len(k_values))) as executor:
+        return list(executor.map(_evaluate_k, [sample_vectors] * len(k_values), k_values))
+
+
+def select_k(sample_vectors, k_values=None, n_workers=None):
+    """
+    Picks the number of clusters with the best silhouette on the sample.
+    Returns (best_k, curve).
+    """
+    k_values = k_values or range(K_SELECTION_MIN, K_SELECTION_MAX + 1)
+    curve = evaluate_k_range(sample_vectors, k_values, n_workers)
+    best = max(curve, key=lambda point: point['silhouette'])
+    return best['k'], curve
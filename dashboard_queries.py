@@ -0,0 +1,233 @@
+import os
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from db_schema import (DB_PROCESSED_DATA_TABLE_NAME, CATEGORY_TYPE_NAME, TERM_FREQUENCY_TABLE_NAME,
+                       DATA_VERSION_TABLE_NAME)
+from storage import read_frame, filter_dataframe, take_rows
+from sentiment_cube import CUBE_KEYS, CUBE_MEASURES, CUBE_SOURCE_COLUMNS, build_cube, add_calendar_columns
+
+
+# --- Dashboard Query Layer ---
+# The dashboard describes what it shows with the same (column, op, value) filter tuples as
+# storage.read_frame. For the database they become a parameterized WHERE clause, for the final
+# stage hand-off they are pushed down to the Parquet row groups. Either way only the requested
+# columns of the matching rows are fetched.
+
+# Base columns of the dashboard frame. Text columns (headline, content) are only fetched for the
+# charts that show them.
+BASE_COLUMNS = ['date', 'category', 'cluster', 'compound']
+
+# Casts applied to list parameters so comparisons use the column types (and their indexes)
+ARRAY_CASTS = {'category': f'{CATEGORY_TYPE_NAME}[]', 'cluster': 'SMALLINT[]'}
+
+SQL_OPERATORS = {'==': '=', '=': '=', '!=': '<>', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+
+# --- Compact Frames ---
+# st.cache_data hands every rerun of every session its own copy of a cached frame, so the frames the
+# dashboard keeps (the sentiment cube and the article rows) use the smallest dtypes that hold their
+# values and categoricals for low-cardinality strings. Sums of the cube stay float64 for precision.
+# Set DASHBOARD_COMPACT_FRAMES=false to keep the source dtypes.
+COMPACT_FRAMES = os.getenv("DASHBOARD_COMPACT_FRAMES", "true").lower() in ('1', 'true', 'yes')
+COMPACT_DTYPES = {
+    'year': np.int16, 'month': np.int8, 'quarter': np.int8, 'day': np.int8, 'cluster': np.int16,
+    'n_articles': np.int32, 'compound': np.float32, 'neg': np.float32, 'neu': np.float32, 'pos': np.float32,
+    'min_compound': np.float32, 'max_compound': np.float32,
+}
+CATEGORICAL_COLUMNS = ['category', 'day_of_week']
+
+
+def article_filters(start_date, end_date, categories, clusters):
+    """Filter tuples for the dashboard's global filters."""
+    return [
+        ('date', '>=', start_date),
+        ('date', '<=', end_date),
+        ('category', 'in', list(categories)),
+        ('cluster', 'in', list(clusters)),
+    ]
+
+
+def term_filters(start_date, end_date, categories, clusters):
+    """
+    Filter tuples of the term frequency table for the global filters. Term counts are kept per
+    year, so the date range is applied at year granularity.
+    """
+    return [
+        ('year', '>=', start_date.year),
+        ('year', '<=', end_date.year),
+        ('category', 'in', list(categories)),
+        ('cluster', 'in', list(clusters)),
+    ]
+
+
+def build_where_clause(filters):
+    """
+    Translates filter tuples into a SQL WHERE clause with bind parameters.
+    Returns (clause, params); clause is empty when there are no filters.
+    """
+    conditions = []
+    params = {}
+    for i, (column, op, value) in enumerate(filters or []):
+        param = f"p{i}"
+        if op in ('in', 'not in'):
+            array = f"CAST(:{param} AS {ARRAY_CASTS[column]})" if column in ARRAY_CASTS else f":{param}"
+            condition = f'"{column}" = ANY({array})'
+            conditions.append(condition if op == 'in' else f"NOT ({condition})")
+            params[param] = list(value)
+        elif op in SQL_OPERATORS:
+            conditions.append(f'"{column}" {SQL_OPERATORS[op]} :{param}')
+            params[param] = value
+        else:
+            raise ValueError(f"Unsupported filter operator '{op}'.")
+    clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+    return clause, params
+
+
+def _has_empty_selection(filters):
+    """An empty 'in' list matches nothing, there is no need to query."""
+    return any(op == 'in' and len(value) == 0 for _, op, value in filters or [])
+
+
+def _finish_frame(df):
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def compact_frame(df):
+    """Downcasts the known numeric columns and encodes the low-cardinality string columns as categoricals."""
+    if not COMPACT_FRAMES:
+        return df
+    dtypes = {col: dtype for col, dtype in COMPACT_DTYPES.items() if col in df.columns}
+    dtypes.update({col: 'category' for col in CATEGORICAL_COLUMNS if col in df.columns})
+    return df.astype(dtypes)
+
+
+def memory_report(df):
+    """Per-column memory of a frame in bytes, string payloads included, plus the index and the total."""
+    usage = df.memory_usage(deep=True)
+    report = {('index' if col == 'Index' else col): int(nbytes) for col, nbytes in usage.items()}
+    report['total'] = int(usage.sum())
+    return report
+
+
+# --- PostgreSQL source ---
+def query_filter_options(engine):
+    """Date range, categories and clusters for the global filter widgets, read from the daily aggregate view."""
+    with engine.connect() as conn:
+        min_date, max_date = conn.execute(text("SELECT MIN(date), MAX(date) FROM news_sentiment_daily;")).one()
+        categories = conn.execute(text("SELECT DISTINCT category::TEXT FROM news_sentiment_daily;")).scalars().all()
+        clusters = conn.execute(text("SELECT DISTINCT cluster FROM news_sentiment_daily;")).scalars().all()
+    return {'min_date': min_date, 'max_date': max_date,
+            'categories': sorted(categories), 'clusters': sorted(clusters)}
+
+
+def query_data_version(engine):
+    """
+    Time of the last load recorded by the loaders. Databases loaded before the version table existed
+    fall back to the row count and date range of the daily aggregate view.
+    """
+    with engine.connect() as conn:
+        if conn.execute(text("SELECT to_regclass(:name);"), {'name': DATA_VERSION_TABLE_NAME}).scalar() is not None:
+            return str(conn.execute(text(f"SELECT refreshed_at FROM {DATA_VERSION_TABLE_NAME};")).scalar())
+        return str(tuple(conn.execute(text(
+            "SELECT SUM(n_articles), MIN(date), MAX(date) FROM news_sentiment_daily;")).one()))
+
+
+def query_cube(engine):
+    """The sentiment cube (see sentiment_cube.py), served by the daily aggregate view."""
+    column_list = ', '.join(CUBE_KEYS[:1] + ['category::TEXT AS category'] + CUBE_KEYS[2:] + CUBE_MEASURES)
+    with engine.connect() as conn:
+        return add_calendar_columns(pd.read_sql_query(text(f"SELECT {column_list} FROM news_sentiment_daily;"), conn))
+
+
+def query_articles(engine, columns, filters=None):
+    """Fetches only the given columns of the articles matching the filters."""
+    if _has_empty_selection(filters):
+        return pd.DataFrame(columns=columns)
+    where, params = build_where_clause(filters)
+    column_list = ', '.join(f'"{col}"' for col in columns)
+    query = text(f"SELECT {column_list} FROM {DB_PROCESSED_DATA_TABLE_NAME} {where};")
+    with engine.connect() as conn:
+        return _finish_frame(pd.read_sql_query(query, conn, params=params))
+
+
+def query_top_articles(engine, columns, filters, n, ascending=False):
+    """
+    The n most positive (or most negative) articles matching the filters. The compound index lets
+    Postgres stop after the first n matching rows instead of sorting them all.
+    """
+    if _has_empty_selection(filters):
+        return pd.DataFrame(columns=columns)
+    where, params = build_where_clause(filters)
+    column_list = ', '.join(f'"{col}"' for col in columns)
+    order = 'ASC' if ascending else 'DESC'
+    query = text(f"SELECT {column_list} FROM {DB_PROCESSED_DATA_TABLE_NAME} {where} "
+                 f"ORDER BY compound {order} LIMIT :limit;")
+    with engine.connect() as conn:
+        return _finish_frame(pd.read_sql_query(query, conn, params={**params, 'limit': int(n)}))
+
+
+def query_term_frequencies(engine, source, filters, by):
+    """Term counts of one text source summed per value of the 'by' column over the matching groups."""
+    if _has_empty_selection(filters):
+        return pd.DataFrame(columns=[by, 'term', 'count'])
+    where, params = build_where_clause([('source', '==', source)] + list(filters))
+    query = text(f'SELECT "{by}", term, SUM(count) AS count FROM {TERM_FREQUENCY_TABLE_NAME} {where} '
+                 f'GROUP BY "{by}", term;')
+    with engine.connect() as conn:
+        return pd.read_sql_query(query, conn, params=params)
+
+
+# --- Final stage hand-off source ---
+def read_filter_options():
+    """Same as query_filter_options for the final stage hand-off."""
+    df = read_frame('final', columns=['date', 'category', 'cluster'], categorical=False)
+    return {'min_date': df['date'].min().date(), 'max_date': df['date'].max().date(),
+            'categories': sorted(df['category'].unique().tolist()),
+            'clusters': sorted(df['cluster'].unique().tolist())}
+
+
+def read_cube():
+    """Same as query_cube for the final stage hand-off, aggregated from the articles."""
+    return build_cube(read_frame('final', columns=CUBE_SOURCE_COLUMNS, categorical=False))
+
+
+def read_articles(columns, filters=None):
+    """Same as query_articles for the final stage hand-off."""
+    if _has_empty_selection(filters):
+        return pd.DataFrame(columns=columns)
+    return _finish_frame(read_frame('final', columns=columns, filters=filters, categorical=False))
+
+
+def read_term_frequencies(source, filters, by):
+    """Same as query_term_frequencies for the term frequency hand-off written by model.py."""
+    if _has_empty_selection(filters):
+        return pd.DataFrame(columns=[by, 'term', 'count'])
+    return read_frame('term_frequencies', columns=[by, 'term', 'count'],
+                      filters=[('source', '==', source)] + list(filters), categorical=False)
+
+
+def top_k_positions(values, k, ascending=False):
+    """Positions of the k largest (or smallest) values, best first, by partial selection in O(n)."""
+    k = min(int(k), len(values))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    keyed = np.asarray(values) if ascending else -np.asarray(values)
+    winners = np.argpartition(keyed, k - 1)[:k]
+    return winners[np.argsort(keyed[winners], kind='stable')]
+
+
+def read_top_articles(columns, filters, n, ascending=False):
+    """
+    Same as query_top_articles for the final stage hand-off: the winners are selected on the
+    filter and compound columns, then only their rows are read for the requested (text) columns.
+    """
+    if _has_empty_selection(filters):
+        return pd.DataFrame(columns=columns)
+    key_columns = sorted({column for column, _, _ in filters or []} | {'compound'})
+    # Positions, not saved labels: a CSV hand-off is read back with its (non-contiguous) saved index
+    key_frame = read_frame('final', columns=key_columns, categorical=False).reset_index(drop=True)
+    candidates = filter_dataframe(key_frame, filters or [])
+    winners = candidates.index.to_numpy()[top_k_positions(candidates['compound'].to_numpy(), n, ascending)]
+    return _finish_frame(take_rows('final', winners, columns=columns).reset_index(drop=True))
@@ -1,12 +1,32 @@
 import pandas as pd
-import ast
 import numpy as np
 import os
-
-
-# Read csv file and store as Dataframe
-uncleaned_data = pd.read_csv('downloaded_data.csv')
-df = pd.DataFrame(uncleaned_data)
+from headline_parser import extract_main_headlines
+from storage import read_frame, write_frame, stage_path
+from incremental import INCREMENTAL_MODE, get_watermark, watermark_filters, set_pending_watermark
+from partitions import RAW_LAYOUT, requested_window, read_partitions
+from instrumentation import run_recorder
+
+
+run_recorder.start('clean')
+
+
+# Read the downloaded raw hand-off and store as Dataframe
+# In incremental mode only the rows published after the watermark are read (pushed down to the reader)
+if INCREMENTAL_MODE:
+    print(f"Incremental mode: cleaning articles published at or after {get_watermark()}")
+with run_recorder.step('read_downloaded') as measure:
+    if RAW_LAYOUT == 'partitioned':
+        # Only the monthly partitions overlapping the requested window are opened
+        uncleaned_data = read_partitions('downloaded', *requested_window(),
+                                         filters=watermark_filters() if INCREMENTAL_MODE else None)
+    elif INCREMENTAL_MODE:
+        uncleaned_data = read_frame('downloaded', filters=watermark_filters())
+    else:
+        uncleaned_data = read_frame('downloaded')
+    df = pd.DataFrame(uncleaned_data)
+    measure['rows'] = len(df)
+print(f"Rows to clean: {len(df)}")
 
 
 pd.set_option('display.max_colwidth', None)
@@ -15,13 +35,12 @@ pd.set_option('display.max_colwidth', None)
 # print(df.info())
 
 
-# Drop the column name "Unnamed"
-df.drop(['Unnamed: 0'], axis=1, inplace=True)
-
-
 # convert the date into datetime format
 df['pub_date'] = pd.to_datetime(df['pub_date'])
 
+# Newest article of this batch, becomes the watermark once aws_db.py has loaded it
+set_pending_watermark(df['pub_date'].max())
+
 
 # Extract day, month, year and time from 'pub_date' column for better analysis
 
@@ -36,7 +55,9 @@ df['time'] = df['pub_date'].dt.time
 
 
 # Extract main Headline from headline column which has dictionary type of data
-df['headline'] = df['headline'].apply(lambda x: ast.literal_eval(x)['main'])
+# (vectorized regex extract, with ast.literal_eval only for rows the fast path can't handle)
+with run_recorder.step('headline_extract', rows=len(df)):
+    df['headline'] = extract_main_headlines(df['headline'])
 
 
 
@@ -71,14 +92,16 @@ print(df.isnull().sum())
 
 new_df = df[['date', 'time', 'headline', 'content', 'web_url', 'category', 'day', 'month', 'day_of_week', 'year']]
 
-new_df.to_csv('cleaned_news_data.csv')
+with run_recorder.step('write_cleaned', rows=len(new_df)):
+    write_frame(new_df, 'cleaned')
 
 
-file_size = os.path.getsize('cleaned_news_data.csv')
+file_size = os.path.getsize(stage_path('cleaned'))
+run_recorder.count('cleaned_bytes', file_size)
 
 if file_size < 1024:
-    print(f"The size of the CSV file is: {file_size} bytes")
+    print(f"The size of the cleaned data file is: {file_size} bytes")
 elif file_size < 1024 ** 2:
-    print(f"The size of the CSV file is: {file_size / 1024:.2f} KB")
+    print(f"The size of the cleaned data file is: {file_size / 1024:.2f} KB")
 else:
-    print(f"The size of the CSV file is: {file_size / (1024 ** 2):.2f} MB")
+    print(f"The size of the cleaned data file is: {file_size / (1024 ** 2):.2f} MB")
@@ -1,9 +1,12 @@
+import os
 import zipfile
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
 import pytz
+from storage import FrameWriter, write_frame, stage_path
+from partitions import RAW_LAYOUT, export_partitions
+from instrumentation import run_recorder
 
 
 
@@ -12,58 +15,105 @@ import pytz
 # kaggle datasets download -d aryansingh0909/nyt-articles-21m-2000-present
 
 
+# --- Ingestion Configuration ---
+# Streaming mode reads nyt-metadata.csv straight out of the zip member in chunks and
+# only parses the columns we keep, so peak memory is bounded by CHUNK_SIZE rows. Each filtered
+# chunk is appended to the raw hand-off (a Parquet row group by default, see storage.py).
+# Set STREAMING_MODE=0 to fall back to extracting and loading the whole file.
+STREAMING_MODE = os.getenv("STREAMING_MODE", "1") == "1"
+CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "200000"))
 
-# Unzip the downloaded file
-with zipfile.ZipFile('nyt-articles-21m-2000-present.zip', 'r') as zip_ref:
-    zip_ref.extractall()
+ZIP_FILE = 'nyt-articles-21m-2000-present.zip'
+CSV_MEMBER = 'nyt-metadata.csv'
+OUTPUT_FILE = stage_path('raw')
 
-#Read CSV file using pandas library
-data = pd.read_csv('nyt-metadata.csv')
-# print(data.info())
+# Columns kept from the dump, every other column is dropped
+KEEP_COLUMNS = ['pub_date', 'headline', 'abstract', 'lead_paragraph', 'section_name', 'web_url']
 
-# Copy the data in different variable for future reference
-df = pd.DataFrame(data)
+# Create start and end date range for data filtering
+start_date = datetime(2015,1,1, tzinfo=pytz.UTC)
 
-# Drop unwatned columns
+end_date = datetime(2025,6,21, tzinfo=pytz.UTC)
 
-df.drop(['print_section', 
-         'snippet', 'print_page', 
-         'document_type', 'byline', 'keywords',  
-         'news_desk', 'type_of_material',  '_id', 
-         'word_count', 'uri', 'multimedia', 
-         'subsection_name'], axis=1, inplace=True)
 
-# df.isnull().sum()
+def filter_articles(df):
+    """
+    Drops incomplete rows, fills lead_paragraph from abstract and keeps only
+    articles published within the start/end date window.
+    """
+    # drop the row where date is having null values
+    df = df.dropna(subset=['pub_date'])
 
-# drop the row where date is having null values
-df.dropna(subset=['pub_date'], inplace=True)
+    # Fill the null values in the leadparagraph column from abstract
+    df = df.assign(lead_paragraph=np.where(df['lead_paragraph'].isnull(),
+                                           df['abstract'],
+                                           df['lead_paragraph']))
 
+    # Drop rows if its having a null values
+    df = df.dropna(how='any')
 
-# Fill the null values in the leadparagraph column from abstract 
-df['lead_paragraph'] = np.where(df['lead_paragraph'].isnull(),
-                                   df['abstract'],
-                                   df['lead_paragraph'])
+    # Convert the date into datetime format from object
+    df = df.assign(pub_date=pd.to_datetime(df['pub_date']))
 
-# Drop rows if its having a null values
-df.dropna(how='any', inplace=True)
-# df.isnull().sum()
+    # Filter the DataFrame to include only rows with pub_date within the last 10 years
+    return df[(df['pub_date'] >= start_date) & (df['pub_date'] <= end_date)]
 
 
-# Convert the date into datetime format from object
-df['pub_date'] = pd.to_datetime(df['pub_date'])
+run_recorder.start('collect')
 
-# Create start and end date range for data filtering
-start_date = datetime(2015,1,1, tzinfo=pytz.UTC)
 
-end_date = datetime(2025,6,21, tzinfo=pytz.UTC)
+if STREAMING_MODE:
+    # Read the CSV member of the zip chunk by chunk and append each filtered chunk to the output
+    total_rows = 0
+    kept_rows = 0
+    with zipfile.ZipFile(ZIP_FILE, 'r') as zip_ref:
+        with zip_ref.open(CSV_MEMBER) as csv_file:
+            reader = pd.read_csv(csv_file, usecols=KEEP_COLUMNS, dtype=str, chunksize=CHUNK_SIZE)
+            with FrameWriter('raw') as writer:
+                for chunk_no, chunk in enumerate(reader):
+                    with run_recorder.step('filter_chunk', rows=len(chunk)):
+                        chunk_filtered = filter_articles(chunk)
+                    with run_recorder.step('write_chunk', rows=len(chunk_filtered)):
+                        writer.write(chunk_filtered)
+
+                    total_rows += len(chunk)
+                    kept_rows += len(chunk_filtered)
+                    print(f"Chunk {chunk_no + 1}: kept {len(chunk_filtered)} of {len(chunk)} rows (total kept: {kept_rows})")
+
+    run_recorder.count('rows_read', total_rows)
+    run_recorder.count('rows_kept', kept_rows)
+    print(f"Streaming ingestion complete. Kept {kept_rows} of {total_rows} rows in '{OUTPUT_FILE}'.")
+
+else:
+    # Unzip the downloaded file
+    with zipfile.ZipFile(ZIP_FILE, 'r') as zip_ref:
+        zip_ref.extractall()
+
+    #Read CSV file using pandas library
+    data = pd.read_csv(CSV_MEMBER)
+    # print(data.info())
+
+    # Copy the data in different variable for future reference
+    df = pd.DataFrame(data)
+
+    # Drop unwatned columns (keeping the original column order of the dump)
+    df = df[[col for col in df.columns if col in KEEP_COLUMNS]]
+
+    # df.isnull().sum()
+
+    with run_recorder.step('filter_articles', rows=len(df)):
+        df_filtered = filter_articles(df)
 
+    # Print the first few rows of the filtered DataFrame
+    print(df_filtered.head())
+    print(df_filtered.isnull().sum())
 
-# Filter the DataFrame to include only rows with pub_date within the last 10 years
-df_filtered = df[(df['pub_date'] >= start_date) & (df['pub_date'] <= end_date)]
+    # Store the dataframe as the raw stage hand-off
+    with run_recorder.step('write_raw', rows=len(df_filtered)):
+        write_frame(df_filtered, 'raw')
 
-# Print the first few rows of the filtered DataFrame
-print(df_filtered.head())
-print(df_filtered.isnull().sum())
 
-# Store the dataframe as CSV file
-df_filtered.to_csv('raw_data.csv')
+# Export the raw hand-off as monthly partitions (see partitions.py), uploaded by aws_upload.py
+if RAW_LAYOUT == 'partitioned':
+    with run_recorder.step('export_partitions'):
+        export_partitions('raw')
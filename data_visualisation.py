@@ -5,14 +5,17 @@ from wordcloud import WordCloud
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
-import psycopg2 # Import for PostgreSQL connection
-from sqlalchemy import create_engine # Import for pandas.read_sql_query
-import os # To retrieve environment variables for credentials (recommended)
-import json
-
-# Load secrets from secrets.json
-with open('.vscode/secrets.json') as f:
-    secrets = json.load(f)
+import os # To retrieve environment variables (recommended)
+from storage import stage_path
+from db import create_db_engine, pool_metrics
+from db_schema import DB_PROCESSED_DATA_TABLE_NAME
+from dashboard_queries import (BASE_COLUMNS, article_filters, term_filters, query_filter_options, query_cube,
+                               query_articles, query_top_articles, query_term_frequencies, read_filter_options,
+                               read_cube, read_articles, read_top_articles, read_term_frequencies, compact_frame,
+                               memory_report, query_data_version)
+from term_frequencies import sum_term_frequencies
+from sentiment_cube import (filter_cube, rollup, category_means_by_period, monthly_means_by_category_year,
+                            category_means_by_year)
 
 
 # --- Streamlit Page Configuration ---
@@ -27,69 +30,124 @@ st.config.set_option('theme.textColor', '#020412')
 
 
 # --- Database Configuration Parameters ---
-# IMPORTANT: In a production environment, use environment variables or a secrets manager
-# for these credentials, DO NOT hardcode them directly in the script.
-DB_HOST = os.getenv("DB_HOST", "database-1.c3eic0i08xdc.ap-south-1.rds.amazonaws.com")
-DB_NAME = os.getenv("DB_NAME", "postgres")
-DB_USER = os.getenv("DB_USER", "postgres")
-DB_PASSWORD = secrets['db_password']
-DB_PORT = os.getenv("DB_PORT", "5432")           # Default PostgreSQL port
+# Connection, pool and statement timeout settings (DB_HOST, DB_POOL_SIZE, DB_STATEMENT_TIMEOUT_MS, ...)
+# are read from environment variables in db.py, the password from .vscode/secrets.json.
+
+# Columns shown by the Top N articles
+TOP_ARTICLE_COLUMNS = ['date', 'headline', 'category', 'cluster', 'compound', 'content']
+
+# Where the dashboard reads its data from: 'db' (PostgreSQL) or 'file' (memory-mapped final stage hand-off)
+DATA_SOURCE = os.getenv("DASHBOARD_DATA_SOURCE", "db")
+
+
+# --- Function to create the database engine ---
+@st.cache_resource # One pooled engine per server process, shared by all reruns and sessions
+def get_engine():
+    return create_db_engine()
 
-DB_PROCESSED_DATA_TABLE_NAME = "news_data_final" # Table name where your processed data is stored
 
+# --- Functions to load data (filters and columns are pushed down to the source) ---
+def report_frame_memory(name, df):
+    """Prints the per-column memory of a frame loaded into the cache."""
+    report = memory_report(df)
+    print(f"Loaded {name}: {len(df)} rows, {report.pop('total') / 1024 ** 2:.2f} MB")
+    for column, nbytes in report.items():
+        print(f"  {column:<16} {str(df[column].dtype) if column in df.columns else '':<14} {nbytes / 1024:>12.1f} KB")
 
-# --- Function to load data from PostgreSQL DB ---
-@st.cache_data(ttl=3600) # Cache data for 1 hour to avoid repeated DB queries
-def load_data_from_db():
+
+@st.cache_data(ttl=3600)
+def load_filter_options():
     """
-    Loads processed news data from the PostgreSQL database.
-    Includes a check for required columns.
+    Loads the date range, categories and clusters offered by the global filters.
     """
     try:
-        # Create a SQLAlchemy engine for pandas.read_sql_query
-        engine = create_engine(f'postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}')
+        if DATA_SOURCE == 'file':
+            options = read_filter_options()
+        else:
+            options = query_filter_options(get_engine())
+    except FileNotFoundError:
+        st.error(f"Error: '{stage_path('final')}' not found. Please run model.py first.")
+        st.stop()
+    except Exception as e:
+        st.error(f"Error connecting to or loading data from PostgreSQL: {e}")
+        st.stop() # Stop the app if data cannot be loaded
 
-        # SQL query to select all data from the processed news table
-        query = f"SELECT * FROM {DB_PROCESSED_DATA_TABLE_NAME};"
+    source = stage_path('final') if DATA_SOURCE == 'file' else f"PostgreSQL table '{DB_PROCESSED_DATA_TABLE_NAME}'"
+    st.success(f"Data loaded successfully from {source}.")
+    return options
 
-        # Read data into a pandas DataFrame
-        df_from_db = pd.read_sql_query(query, engine)
 
-        # Ensure 'date' column is datetime type after loading
-        df_from_db['date'] = pd.to_datetime(df_from_db['date'])
+def data_version():
+    """Changes whenever the data source is refreshed, so cached aggregates are rebuilt."""
+    if DATA_SOURCE == 'file':
+        return os.path.getmtime(stage_path('final'))
+    # Stamped by the loaders in the load transaction (see db_schema.record_data_version)
+    return query_data_version(get_engine())
 
-        # --- Column Existence Check ---
-        required_cols = ['date', 'category', 'cluster', 'compound', 'headline', 'content']
-        for col in required_cols:
-            if col not in df_from_db.columns:
-                st.error(f"Error: Required column '{col}' not found in the database table '{DB_PROCESSED_DATA_TABLE_NAME}'. Please ensure your database table contains all necessary columns.")
-                st.stop() # Stop the app if a critical column is missing
 
-        st.success(f"Data loaded successfully from PostgreSQL table '{DB_PROCESSED_DATA_TABLE_NAME}'.")
-        return df_from_db
+@st.cache_data(ttl=3600)
+def load_cube(version):
+    """
+    Loads the sentiment cube (one row per date x category x cluster), built once per data refresh.
+    """
+    try:
+        cube = compact_frame(read_cube() if DATA_SOURCE == 'file' else query_cube(get_engine()))
+    except Exception as e:
+        st.error(f"Error loading the sentiment cube: {e}")
+        st.stop()
+    report_frame_memory("sentiment cube", cube)
+    return cube
+
 
+@st.cache_data(ttl=3600, max_entries=32) # Cached per column set and filter combination
+def load_articles(columns, filters, version):
+    """
+    Loads only the given columns of the articles matching the filters (version: see data_version).
+    """
+    try:
+        if DATA_SOURCE == 'file':
+            articles = read_articles(columns, filters)
+        else:
+            articles = query_articles(get_engine(), columns, filters)
     except Exception as e:
-        st.error(f"Error connecting to or loading data from PostgreSQL: {e}")
-        st.stop() # Stop the app if data cannot be loaded
+        st.error(f"Error loading articles: {e}")
+        st.stop()
+    articles = compact_frame(articles)
+    report_frame_memory("articles", articles)
+    return articles
+
+
+@st.cache_data(ttl=3600, max_entries=32)
+def load_top_articles(columns, filters, n, ascending, version):
+    """
+    Loads the n most positive (or most negative) articles matching the filters, including their content.
+    """
+    try:
+        if DATA_SOURCE == 'file':
+            return read_top_articles(columns, filters, n, ascending)
+        return query_top_articles(get_engine(), columns, filters, n, ascending)
+    except Exception as e:
+        st.error(f"Error loading articles: {e}")
+        st.stop()
 
 
 # --- Function to prepare data for heatmap and comparison table ---
 @st.cache_data(ttl=3600)
-def prepare_comparison_data(dataframe):
+def prepare_comparison_data(cube):
     """
-    Calculates category counts and category-cluster distribution for comparison.
+    Calculates category counts and category-cluster distribution for comparison from the sentiment cube.
     """
-    if dataframe.empty or 'category' not in dataframe.columns or 'cluster' not in dataframe.columns:
+    if cube.empty or 'category' not in cube.columns or 'cluster' not in cube.columns:
         return pd.DataFrame()
 
+    # Category-Cluster Distribution Counts
+    category_cluster_counts = rollup(cube, ['category', 'cluster'])[['category', 'cluster', 'n_articles']]
+    category_cluster_counts.columns = ['Category', 'Cluster', 'Cluster_Counts']
+
     # Original Category Counts
-    category_overall_counts = dataframe['category'].value_counts().reset_index()
+    category_overall_counts = category_cluster_counts.groupby('Category', observed=True)['Cluster_Counts'].sum().reset_index()
     category_overall_counts.columns = ['Category', 'Category_Counts']
 
-    # Category-Cluster Distribution Counts
-    category_cluster_counts = dataframe.groupby(['category', 'cluster']).size().reset_index(name='Cluster_Counts')
-    category_cluster_counts.rename(columns={'category': 'Category', 'cluster': 'Cluster'}, inplace=True)
-
     # Merge to get total category count alongside category-cluster counts
     comparison_df = pd.merge(category_cluster_counts, category_overall_counts, on='Category', how='left')
 
@@ -99,27 +157,26 @@ def prepare_comparison_data(dataframe):
     return comparison_df_sorted
 
 # --- Helper Function for Word Cloud Generation ---
-@st.cache_data(ttl=3600)
-def generate_word_cloud(text_series):
-    """Generates a word cloud from a pandas Series of text."""
-    if text_series.empty:
-        return None # Return None if no text
-    text = " ".join(text_series.astype(str).fillna(''))
-    if not text.strip(): # Check if text is just whitespace
-        return None
-    return WordCloud(background_color='white').generate(text)
-
+@st.cache_data(ttl=3600, max_entries=64) # Rendered images are cached per source, filter combination and grouping
+def generate_word_clouds(source, filters, by, version):
+    """
+    Renders one word cloud image per value of 'by' (cluster or sentiment bucket) from the term counts
+    precomputed by model.py. Groups without any words are left out.
+    """
+    try:
+        if DATA_SOURCE == 'file':
+            frequencies = read_term_frequencies(source, filters, by)
+        else:
+            frequencies = query_term_frequencies(get_engine(), source, filters, by)
+    except Exception as e:
+        st.error(f"Error loading word cloud term counts: {e}")
+        st.stop()
+    return {value: WordCloud(background_color='white').generate_from_frequencies(counts).to_array()
+            for value, counts in sum_term_frequencies(frequencies, by).items() if counts}
 
-# --- Load the data at the start of the app ---
-df = load_data_from_db()
 
-# Add date-related columns needed for multiple plots once after loading data
-if 'year' not in df.columns:
-    df['year'] = df['date'].dt.year
-if 'month' not in df.columns:
-    df['month'] = df['date'].dt.month
-if 'quarter' not in df.columns:
-    df['quarter'] = df['date'].dt.quarter
+# --- Load the filter options at the start of the app ---
+filter_options = load_filter_options()
 
 
 # --- Sidebar Setup ---
@@ -127,35 +184,18 @@ st.sidebar.title("News Sentiment Analysis")
 
 # --- Global Filters ---
 st.sidebar.header("Global Filters")
-min_overall_date = df['date'].min()
-max_overall_date = df['date'].max()
+min_overall_date = filter_options['min_date']
+max_overall_date = filter_options['max_date']
 
 global_start_date = st.sidebar.date_input("Start Date", min_value=min_overall_date, max_value=max_overall_date, value=min_overall_date, key="global_start_date")
 global_end_date = st.sidebar.date_input("End Date", min_value=min_overall_date, max_value=max_overall_date, value=max_overall_date, key="global_end_date")
 
-if global_start_date > global_end_date:
-    st.sidebar.error("Global end date must be after start date.")
-    # Set filtered_df to empty to prevent errors in visualizations
-    filtered_df = pd.DataFrame()
-else:
-    filtered_df = df[(df['date'] >= pd.to_datetime(global_start_date)) & (df['date'] <= pd.to_datetime(global_end_date))]
-
-all_categories = sorted(df['category'].unique().tolist())
+all_categories = filter_options['categories']
 selected_categories = st.sidebar.multiselect("Select Categories", all_categories, default=all_categories)
 
-all_clusters = sorted(df['cluster'].unique().tolist())
+all_clusters = filter_options['clusters']
 selected_clusters = st.sidebar.multiselect("Select Clusters", all_clusters, default=all_clusters)
 
-# Apply category and cluster filters
-if not filtered_df.empty:
-    filtered_df = filtered_df[
-        (filtered_df['category'].isin(selected_categories)) &
-        (filtered_df['cluster'].isin(selected_clusters))
-    ]
-
-if filtered_df.empty:
-    st.info("No data available for the selected global filters. Please adjust your filter selections.")
-
 
 st.sidebar.markdown("---")
 
@@ -191,13 +231,40 @@ with st.sidebar.expander("Article Details", expanded=True): # New expander
 st.sidebar.markdown("---")
 st.sidebar.info("Select options from above to visualize news sentiment and clustering.")
 
+if DATA_SOURCE != 'file':
+    with st.sidebar.expander("Database Connection Pool", expanded=False):
+        st.json(pool_metrics(get_engine()))
+
+
+# --- Load the filtered data ---
+# Aggregate charts roll up the cells of the sentiment cube that match the global filters and word
+# clouds are rendered from precomputed term counts. Article rows are only fetched for the sentiment
+# distribution, article text only for the Top N articles.
+global_filters = article_filters(global_start_date, global_end_date, selected_categories, selected_clusters)
+
+if global_start_date > global_end_date:
+    st.sidebar.error("Global end date must be after start date.")
+    # Set the filtered data to empty to prevent errors in visualizations
+    filtered_cube = pd.DataFrame()
+    filtered_df = pd.DataFrame()
+else:
+    filtered_cube = filter_cube(load_cube(data_version()), global_start_date, global_end_date,
+                                selected_categories, selected_clusters)
+    if sentiment_distribution:
+        filtered_df = load_articles(BASE_COLUMNS, global_filters, data_version())
+    else:
+        filtered_df = pd.DataFrame(columns=BASE_COLUMNS)
+
+if filtered_cube.empty:
+    st.info("No data available for the selected global filters. Please adjust your filter selections.")
+
 
 # --- Main Content Area ---
 st.title("Interactive News Sentiment Analysis Dashboard")
 st.write("Explore sentiment and clustering insights from news articles based on your selected global filters.")
 
-# Check if filtered_df is empty after global filters, if so, skip visualizations
-if filtered_df.empty:
+# Check if the filtered data is empty after global filters, if so, skip visualizations
+if filtered_cube.empty:
     st.stop() # Stop further execution of visualization code if no data
 
 
@@ -207,7 +274,9 @@ if filtered_df.empty:
 if word_cloud_by_cluster:
     st.header("Word Cloud by Cluster")
     st.write("Visualize the most frequent words in headlines for each identified cluster (based on global filters).")
-    clusters = sorted(filtered_df['cluster'].unique())
+    clusters = sorted(filtered_cube['cluster'].unique())
+    cluster_word_clouds = generate_word_clouds('headline', term_filters(global_start_date, global_end_date, selected_categories, selected_clusters),
+                                               'cluster', data_version())
     n_clusters = len(clusters)
     n_cols = 3
     n_rows = (n_clusters + n_cols - 1) // n_cols
@@ -216,8 +285,8 @@ if word_cloud_by_cluster:
 
     for i, cluster in enumerate(clusters):
         if i < len(axs_wc):
-            wc_img = generate_word_cloud(filtered_df[filtered_df['cluster'] == cluster]['headline'])
-            if wc_img:
+            wc_img = cluster_word_clouds.get(cluster)
+            if wc_img is not None:
                 axs_wc[i].imshow(wc_img, interpolation='bilinear')
                 axs_wc[i].set_title(f"Cluster {cluster}")
             else:
@@ -236,7 +305,7 @@ if word_cloud_by_cluster:
 if sentiment_trend:
     st.header("Overall Sentiment Trend by Category")
     st.write("Track the average sentiment score for each news category over time (based on global filters).")
-    sentiment_trend_data = filtered_df.groupby(['year', 'category'])['compound'].mean().reset_index()
+    sentiment_trend_data = rollup(filtered_cube, ['year', 'category']).rename(columns={'mean_compound': 'compound'})
     if sentiment_trend_data.empty:
         st.info("No data for sentiment trend based on current filters.")
     else:
@@ -250,7 +319,7 @@ if sentiment_trend:
 if year_month_trend:
     st.header("Sentiment Trend (Year/Month-wise)")
     st.write("Compare category sentiment across selected years and months (based on global filters).")
-    years_in_data = sorted(filtered_df['year'].unique().tolist())
+    years_in_data = sorted(filtered_cube['year'].unique().tolist())
     selected_years_month = st.multiselect("Select Years for Month Trend", years_in_data, default=list(years_in_data), key="month_trend_years")
 
     months = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']
@@ -262,14 +331,12 @@ if year_month_trend:
     if not selected_years_month or not selected_months_month:
         st.info("Please select at least one year and one month to display the trend.")
     else:
-        for year in selected_years_month:
-            for month_name in selected_months_month:
-                month_num = month_map[month_name]
-                df_month_filtered = filtered_df[(filtered_df['year'] == year) & (filtered_df['month'] == month_num)]
-                if not df_month_filtered.empty:
-                    avg_compound = df_month_filtered.groupby(['category'])['compound'].mean().reset_index()
-                    fig.add_trace(go.Scatter(x=avg_compound['category'], y=avg_compound['compound'],
-                                             mode='lines', name=f"{year} - {month_name}"))
+        # One roll-up for all selected year x month traces
+        month_traces = category_means_by_period(filtered_cube, 'month', selected_years_month,
+                                                [month_map[month_name] for month_name in selected_months_month])
+        for (year, month_num), avg_compound in month_traces:
+            fig.add_trace(go.Scatter(x=avg_compound['category'], y=avg_compound['mean_compound'],
+                                     mode='lines', name=f"{year} - {months[month_num - 1]}"))
 
         fig.update_layout(title="Year/Month-wise Sentiment Trend", xaxis_title="Category", yaxis_title="Average Compound Sentiment Score")
         st.plotly_chart(fig)
@@ -279,7 +346,7 @@ if year_month_trend:
 if year_quarter_trend:
     st.header("Sentiment Trend (Year/Quarter-wise)")
     st.write("Compare category sentiment across selected years and quarters (based on global filters).")
-    years_in_data_q = sorted(filtered_df['year'].unique().tolist())
+    years_in_data_q = sorted(filtered_cube['year'].unique().tolist())
     selected_years_quarter = st.multiselect("Select Years for Quarter Trend", years_in_data_q, default=list(years_in_data_q), key="quarter_trend_years")
 
     quarters = ['Q1', 'Q2', 'Q3', 'Q4']
@@ -290,14 +357,12 @@ if year_quarter_trend:
     if not selected_years_quarter or not selected_quarters_quarter:
         st.info("Please select at least one year and one quarter to display the trend.")
     else:
-        for year in selected_years_quarter:
-            for quarter_name in selected_quarters_quarter:
-                quarter_num = int(quarter_name.split('Q')[1])
-                df_quarter_filtered = filtered_df[(filtered_df['year'] == year) & (filtered_df['quarter'] == quarter_num)]
-                if not df_quarter_filtered.empty:
-                    avg_compound = df_quarter_filtered.groupby(['category'])['compound'].mean().reset_index()
-                    fig.add_trace(go.Scatter(x=avg_compound['category'], y=avg_compound['compound'],
-                                             mode='lines', name=f"{year} - {quarter_name}"))
+        # One roll-up for all selected year x quarter traces
+        quarter_traces = category_means_by_period(filtered_cube, 'quarter', selected_years_quarter,
+                                                  [int(quarter_name.split('Q')[1]) for quarter_name in selected_quarters_quarter])
+        for (year, quarter_num), avg_compound in quarter_traces:
+            fig.add_trace(go.Scatter(x=avg_compound['category'], y=avg_compound['mean_compound'],
+                                     mode='lines', name=f"{year} - Q{quarter_num}"))
 
         fig.update_layout(title="Year/Quarter-wise Sentiment Trend", xaxis_title="Category", yaxis_title="Average Compound Sentiment Score")
         st.plotly_chart(fig)
@@ -307,14 +372,14 @@ if year_quarter_trend:
 if bar_line_chart:
     st.header("Category Sentiment (Bar and Line Chart)")
     st.write("View average sentiment scores for categories within the globally selected date range.")
-    if filtered_df.empty:
+    if filtered_cube.empty:
         st.info("No data available for the selected global date range to display this chart.")
     else:
-        avg_compound = filtered_df.groupby(['category'])['compound'].mean().reset_index()
+        avg_compound = rollup(filtered_cube, ['category'])
 
         fig = go.Figure()
-        fig.add_trace(go.Bar(x=avg_compound['category'], y=avg_compound['compound'], name='Average Sentiment (Bar)'))
-        fig.add_trace(go.Scatter(x=avg_compound['category'], y=avg_compound['compound'], mode='lines+markers', name='Average Sentiment (Line)'))
+        fig.add_trace(go.Bar(x=avg_compound['category'], y=avg_compound['mean_compound'], name='Average Sentiment (Bar)'))
+        fig.add_trace(go.Scatter(x=avg_compound['category'], y=avg_compound['mean_compound'], mode='lines+markers', name='Average Sentiment (Line)'))
 
         fig.update_layout(title=f"Category Sentiment within Global Filtered Range",
                           xaxis_title="Category",
@@ -326,10 +391,10 @@ if bar_line_chart:
 if comparison_table_checkbox:
     st.header("Category-Cluster Comparison Table")
     st.write("This table shows the distribution of original categories within the identified clusters (based on global filters).")
-    if filtered_df.empty:
+    if filtered_cube.empty:
         st.info("No data available for the selected global filters to display the comparison table.")
     else:
-        comparison_df_sorted = prepare_comparison_data(filtered_df)
+        comparison_df_sorted = prepare_comparison_data(filtered_cube)
         if comparison_df_sorted.empty:
             st.info("No data available for the selected global filters to display the comparison table.")
         else:
@@ -340,10 +405,10 @@ if comparison_table_checkbox:
 if category_month_year_comparison:
     st.header("Category Sentiment (Month/Year Comparison)")
     st.write("Compare sentiment trends for specific categories across different months and years (based on global filters).")
-    categories_in_data = sorted(filtered_df['category'].unique().tolist())
+    categories_in_data = sorted(filtered_cube['category'].unique().tolist())
     selected_categories_comp = st.multiselect("Select Categories for Comparison", categories_in_data, default=list(categories_in_data), key="comp_categories")
 
-    years_in_data_comp = sorted(filtered_df['year'].unique().tolist())
+    years_in_data_comp = sorted(filtered_cube['year'].unique().tolist())
     selected_years_option_comp = st.multiselect("Select Years for Comparison", ['All Years'] + list(years_in_data_comp), default=['All Years'], key="comp_years")
 
     month_names = {1: 'January', 2: 'February', 3: 'March', 4: 'April', 5: 'May', 6: 'June',
@@ -359,13 +424,11 @@ if category_month_year_comparison:
         if not years_to_compare:
             st.info("No valid years selected for comparison.")
         else:
-            for category in selected_categories_comp:
-                for year in years_to_compare:
-                    df_comp_filtered = filtered_df[(filtered_df['category'] == category) & (filtered_df['year'] == year)]
-                    if not df_comp_filtered.empty:
-                        avg_compound_comp = df_comp_filtered.groupby(['month'])['compound'].mean().reset_index().sort_values(by='month')
-                        fig.add_trace(go.Scatter(x=[month_names[m] for m in avg_compound_comp['month']], y=avg_compound_comp['compound'],
-                                                 mode='lines+markers', name=f"{category} - {year}"))
+            # One roll-up for all selected category x year traces
+            comparison_traces = monthly_means_by_category_year(filtered_cube, selected_categories_comp, years_to_compare)
+            for (category, year), avg_compound_comp in comparison_traces:
+                fig.add_trace(go.Scatter(x=[month_names[m] for m in avg_compound_comp['month']], y=avg_compound_comp['mean_compound'],
+                                         mode='lines+markers', name=f"{category} - {year}"))
 
             fig.update_layout(title="Category-wise Month and Year Sentiment Comparison",
                               xaxis_title="Month", yaxis_title="Average Compound Sentiment Score")
@@ -376,8 +439,8 @@ if category_month_year_comparison:
 if category_sentiment_bar_chart:
     st.header("Category-wise Sentiment Bar Chart")
     st.write("Visualize the average sentiment score for each category across selected years (based on global filters).")
-    categories_in_data_bar = sorted(filtered_df['category'].unique().tolist())
-    years_in_data_bar = sorted(filtered_df['year'].unique().tolist())
+    categories_in_data_bar = sorted(filtered_cube['category'].unique().tolist())
+    years_in_data_bar = sorted(filtered_cube['year'].unique().tolist())
 
     selected_years_bar = st.multiselect("Select Years for Bar Chart", years_in_data_bar, default=list(years_in_data_bar), key="bar_chart_years")
 
@@ -386,16 +449,11 @@ if category_sentiment_bar_chart:
     if not selected_years_bar:
         st.info("Please select at least one year for the bar chart.")
     else:
+        # Year x category table of mean sentiment in one roll-up (0 where a category has no articles)
+        category_values = category_means_by_year(filtered_cube, selected_years_bar, categories_in_data_bar)
         for year in selected_years_bar:
-            category_values = []
-            for category in categories_in_data_bar:
-                df_bar_filtered = filtered_df[(filtered_df['category'] == category) & (filtered_df['year'] == year)]
-                if not df_bar_filtered.empty:
-                    category_values.append(df_bar_filtered['compound'].mean().round(2))
-                else:
-                    category_values.append(0)
             # FIX: Convert year to string for the 'name' property
-            fig.add_trace(go.Bar(x=categories_in_data_bar, y=category_values, name=str(year)))
+            fig.add_trace(go.Bar(x=categories_in_data_bar, y=category_values.loc[year].tolist(), name=str(year)))
 
         fig.update_layout(title="Category-wise Sentiment Bar Chart",
                           xaxis_title="Category", yaxis_title="Average Sentiment Score", barmode='group')
@@ -406,34 +464,34 @@ if category_sentiment_bar_chart:
 if sentiment_word_cloud:
     st.header("Sentiment Word Cloud by Year")
     st.write("Explore words associated with positive, negative, and neutral sentiments for a selected year (based on global filters).")
-    years_for_wc = sorted(filtered_df['year'].unique().tolist())
+    years_for_wc = sorted(filtered_cube['year'].unique().tolist())
     if not years_for_wc:
         st.info("No data available for the selected global filters to generate sentiment word cloud.")
     else:
         selected_year_wc_sentiment = st.selectbox("Select Year for Sentiment Word Cloud", years_for_wc)
 
-        df_wc_filtered = filtered_df[(filtered_df['year'] == selected_year_wc_sentiment)]
-
-        positive_words = df_wc_filtered[df_wc_filtered['compound'] > 0.5]['content'].astype(str).fillna('')
-        negative_words = df_wc_filtered[df_wc_filtered['compound'] < -0.5]['content'].astype(str).fillna('')
-        neutral_words = df_wc_filtered[(df_wc_filtered['compound'] >= -0.5) & (df_wc_filtered['compound'] <= 0.5)]['content'].astype(str).fillna('')
+        # Content term counts of the selected year, per sentiment bucket (positive > 0.5, negative < -0.5)
+        year_filters = [('year', '==', int(selected_year_wc_sentiment)),
+                        ('category', 'in', list(selected_categories)),
+                        ('cluster', 'in', list(selected_clusters))]
+        sentiment_word_clouds = generate_word_clouds('content', year_filters, 'sentiment', data_version())
 
-        positive_wc = generate_word_cloud(positive_words)
-        negative_wc = generate_word_cloud(negative_words)
-        neutral_wc = generate_word_cloud(neutral_words)
+        positive_wc = sentiment_word_clouds.get('positive')
+        negative_wc = sentiment_word_clouds.get('negative')
+        neutral_wc = sentiment_word_clouds.get('neutral')
 
         fig_sentiment_wc, ax_sentiment_wc = plt.subplots(1, 3, figsize=(20, 10))
-        if positive_wc:
+        if positive_wc is not None:
             ax_sentiment_wc[0].imshow(positive_wc, interpolation='bilinear')
         ax_sentiment_wc[0].set_title('Positive Sentiment')
         ax_sentiment_wc[0].axis('off')
 
-        if negative_wc:
+        if negative_wc is not None:
             ax_sentiment_wc[1].imshow(negative_wc, interpolation='bilinear')
         ax_sentiment_wc[1].set_title('Negative Sentiment') # Fixed: removed duplicate line
         ax_sentiment_wc[1].axis('off')
 
-        if neutral_wc:
+        if neutral_wc is not None:
             ax_sentiment_wc[2].imshow(neutral_wc, interpolation='bilinear')
         ax_sentiment_wc[2].set_title('Neutral Sentiment')
         ax_sentiment_wc[2].axis('off')
@@ -446,17 +504,18 @@ if sentiment_word_cloud:
 if heatmap_checkbox:
     st.header("Heatmap of Category vs. Cluster Counts")
     st.write("A heatmap provides a dense overview of the counts for each Category-Cluster pair (based on global filters).")
-    if filtered_df.empty:
+    if filtered_cube.empty:
         st.info("No data available for the selected global filters to display the heatmap.")
     else:
-        heatmap_prep_df = prepare_comparison_data(filtered_df).copy()
+        heatmap_prep_df = prepare_comparison_data(filtered_cube).copy()
         heatmap_prep_df['Cluster_Counts'] = heatmap_prep_df['Cluster_Counts'].fillna(0).astype(int)
 
         heatmap_data = heatmap_prep_df.pivot_table(
             index='Category',
             columns='Cluster',
             values='Cluster_Counts',
-            fill_value=0
+            fill_value=0,
+            observed=True
         )
 
         if heatmap_data.empty:
@@ -516,18 +575,17 @@ if news_volume_trend:
 
     aggregation_period = st.radio("Select aggregation period:", ("Daily", "Weekly"))
 
-    if filtered_df.empty:
+    if filtered_cube.empty:
         st.info("No data available for the selected global filters to display news volume trend.")
     else:
-        df_volume = filtered_df.copy()
-        df_volume = df_volume.set_index('date')
+        daily_counts = rollup(filtered_cube, ['date']).set_index('date')['n_articles']
 
         if aggregation_period == "Daily":
-            volume_data = df_volume.resample('D').size().reset_index(name='Article Count')
+            volume_data = daily_counts.resample('D').sum().reset_index(name='Article Count')
             volume_data.columns = ['Date', 'Article Count']
             title = "Daily News Article Volume Over Time"
         else: # Weekly
-            volume_data = df_volume.resample('W').size().reset_index(name='Article Count')
+            volume_data = daily_counts.resample('W').sum().reset_index(name='Article Count')
             volume_data.columns = ['Week', 'Article Count']
             title = "Weekly News Article Volume Over Time"
 
@@ -546,11 +604,12 @@ if sentiment_extremes_trend:
     st.header("Sentiment Extremes Trend (Min/Max)")
     st.write("Track the minimum (most negative) and maximum (most positive) sentiment scores over time (based on global filters).")
 
-    if filtered_df.empty:
+    if filtered_cube.empty:
         st.info("No data available for the selected global filters to display sentiment extremes.")
     else:
-        # Group by date and calculate min/max compound scores
-        sentiment_extremes_data = filtered_df.groupby(filtered_df['date'].dt.date)['compound'].agg(['min', 'max', 'mean']).reset_index()
+        # Roll the cube up to dates to get the daily min/max/mean compound scores
+        sentiment_extremes_data = rollup(filtered_cube, ['date'])[['date', 'min_compound', 'max_compound', 'mean_compound']]
+        sentiment_extremes_data['date'] = sentiment_extremes_data['date'].dt.date
         sentiment_extremes_data.columns = ['Date', 'Min Sentiment', 'Max Sentiment', 'Mean Sentiment']
 
         fig_extremes = go.Figure()
@@ -573,7 +632,7 @@ if top_n_articles:
     st.header("Top N Articles by Sentiment")
     st.write("View the most positive or most negative articles based on current filters.")
 
-    if filtered_df.empty:
+    if filtered_cube.empty:
         st.info("No data available for the selected global filters to display top articles.")
     else:
         col1, col2 = st.columns(2)
@@ -582,10 +641,9 @@ if top_n_articles:
         with col2:
             num_articles = st.number_input("Number of Articles to Display (N)", min_value=1, max_value=50, value=5, step=1)
 
-        if sentiment_type == "Most Positive":
-            top_articles = filtered_df.sort_values(by='compound', ascending=False).head(num_articles)
-        else: # Most Negative
-            top_articles = filtered_df.sort_values(by='compound', ascending=True).head(num_articles)
+        # Headlines and content are only fetched for the N articles shown
+        top_articles = load_top_articles(TOP_ARTICLE_COLUMNS, global_filters, int(num_articles),
+                                         ascending=(sentiment_type == "Most Negative"), version=data_version())
 
         if top_articles.empty:
             st.info(f"No {sentiment_type.lower()} articles found for the selected filters.")
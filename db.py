@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import threading
+from sqlalchemy import create_engine
+from sqlalchemy.engine import URL
+from sqlalchemy.pool import QueuePool
+
+
+# --- Database Configuration ---
+# Single place where the pipeline and the dashboard get their PostgreSQL connections from.
+# Connections are pooled (and health-checked with pre-ping) so a page rerun or a loader step
+# reuses an open connection instead of paying the TCP/TLS handshake again.
+DB_HOST = os.getenv("DB_HOST", "database-1.c3eic0i08xdc.ap-south-1.rds.amazonaws.com")
+DB_NAME = os.getenv("DB_NAME", "postgres")
+DB_USER = os.getenv("DB_USER", "postgres")
+DB_PORT = os.getenv("DB_PORT", "5432")
+DB_SECRETS_PATH = '.vscode/secrets.json'
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))       # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))       # Reopen connections older than this (seconds)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# Server-side statement timeout of interactive (dashboard) queries in milliseconds, 0 disables it.
+# The pipeline engine (get_engine) runs bulk loads and index builds and has no timeout by default.
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+DB_LOAD_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_LOAD_STATEMENT_TIMEOUT_MS", "0"))
+
+
+class PoolMetrics:
+    """Thread-safe counters of pool checkouts, new connections and time spent waiting for a connection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connects = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def record_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'connects': self.connects,
+                'wait_seconds': self.wait_seconds,
+                'mean_wait_ms': 1000 * self.wait_seconds / self.checkouts if self.checkouts else 0.0,
+                'max_wait_ms': 1000 * self.max_wait_seconds,
+            }
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection (including opening one)."""
+
+    def __init__(self, *args, metrics=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = metrics or PoolMetrics()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.metrics.record_wait(time.perf_counter() - start)
+
+    def _create_connection(self):
+        self.metrics.record_connect()
+        return super()._create_connection()
+
+    def recreate(self):
+        # Keep counting into the same metrics when the engine recreates its pool (e.g. after dispose)
+        new_pool = super().recreate()
+        new_pool.metrics = self.metrics
+        return new_pool
+
+
+def database_url():
+    with open(DB_SECRETS_PATH) as f:
+        secrets = json.load(f)
+    return URL.create('postgresql+psycopg2', username=DB_USER, password=secrets['db_password'],
+                      host=DB_HOST, port=int(DB_PORT), database=DB_NAME)
+
+
+def create_db_engine(statement_timeout_ms=None, pool_size=None):
+    """
+    Creates a pooled engine. Both arguments default to the interactive settings above.
+    """
+    statement_timeout_ms = DB_STATEMENT_TIMEOUT_MS if statement_timeout_ms is None else statement_timeout_ms
+    connect_args = {}
+    if statement_timeout_ms:
+        connect_args['options'] = f"-c statement_timeout={int(statement_timeout_ms)}"
+    return create_engine(
+        database_url(),
+        poolclass=TimedQueuePool,
+        pool_size=pool_size or DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
+
+_engine = None
+
+
+def get_engine():
+    """The pipeline's shared engine, created on first use (no statement timeout, see DB_LOAD_STATEMENT_TIMEOUT_MS)."""
+    global _engine
+    if _engine is None:
+        _engine = create_db_engine(statement_timeout_ms=DB_LOAD_STATEMENT_TIMEOUT_MS)
+    return _engine
+
+
+def pool_metrics(engine):
+    """Pool counters of an engine created by create_db_engine, plus the pool's current state."""
+    pool = engine.pool
+    metrics = pool.metrics.snapshot() if isinstance(pool, TimedQueuePool) else {}
+    metrics.update({
+        'pool_size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'overflow': pool.overflow(),
+    })
+    return metrics
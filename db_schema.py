@@ -0,0 +1,171 @@
+# --- Database Schema ---
+# Managed schema of the processed news table. Instead of the types to_sql infers it uses
+# DATE, SMALLINT year and generated month/quarter, enum category and day_of_week, SMALLINT cluster
+# and REAL sentiment scores, indexed on date (BRIN), (category, date), (cluster, date), web_url and compound.
+# The materialized views hold count, mean/min/max and the additive sums (compound, its square and
+# neg/neu/pos) per category x cluster for every day, month and quarter, and are refreshed by the
+# loaders after each ingest (refresh_views). The daily view is the dashboard's sentiment cube.
+DB_PROCESSED_DATA_TABLE_NAME = "news_data_final"
+CATEGORY_TYPE_NAME = "news_category"
+DAY_OF_WEEK_TYPE_NAME = "news_day_of_week"
+DAYS_OF_WEEK = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Word cloud term counts per group, see term_frequencies.py (replaced on every load)
+TERM_FREQUENCY_TABLE_NAME = "news_term_frequencies"
+TERM_FREQUENCY_COLUMNS = ['source', 'year', 'category', 'cluster', 'sentiment', 'term', 'count']
+
+# Single row with the time of the last load, the dashboard keys its cached aggregates on it
+DATA_VERSION_TABLE_NAME = "news_data_version"
+
+# Columns written by the loaders, in COPY order (month and quarter are generated by Postgres)
+LOADED_COLUMNS = ['date', 'year', 'headline', 'content', 'web_url', 'category', 'day_of_week',
+                  'cluster', 'neg', 'neu', 'pos', 'compound']
+
+# Index name suffix -> indexed columns
+TABLE_INDEXES = {
+    'date_brin': ['date'],
+    'category_date': ['category', 'date'],
+    'cluster_date': ['cluster', 'date'],
+    'web_url': ['web_url'],
+    'compound': ['compound'],   # Serves the Top N articles (ORDER BY compound ... LIMIT n)
+}
+# Index name suffix -> access method, B-tree otherwise. Articles arrive in publication order (the
+# dump is chronological and increments are appended), so a BRIN index of a few pages covers the
+# date range scans; the composite B-trees serve the category and cluster filters.
+TABLE_INDEX_METHODS = {
+    'date_brin': 'brin',
+}
+
+# Materialized view -> time grain columns (grouped together with category and cluster)
+AGGREGATE_VIEWS = {
+    'news_sentiment_daily': ['date'],
+    'news_sentiment_monthly': ['year', 'month'],
+    'news_sentiment_quarterly': ['year', 'quarter'],
+}
+
+
+def create_types_sql():
+    """Statements creating the enum types if they do not exist yet."""
+    day_values = ', '.join(f"''{day}''" for day in DAYS_OF_WEEK)
+    return [
+        f"""DO $$ BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = '{CATEGORY_TYPE_NAME}') THEN
+                CREATE TYPE {CATEGORY_TYPE_NAME} AS ENUM ();
+            END IF;
+            IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = '{DAY_OF_WEEK_TYPE_NAME}') THEN
+                EXECUTE 'CREATE TYPE {DAY_OF_WEEK_TYPE_NAME} AS ENUM ({day_values})';
+            END IF;
+        END $$;""",
+    ]
+
+
+def ensure_types(cur, categories):
+    """
+    Creates the enum types and adds any category not seen before. Must be committed before rows
+    using the new values are written.
+    """
+    for statement in create_types_sql():
+        cur.execute(statement)
+    for category in sorted(set(categories)):
+        # ADD VALUE does not accept bind parameters, quote the literal explicitly
+        literal = "'" + str(category).replace("'", "''") + "'"
+        cur.execute(f"ALTER TYPE {CATEGORY_TYPE_NAME} ADD VALUE IF NOT EXISTS {literal};")
+
+
+def create_table_sql(table_name):
+    return f"""
+        CREATE TABLE {table_name} (
+            date DATE NOT NULL,
+            year SMALLINT NOT NULL,
+            month SMALLINT GENERATED ALWAYS AS (EXTRACT(MONTH FROM date)::SMALLINT) STORED,
+            quarter SMALLINT GENERATED ALWAYS AS (EXTRACT(QUARTER FROM date)::SMALLINT) STORED,
+            headline TEXT,
+            content TEXT,
+            web_url TEXT NOT NULL,
+            category {CATEGORY_TYPE_NAME} NOT NULL,
+            day_of_week {DAY_OF_WEEK_TYPE_NAME},
+            cluster SMALLINT NOT NULL,
+            neg REAL,
+            neu REAL,
+            pos REAL,
+            compound REAL CHECK (compound BETWEEN -1 AND 1)
+        );"""
+
+
+def create_term_frequency_table_sql(table_name=TERM_FREQUENCY_TABLE_NAME):
+    return [
+        f"""
+        CREATE TABLE {table_name} (
+            source TEXT NOT NULL,
+            year SMALLINT NOT NULL,
+            category {CATEGORY_TYPE_NAME} NOT NULL,
+            cluster SMALLINT NOT NULL,
+            sentiment TEXT NOT NULL,
+            term TEXT NOT NULL,
+            count INTEGER NOT NULL
+        );""",
+        f"CREATE INDEX {table_name}_group_idx ON {table_name} (source, year, category, cluster);",
+    ]
+
+
+def create_indexes_sql(table_name):
+    return [f"CREATE INDEX {table_name}_{suffix}_idx ON {table_name} "
+            f"USING {TABLE_INDEX_METHODS.get(suffix, 'btree')} ({', '.join(columns)});"
+            for suffix, columns in TABLE_INDEXES.items()]
+
+
+def create_views_sql(table_name, view_suffix=''):
+    """Statements creating the aggregate views (and their unique indexes) over table_name."""
+    statements = []
+    for view, grain in AGGREGATE_VIEWS.items():
+        view_name = f"{view}{view_suffix}"
+        keys = ', '.join(grain + ['category', 'cluster'])
+        statements.append(f"""
+            CREATE MATERIALIZED VIEW {view_name} AS
+            SELECT {keys},
+                   COUNT(*) AS n_articles,
+                   AVG(compound) AS mean_compound,
+                   MIN(compound) AS min_compound,
+                   MAX(compound) AS max_compound,
+                   SUM(compound::DOUBLE PRECISION) AS sum_compound,
+                   SUM(compound::DOUBLE PRECISION * compound) AS sumsq_compound,
+                   SUM(neg::DOUBLE PRECISION) AS sum_neg,
+                   SUM(neu::DOUBLE PRECISION) AS sum_neu,
+                   SUM(pos::DOUBLE PRECISION) AS sum_pos
+            FROM {table_name}
+            GROUP BY {keys};""")
+        # A unique index is required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+        statements.append(f"CREATE UNIQUE INDEX {view_name}_key_idx ON {view_name} ({keys});")
+    return statements
+
+
+def staged_renames(table_name, staging_suffix):
+    """
+    (kind, staging name, final name) of every object built for a staging copy of table_name,
+    renamed in place when the staging copy is swapped in.
+    """
+    staging_table = f"{table_name}{staging_suffix}"
+    renames = [('TABLE', staging_table, table_name)]
+    renames += [('INDEX', f"{staging_table}_{suffix}_idx", f"{table_name}_{suffix}_idx") for suffix in TABLE_INDEXES]
+    for view in AGGREGATE_VIEWS:
+        renames.append(('MATERIALIZED VIEW', f"{view}{staging_suffix}", view))
+        renames.append(('INDEX', f"{view}{staging_suffix}_key_idx", f"{view}_key_idx"))
+    return renames
+
+
+def record_data_version(cur):
+    """Stamps the load in the data version table, committed together with the loaded rows."""
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DATA_VERSION_TABLE_NAME} (
+            id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+            refreshed_at TIMESTAMPTZ NOT NULL
+        );""")
+    cur.execute(f"""
+        INSERT INTO {DATA_VERSION_TABLE_NAME} (refreshed_at) VALUES (clock_timestamp())
+        ON CONFLICT (id) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at;""")
+
+
+def refresh_views(cur):
+    """Refreshes the aggregate views without blocking concurrent readers."""
+    for view in AGGREGATE_VIEWS:
+        cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view};")
@@ -0,0 +1,67 @@
+import os
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.preprocessing import normalize
+
+
+# --- Feature Extraction Configuration ---
+# 'tfidf' fits a TfidfVectorizer over the whole corpus (the original behaviour).
+# 'hashing' uses a stateless HashingVectorizer that emits sparse vectors chunk by chunk, with an
+# optional IDF reweighting computed in one streamed pass, so memory is bounded by the chunk size.
+FEATURE_EXTRACTOR = os.getenv("FEATURE_EXTRACTOR", "tfidf")
+FEATURE_CHUNK_SIZE = int(os.getenv("FEATURE_CHUNK_SIZE", "50000"))
+HASHING_N_FEATURES = int(os.getenv("HASHING_N_FEATURES", str(2 ** 18)))
+HASHING_USE_IDF = os.getenv("HASHING_USE_IDF", "1") == "1"
+FEATURE_EXTRACTORS = ('tfidf', 'hashing')
+
+
+def iter_text_chunks(texts, chunk_size=None):
+    """Yields consecutive chunks of a Series or list of preprocessed texts."""
+    chunk_size = chunk_size or FEATURE_CHUNK_SIZE
+    for start in range(0, len(texts), chunk_size):
+        yield texts[start:start + chunk_size]
+
+
+class HashingFeatureExtractor:
+    """
+    Streaming replacement for TfidfVectorizer: term counts are hashed into n_features columns,
+    optionally reweighted by a smoothed IDF (same formula as TfidfVectorizer) and L2-normalized.
+    """
+
+    def __init__(self, n_features=None, use_idf=None, idf=None):
+        self.n_features = n_features or HASHING_N_FEATURES
+        self.use_idf = HASHING_USE_IDF if use_idf is None else use_idf
+        self.idf_ = idf
+        # Raw counts, normalization is applied after the IDF weighting
+        self.hashing_vectorizer = HashingVectorizer(n_features=self.n_features, alternate_sign=False, norm=None)
+
+    def get_config(self):
+        return {'n_features': self.n_features, 'use_idf': self.use_idf}
+
+    def fit(self, text_chunks):
+        """Computes the IDF weights in one pass over a stream of text chunks (no-op without IDF)."""
+        if not self.use_idf:
+            return self
+        n_documents = 0
+        document_frequency = np.zeros(self.n_features, dtype=np.int64)
+        for chunk in text_chunks:
+            counts = self.hashing_vectorizer.transform(chunk)
+            document_frequency += np.bincount(counts.indices, minlength=self.n_features)
+            n_documents += counts.shape[0]
+        self.idf_ = np.log((1 + n_documents) / (1 + document_frequency)) + 1
+        return self
+
+    def transform(self, texts):
+        """Returns the L2-normalized sparse document vectors of one chunk of texts."""
+        vectors = self.hashing_vectorizer.transform(texts).astype(np.float64)
+        if self.use_idf:
+            if self.idf_ is None:
+                raise ValueError("HashingFeatureExtractor with use_idf=True must be fitted before transform.")
+            vectors = vectors @ sp.diags(self.idf_)
+        return normalize(vectors, norm='l2', copy=False).tocsr()
+
+    def transform_chunks(self, text_chunks):
+        """Yields the document vectors of a stream of text chunks."""
+        for chunk in text_chunks:
+            yield self.transform(chunk)
@@ -0,0 +1,30 @@
+import ast
+from instrumentation import run_recorder
+
+
+# Matches the leading 'main' entry of a headline dict repr, e.g. {'main': 'Some Headline', 'kicker': None, ...}.
+# Only values without backslash escapes are matched, so the captured text is exactly what
+# ast.literal_eval would return for them. Everything else goes through the literal_eval fallback.
+MAIN_HEADLINE_PATTERN = r"""^\{'main': (?:'([^'\\]*)'|"([^"\\]*)")"""
+
+
+def parse_headline_literal(value):
+    """Slow path: evaluates the whole headline dict literal and returns its 'main' field."""
+    return ast.literal_eval(value)['main']
+
+
+def extract_main_headlines(headlines):
+    """
+    Extracts the 'main' field from a pandas Series of headline dict literals.
+    Uses a vectorized regex extract and only evaluates the rows it cannot handle.
+    """
+    extracted = headlines.str.extract(MAIN_HEADLINE_PATTERN)
+    main = extracted[0].fillna(extracted[1])
+
+    unmatched = main.isna()
+    run_recorder.count('headlines_regex', len(main) - int(unmatched.sum()))
+    if unmatched.any():
+        with run_recorder.step('headline_literal_eval', rows=int(unmatched.sum())):
+            main = main.astype(object)
+            main[unmatched] = headlines[unmatched].apply(parse_headline_literal)
+    return main
@@ -0,0 +1,64 @@
+import os
+import json
+from datetime import datetime
+import pandas as pd
+
+
+# --- Incremental Pipeline Configuration ---
+# With INCREMENTAL_MODE=1 data_cleaning.py, model.py and aws_db.py only process articles published
+# at or after the watermark of the last successful load, and aws_db.py upserts them by web_url.
+# The watermark's own pub_date is read again, so articles sharing it that arrive in a later snapshot
+# are not lost; the ones already loaded are replaced by the upsert.
+INCREMENTAL_MODE = os.getenv("INCREMENTAL_MODE", "0") == "1"
+PIPELINE_STATE_PATH = os.getenv("PIPELINE_STATE_PATH", "pipeline_state.json")
+
+
+def load_state():
+    """Returns the persisted pipeline state, or an empty state on the first run."""
+    if not os.path.exists(PIPELINE_STATE_PATH):
+        return {}
+    with open(PIPELINE_STATE_PATH) as f:
+        return json.load(f)
+
+
+def save_state(state):
+    # Write to a temporary file first so a crash never leaves a truncated state file
+    tmp_path = PIPELINE_STATE_PATH + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, PIPELINE_STATE_PATH)
+
+
+def get_watermark():
+    """Returns the pub_date watermark of the last successful load, or None if nothing was loaded yet."""
+    watermark = load_state().get('watermark')
+    return pd.Timestamp(watermark) if watermark else None
+
+
+def watermark_filters():
+    """Storage filters selecting the rows published at or after the watermark (None selects everything)."""
+    watermark = get_watermark()
+    return [('pub_date', '>=', watermark)] if watermark is not None else None
+
+
+def set_pending_watermark(max_pub_date):
+    """
+    Records the newest pub_date of the batch being processed. It only becomes the watermark once
+    the batch has been loaded into the database (see commit_watermark), so a failed run is retried.
+    """
+    if max_pub_date is None or pd.isna(max_pub_date):
+        return
+    state = load_state()
+    state['pending_watermark'] = pd.Timestamp(max_pub_date).isoformat()
+    save_state(state)
+
+
+def commit_watermark():
+    """Promotes the pending watermark after a successful load. Returns the new watermark."""
+    state = load_state()
+    pending = state.pop('pending_watermark', None)
+    if pending is not None:
+        state['watermark'] = pending
+        state['loaded_at'] = datetime.now().isoformat(timespec='seconds')
+        save_state(state)
+    return state.get('watermark')
@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import time
+import atexit
+import pstats
+import cProfile
+import resource
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+
+# --- Instrumentation Configuration ---
+# Every pipeline script records timers (wall and CPU time, rows/sec, memory high-water mark) around
+# its expensive steps, plus counters and cache hit rates, and writes them as one JSON run report
+# per run to RUN_REPORT_DIR (set it to '' to disable the reports). Worker processes send their
+# measurements back with their results (drain/merge, like the token cache).
+# PROFILE_STAGES=model,clean (or 'all') additionally runs those stages under cProfile and stores
+# the .prof file in PROFILE_DIR, with the top functions by cumulative time in the run report.
+RUN_REPORT_DIR = os.getenv("RUN_REPORT_DIR", "run_reports")
+PROFILE_STAGES = {stage.strip() for stage in os.getenv("PROFILE_STAGES", "").split(',') if stage.strip()}
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_TOP_N = 25
+
+
+def _peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux (bytes on macOS)
+    return resource.getrusage(who).ru_maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+
+class RunRecorder:
+    """
+    Collects the measurements of one stage run. Steps with the same name accumulate (calls, time,
+    rows), so a step can be timed once around a whole phase or once per item inside a loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()   # Steps and counters are also recorded from transfer threads
+        self.stage = None
+        self.started_at = None
+        self._start_wall = None
+        self._start_cpu = None
+        self._profiler = None
+        self.reset()
+
+    def reset(self):
+        self.steps = {}
+        self.counters = {}
+        self.caches = {}
+
+    # --- Recording ---
+    def add_step(self, name, wall_seconds=0.0, cpu_seconds=0.0, rows=0, calls=1, rss_growth_mb=0.0):
+        with self._lock:
+            step = self.steps.setdefault(name, {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'rows': 0,
+                                                'peak_rss_mb': 0.0, 'rss_growth_mb': 0.0})
+            step['calls'] += calls
+            step['wall_seconds'] += wall_seconds
+            step['cpu_seconds'] += cpu_seconds
+            step['rows'] += int(rows or 0)
+            step['rss_growth_mb'] += rss_growth_mb
+        return step
+
+    @contextmanager
+    def step(self, name, rows=None):
+        """
+        Times a block. CPU time includes worker processes that finish inside the block; the memory
+        figures are the process high-water mark at the end of the block and how much it grew.
+        rows can also be set on the yielded dict, e.g. when only known at the end.
+        """
+        measure = {'rows': rows}
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        start_children = os.times()
+        start_peak = _peak_rss_mb()
+        try:
+            yield measure
+        finally:
+            end_children = os.times()
+            children_cpu = ((end_children.children_user - start_children.children_user) +
+                            (end_children.children_system - start_children.children_system))
+            peak = _peak_rss_mb()
+            step = self.add_step(name, time.perf_counter() - start_wall, time.process_time() - start_cpu + children_cpu,
+                                 measure['rows'], rss_growth_mb=peak - start_peak)
+            step['peak_rss_mb'] = max(step['peak_rss_mb'], peak, _peak_rss_mb(resource.RUSAGE_CHILDREN))
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    def record_cache(self, name, hits, misses):
+        with self._lock:
+            cache = self.caches.setdefault(name, {'hits': 0, 'misses': 0})
+            cache['hits'] += int(hits)
+            cache['misses'] += int(misses)
+
+    # --- Worker processes ---
+    def drain(self):
+        """Returns and clears everything recorded since the last drain (sent back by worker processes)."""
+        with self._lock:
+            delta = {'steps': self.steps, 'counters': self.counters, 'caches': self.caches}
+            self.reset()
+        return delta
+
+    def merge(self, delta):
+        """Adds a drained delta from a worker process."""
+        for name, step in delta['steps'].items():
+            merged = self.add_step(name, step['wall_seconds'], step['cpu_seconds'], step['rows'], step['calls'],
+                                   step['rss_growth_mb'])
+            merged['peak_rss_mb'] = max(merged['peak_rss_mb'], step['peak_rss_mb'])
+        for name, n in delta['counters'].items():
+            self.count(name, n)
+        for name, cache in delta['caches'].items():
+            self.record_cache(name, cache['hits'], cache['misses'])
+
+    # --- Run lifecycle ---
+    def start(self, stage):
+        """Starts recording a stage run; the report is written when the script exits."""
+        self.stage = stage
+        self.started_at = datetime.now()
+        self._start_wall, self._start_cpu = time.perf_counter(), time.process_time()
+        if stage in PROFILE_STAGES or 'all' in PROFILE_STAGES:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        atexit.register(self.finish)
+
+    def report(self):
+        """The run report: totals, steps (with rows/sec), counters and cache hit rates."""
+        children = os.times()
+        steps = {}
+        for name, step in self.steps.items():
+            steps[name] = {**step, 'rows_per_second': step['rows'] / step['wall_seconds']
+                           if step['rows'] and step['wall_seconds'] else None}
+        caches = {name: {**cache, 'hit_rate': cache['hits'] / (cache['hits'] + cache['misses'])
+                         if cache['hits'] + cache['misses'] else None}
+                  for name, cache in self.caches.items()}
+        return {
+            'stage': self.stage,
+            'started_at': self.started_at.isoformat(timespec='seconds') if self.started_at else None,
+            'wall_seconds': time.perf_counter() - self._start_wall if self._start_wall else None,
+            'cpu_seconds': time.process_time() - self._start_cpu if self._start_cpu is not None else None,
+            'children_cpu_seconds': children.children_user + children.children_system,
+            'peak_rss_mb': _peak_rss_mb(),
+            'children_peak_rss_mb': _peak_rss_mb(resource.RUSAGE_CHILDREN),
+            'steps': steps,
+            'counters': dict(self.counters),
+            'caches': caches,
+        }
+
+    def _stop_profiler(self, timestamp):
+        """Stops cProfile, saves the .prof file and returns its path and top functions."""
+        self._profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{self.stage}_{timestamp}.prof")
+        self._profiler.dump_stats(path)
+        stats = pstats.Stats(self._profiler)
+        top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP_N]
+        self._profiler = None
+        return {'path': path, 'top_cumulative': [
+            {'function': f"{filename}:{line}({function})", 'calls': calls, 'total_seconds': total,
+             'cumulative_seconds': cumulative}
+            for (filename, line, function), (_, calls, total, cumulative, _) in top]}
+
+    def finish(self):
+        """Writes the JSON run report (and the profile) and prints the step summary."""
+        if self.stage is None:
+            return None
+        timestamp = self.started_at.strftime('%Y%m%dT%H%M%S')
+        profile = self._stop_profiler(timestamp) if self._profiler is not None else None
+        report = self.report()
+        if profile:
+            report['profile'] = profile
+        print_report(report)
+        path = None
+        if RUN_REPORT_DIR:
+            os.makedirs(RUN_REPORT_DIR, exist_ok=True)
+            path = os.path.join(RUN_REPORT_DIR, f"{self.stage}_{timestamp}.json")
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"Run report written to '{path}'.")
+        self.stage = None
+        return path
+
+
+def print_report(report):
+    print(f"\n--- Run report: {report['stage']} ({report['wall_seconds']:.1f} s wall, "
+          f"{report['cpu_seconds']:.1f} s CPU, peak RSS {report['peak_rss_mb']:.0f} MB) ---")
+    print(f"{'Step':<28} {'Calls':>7} {'Wall (s)':>10} {'CPU (s)':>10} {'Rows':>10} {'Rows/s':>12} {'Peak RSS (MB)':>14}")
+    for name, step in report['steps'].items():
+        rows_per_second = f"{step['rows_per_second']:.0f}" if step['rows_per_second'] else ''
+        peak = f"{step['peak_rss_mb']:.0f}" if step['peak_rss_mb'] else ''
+        print(f"{name:<28} {step['calls']:>7} {step['wall_seconds']:>10.2f} {step['cpu_seconds']:>10.2f} "
+              f"{step['rows'] or '':>10} {rows_per_second:>12} {peak:>14}")
+    for name, cache in report['caches'].items():
+        if cache['hit_rate'] is not None:
+            print(f"Cache {name}: {cache['hits']} hits, {cache['misses']} misses ({cache['hit_rate']:.1%})")
+    for name, n in report['counters'].items():
+        print(f"Counter {name}: {n}")
+
+
+# Recorder of the current process, started by each pipeline script with run_recorder.start(stage)
+run_recorder = RunRecorder()
@@ -2,25 +2,20 @@
 import pandas as pd
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans
 import matplotlib.pyplot as plt
 from wordcloud import WordCloud
-from nltk.tokenize import word_tokenize
-from nltk.stem import WordNetLemmatizer
-from nltk.corpus import stopwords
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
 import nltk
 import os
-import joblib # Keep joblib if you use it elsewhere, otherwise it could be removed
-import psycopg2
-from datetime import datetime
-from sqlalchemy import create_engine
-import pickle # Import the pickle module for in-memory serialization
-import json
-
-# Load secrets from secrets.json
-with open('.vscode/secrets.json') as f:
-    secrets = json.load(f)
+from storage import read_frame, write_frame, stage_path
+from preprocessing import PreprocessingEngine, token_cache
+from sentiment import score_texts, SENTIMENT_COLUMNS
+from incremental import INCREMENTAL_MODE
+from model_store import save_models, load_models, CentroidModel, MODEL_DIR
+from clustering import (CLUSTERING_ENGINE, N_CLUSTERS, K_SELECTION_SAMPLE_SIZE, fit_clusters, iter_row_chunks,
+                        update_centroids, stratified_sample, select_k)
+from features import FEATURE_EXTRACTOR, HashingFeatureExtractor, iter_text_chunks
+from term_frequencies import build_term_frequencies, update_term_frequencies
+from instrumentation import run_recorder
 
 # --- NLTK Downloads (Corrected and robust check) ---
 required_nltk_data = ['punkt', 'wordnet', 'stopwords', 'vader_lexicon']
@@ -36,15 +31,26 @@ for data_name in required_nltk_data:
 
 # --- Configuration Parameters ---
 TFIDF_MAX_FEATURES = 5000
-KMEANS_RANDOM_STATE = 42
-KMEANS_N_INIT = 10
+# FEATURE_EXTRACTOR=tfidf|hashing selects the feature extraction stage (see features.py)
+# K-Means settings and the engine choice (CLUSTERING_ENGINE=kmeans|minibatch) live in clustering.py
+
+# Fit mode refits TF-IDF and K-Means and saves them as a new model version (see model_store.py).
+# Transform-only mode scores the articles against a saved version without refitting,
+# it is implied by INCREMENTAL_MODE. MODEL_VERSION selects a version (default: latest).
+TRANSFORM_ONLY = os.getenv("TRANSFORM_ONLY", "0") == "1" or INCREMENTAL_MODE
+MODEL_VERSION = os.getenv("MODEL_VERSION") or None
+# In transform-only mode, move the saved centroids towards the new batch and save a new version
+ONLINE_CLUSTER_UPDATE = os.getenv("ONLINE_CLUSTER_UPDATE", "0") == "1"
+
+run_recorder.start('model')
 
 
 # --- 1. Data Loading ---
 try:
-    df = pd.read_csv("cleaned_news_data.csv")
-    if 'Unnamed: 0' in df.columns:
-        df.drop(['Unnamed: 0'], axis=1, inplace=True)
+    # Categories are decoded to plain strings since they are concatenated with the headline below
+    with run_recorder.step('read_cleaned') as measure:
+        df = read_frame('cleaned', categorical=False)
+        measure['rows'] = len(df)
     print("Data loaded successfully.")
     print(f"Initial DataFrame shape: {df.shape}")
     print(df.info())
@@ -52,127 +58,163 @@ try:
     print(df.isnull().sum())
     print("-" * 50)
 except FileNotFoundError:
-    print("Error: 'cleaned_news_data.csv' not found. Please ensure the file exists in the same directory.")
+    print(f"Error: '{stage_path('cleaned')}' not found. Please ensure the file exists in the same directory.")
     exit()
 
+if TRANSFORM_ONLY:
+    try:
+        vectorizer, kmeans, model_metadata = load_models(MODEL_VERSION)
+    except FileNotFoundError as e:
+        print(f"Error: {e}")
+        exit()
+    print(f"Transform-only mode: using saved model version '{model_metadata['version']}' "
+          f"({model_metadata['n_clusters']} clusters, {model_metadata['n_features']} features).")
+
+if INCREMENTAL_MODE:
+    if df.empty:
+        print("Incremental mode: no new articles since the last run.")
+        write_frame(df.assign(cluster=0, neg=0.0, neu=0.0, pos=0.0, compound=0.0), 'final_increment')
+        exit()
+    print(f"Incremental mode: processing {len(df)} new articles with the saved models.")
+
 # --- 2. Text Preprocessing for Clustering and Sentiment Analysis ---
 df['headline'] = df['headline'].fillna('')
 df['content'] = df['content'].fillna('')
 df['category'] = df['category'].fillna('')
 
 print("--- Starting Text Preprocessing ---")
-stop_words = set(stopwords.words('english'))
-lemmatizer = WordNetLemmatizer()
-
-def preprocess_text_for_ml(text):
-    if not isinstance(text, str):
-        return ""
-    words = word_tokenize(text)
-    processed_words = [
-        lemmatizer.lemmatize(word.lower())
-        for word in words
-        if word.lower() not in stop_words and word.isalpha()
-    ]
-    return ' '.join(processed_words)
+# Tokenization, stopword removal and lemmatization run sharded on a process pool
+# (PREPROCESS_WORKERS, PREPROCESS_CHUNK_SIZE, PREPROCESS_SERIAL=1 for the in-process debug path)
+preprocessing_engine = PreprocessingEngine()
+print(f"Preprocessing with {1 if preprocessing_engine.serial else preprocessing_engine.n_workers} worker(s), "
+      f"{preprocessing_engine.chunk_size} rows per shard.")
+
+# Each source column is tokenized once, downstream columns are views of that token stream
+PREPROCESSING_OUTPUTS = {
+    'processed_text_for_clustering': ('full_text_for_clustering', 'clustering'),
+    'cleaned_content_for_sentiment': ('content', 'sentiment'),
+}
 
 df['full_text_for_clustering'] = df['category'] + " " + df['headline']
-df['processed_text_for_clustering'] = df['full_text_for_clustering'].apply(preprocess_text_for_ml)
-
-def clean_text_for_sentiment(text):
-    if not isinstance(text, str):
-        return ""
-    words = word_tokenize(text)
-    cleaned_words = [word.lower() for word in words if word.lower() not in stop_words]
-    return ' '.join(cleaned_words)
-
-df['cleaned_content_for_sentiment'] = df['content'].apply(clean_text_for_sentiment)
-
+with run_recorder.step('preprocess', rows=len(df)):
+    processed_text = preprocessing_engine.run(df, PREPROCESSING_OUTPUTS)
+for column in PREPROCESSING_OUTPUTS:
+    df[column] = processed_text[column]
+
+cache_stats = token_cache.stats()
+run_recorder.record_cache('token_lookup', cache_stats['hits'], cache_stats['misses'])
+run_recorder.record_cache('lemmatize', cache_stats['lemma_hits'], cache_stats['lemma_misses'])
+# Lemmatizer time of the cache misses, summed over the workers
+run_recorder.add_step('lemmatize', cache_stats['lemma_seconds'], rows=cache_stats['lemma_misses'])
+print(f"Token cache: {cache_stats['size']} entries, lookup hit rate {cache_stats['hit_rate']:.1%}, "
+      f"lemmatize hit rate {cache_stats['lemma_hit_rate']:.1%}")
 print("Text preprocessing complete.")
 print("-" * 50)
 
 # --- 3. Feature Extraction (Text Vectorization) ---
-print("--- Starting Feature Extraction (TF-IDF) ---")
-vectorizer = TfidfVectorizer(max_features=TFIDF_MAX_FEATURES)
-document_vectors = vectorizer.fit_transform(df['processed_text_for_clustering'])
-
-print(f"TF-IDF Vectorization complete. Document vectors shape: {document_vectors.shape}")
+if TRANSFORM_ONLY:
+    print("--- Starting Feature Extraction (saved model) ---")
+    # Reuse the saved vocabulary / hashing configuration and IDF weights
+    with run_recorder.step('vectorize', rows=len(df)):
+        document_vectors = vectorizer.transform(df['processed_text_for_clustering'])
+    print(f"Vectorization complete. Document vectors shape: {document_vectors.shape}")
+elif FEATURE_EXTRACTOR == 'hashing':
+    print("--- Starting Feature Extraction (Hashing) ---")
+    # Stateless hashing, only the IDF weights need one streamed pass. The document vectors are
+    # produced chunk by chunk while clustering, so the full matrix is never built here.
+    vectorizer = HashingFeatureExtractor()
+    with run_recorder.step('hashing_idf', rows=len(df)):
+        vectorizer.fit(iter_text_chunks(df['processed_text_for_clustering']))
+    document_vectors = None
+    print(f"Hashing feature extraction ready: {vectorizer.n_features} features, IDF reweighting {'on' if vectorizer.use_idf else 'off'}.")
+else:
+    print("--- Starting Feature Extraction (TF-IDF) ---")
+    vectorizer = TfidfVectorizer(max_features=TFIDF_MAX_FEATURES)
+    with run_recorder.step('tfidf', rows=len(df)):
+        document_vectors = vectorizer.fit_transform(df['processed_text_for_clustering'])
+    print(f"TF-IDF Vectorization complete. Document vectors shape: {document_vectors.shape}")
 print("-" * 50)
 
 # --- 4. Clustering (K-Means) ---
 print("--- Starting K-Means Clustering ---")
-no_of_clusters = len(df['category'].unique())
-print(f"K-Means will attempt to form {no_of_clusters} clusters (based on unique 'category' labels).")
-
-kmeans = KMeans(n_clusters=no_of_clusters, random_state=KMEANS_RANDOM_STATE, n_init=KMEANS_N_INIT)
-df['cluster'] = kmeans.fit_predict(document_vectors)
-
-inertia = kmeans.inertia_
-print(f'K-Means Clustering complete. Model inertia: {inertia:.2f}')
+if TRANSFORM_ONLY and ONLINE_CLUSTER_UPDATE and kmeans.cluster_counts_ is not None:
+    # Assign the new batch and fold it into the saved centroids without revisiting history
+    with run_recorder.step('kmeans_online_update', rows=len(df)):
+        centers, counts, cluster_labels, inertia = update_centroids(
+            kmeans.cluster_centers_, kmeans.cluster_counts_, iter_row_chunks(document_vectors))
+    df['cluster'] = cluster_labels
+    print(f'Updated the {kmeans.n_clusters} saved centroids with {len(df)} articles. Batch inertia: {inertia:.2f}')
+
+    model_version = save_models(vectorizer, CentroidModel(centers), cluster_counts=counts, metadata={
+        'n_documents': int(counts.sum()),
+        'batch_inertia': inertia,
+        'clustering_engine': 'online_update',
+        'parent_version': model_metadata['version'],
+    })
+    print(f"Saved updated centroids as version '{model_version}' in '{MODEL_DIR}'.")
+elif TRANSFORM_ONLY:
+    # Assign articles to the nearest saved centroid
+    with run_recorder.step('kmeans_predict', rows=len(df)):
+        df['cluster'] = kmeans.predict(document_vectors)
+    print(f'Assigned articles to the {kmeans.n_clusters} saved K-Means clusters.')
+else:
+    k_selection = None
+    if N_CLUSTERS == 'auto':
+        # Evaluate a range of K on a category-stratified sample, in parallel, and keep the best silhouette
+        sample_index = stratified_sample(df['category'], K_SELECTION_SAMPLE_SIZE)
+        if document_vectors is None:
+            sample_vectors = vectorizer.transform(df['processed_text_for_clustering'].iloc[sample_index])
+        else:
+            sample_vectors = document_vectors[sample_index]
+        with run_recorder.step('k_selection', rows=len(sample_index)):
+            no_of_clusters, k_curve = select_k(sample_vectors)
+        k_selection = {'method': 'silhouette', 'sample_size': len(sample_index), 'curve': k_curve}
+
+        print(f"K selection on a stratified sample of {len(sample_index)} articles:")
+        print(pd.DataFrame(k_curve).to_string(index=False))
+        print(f"K-Means ({CLUSTERING_ENGINE}) will attempt to form {no_of_clusters} clusters (best silhouette).")
+    elif N_CLUSTERS == 'categories':
+        no_of_clusters = len(df['category'].unique())
+        print(f"K-Means ({CLUSTERING_ENGINE}) will attempt to form {no_of_clusters} clusters (based on unique 'category' labels).")
+    else:
+        no_of_clusters = int(N_CLUSTERS)
+        print(f"K-Means ({CLUSTERING_ENGINE}) will attempt to form {no_of_clusters} clusters (N_CLUSTERS).")
+
+    with run_recorder.step('kmeans', rows=len(df)):
+        if document_vectors is None:
+            # Streamed: every pass re-hashes the preprocessed texts chunk by chunk
+            kmeans, cluster_labels, inertia = fit_clusters(
+                lambda: vectorizer.transform_chunks(iter_text_chunks(df['processed_text_for_clustering'])),
+                no_of_clusters)
+        else:
+            kmeans, cluster_labels, inertia = fit_clusters(document_vectors, no_of_clusters)
+    df['cluster'] = cluster_labels
+
+    print(f'K-Means Clustering complete. Model inertia: {inertia:.2f}')
+
+    model_version = save_models(vectorizer, kmeans,
+                                cluster_counts=np.bincount(cluster_labels, minlength=no_of_clusters),
+                                metadata={
+                                    'n_documents': len(df),
+                                    'inertia': inertia,
+                                    'clustering_engine': CLUSTERING_ENGINE,
+                                    'k_selection': k_selection,
+                                })
+    print(f"Saved TF-IDF vectorizer and K-Means model as version '{model_version}' in '{MODEL_DIR}'.")
 
 print("\nK-Means Cluster Distribution:")
 print(df['cluster'].value_counts().sort_index())
 print("-" * 50)
 
-# # --- Store K-Means Model in PostgreSQL DB ---
-# print("--- Storing K-Means Model in PostgreSQL DB ---")
-# conn_model = None
-# cur_model = None
-# try:
-#     # Corrected Line: Use pickle.dumps() for in-memory serialization
-#     serialized_kmeans_model = pickle.dumps(kmeans)
-#     model_name = f"KMeans_Clustering_Model_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-
-#     conn_model = psycopg2.connect(
-#         host=DB_HOST,
-#         database=DB_NAME,
-#         user=DB_USER,
-#         password=DB_PASSWORD,
-#         port=DB_PORT
-#     )
-#     cur_model = conn_model.cursor()
-
-#     cur_model.execute("""
-#         CREATE TABLE IF NOT EXISTS ml_models (
-#             id SERIAL PRIMARY KEY,
-#             model_name VARCHAR(255) NOT NULL,
-#             model_data BYTEA NOT NULL,
-#             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-#         );
-#     """)
-#     conn_model.commit()
-
-#     cur_model.execute(
-#         "INSERT INTO ml_models (model_name, model_data) VALUES (%s, %s);",
-#         (model_name, serialized_kmeans_model)
-#     )
-#     conn_model.commit()
-#     print(f"K-Means model '{model_name}' stored successfully in PostgreSQL.")
-
-# except psycopg2.Error as e:
-#     print(f"Error storing K-Means model in PostgreSQL: {e}")
-#     if conn_model:
-#         conn_model.rollback()
-# finally:
-#     if cur_model:
-#         cur_model.close()
-#     if conn_model:
-#         conn_model.close()
-#     print("-" * 50)
-
-
 # --- 5. Sentiment Analysis ---
 print("--- Starting Sentiment Analysis (VADER) ---")
-sia = SentimentIntensityAnalyzer()
+# Scored in batches on a process pool straight into a float32 (n, 4) array
+# (SENTIMENT_WORKERS, SENTIMENT_CHUNK_SIZE, SENTIMENT_SERIAL=1 for the in-process debug path)
+with run_recorder.step('sentiment', rows=len(df)):
+    sentiment_scores = score_texts(df['cleaned_content_for_sentiment'].tolist())
 
-def calculate_sentiment_score(text):
-    return sia.polarity_scores(text)
-
-df['sentiment_scores'] = df['cleaned_content_for_sentiment'].apply(calculate_sentiment_score)
-
-df['neg'] = df['sentiment_scores'].apply(lambda x: x['neg'])
-df['neu'] = df['sentiment_scores'].apply(lambda x: x['neu'])
-df['pos'] = df['sentiment_scores'].apply(lambda x: x['pos'])
-df['compound'] = df['sentiment_scores'].apply(lambda x: x['compound'])
+for i, column in enumerate(SENTIMENT_COLUMNS):
+    df[column] = sentiment_scores[:, i]
 
 print("Sentiment analysis complete.")
 print("-" * 50)
@@ -180,25 +222,49 @@ print("-" * 50)
 # --- 6. Final Data Cleaning and Push to PostgreSQL DB ---
 print("--- Finalizing Data and Pushing to PostgreSQL DB ---")
 
+# web_url is kept as the article key for incremental upserts
 columns_to_drop_final = [
-    'web_url', 'time', 'day', 'month',
+    'time', 'day', 'month',
     'full_text_for_clustering', 'processed_text_for_clustering',
-    'cleaned_content_for_sentiment', 'sentiment_scores'
+    'cleaned_content_for_sentiment'
 ]
 df.drop(columns=columns_to_drop_final, axis=1, inplace=True, errors='ignore')
 
 print("\nLast 50 rows of selected final columns:")
 print(df[['category', 'headline', 'cluster', 'neg', 'neu', 'pos', 'compound']].tail(50))
 
-df.to_csv("news_data_final.csv")
+batch_years = df['date'].dt.year.unique()
+
+if INCREMENTAL_MODE:
+    # The batch goes to aws_db.py for the upsert and is merged into the full final hand-off
+    write_frame(df, 'final_increment')
+    if os.path.exists(stage_path('final')):
+        previous_df = read_frame('final', categorical=False)
+        previous_df = previous_df[~previous_df['web_url'].isin(df['web_url'])]
+        df = pd.concat([previous_df, df], ignore_index=True)
 
-file_size = os.path.getsize('news_data_final.csv')
+with run_recorder.step('write_final', rows=len(df)):
+    write_frame(df, 'final')
+
+file_size = os.path.getsize(stage_path('final'))
+run_recorder.count('final_bytes', file_size)
 
 if file_size < 1024:
-    print(f"The size of the CSV file is: {file_size} bytes")
+    print(f"The size of the final data file is: {file_size} bytes")
 elif file_size < 1024 ** 2:
-    print(f"The size of the CSV file is: {file_size / 1024:.2f} KB")
+    print(f"The size of the final data file is: {file_size / 1024:.2f} KB")
 else:
-    print(f"The size of the CSV file is: {file_size / (1024 ** 2):.2f} MB")
+    print(f"The size of the final data file is: {file_size / (1024 ** 2):.2f} MB")
 
 
+# --- 7. Term Frequencies for the Dashboard Word Clouds ---
+print("--- Counting Word Cloud Terms ---")
+if INCREMENTAL_MODE and os.path.exists(stage_path('term_frequencies')):
+    # Only the years touched by the batch are recounted
+    with run_recorder.step('term_frequencies', rows=len(df)):
+        term_frequencies = update_term_frequencies(read_frame('term_frequencies', categorical=False), df, batch_years)
+else:
+    with run_recorder.step('term_frequencies', rows=len(df)):
+        term_frequencies = build_term_frequencies(df)
+write_frame(term_frequencies, 'term_frequencies')
+print(f"Saved {len(term_frequencies)} term counts to '{stage_path('term_frequencies')}'.")
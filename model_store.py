@@ -0,0 +1,221 @@
+import os
+import io
+import json
+import tarfile
+from datetime import datetime
+import numpy as np
+import sklearn
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics import pairwise_distances_argmin
+from features import HashingFeatureExtractor
+
+
+# --- Model Store Configuration ---
+# Fitted models are saved as versioned artifact directories under MODEL_DIR:
+#   vectorizer.json (type, parameters and TF-IDF vocabulary), idf.npy, centroids.npy, metadata.json
+#   and optionally cluster_counts.npy (documents per centroid, used for online centroid updates)
+# The NumPy arrays are memory-mapped on load, so a cold start only reads what predict touches.
+# With MODEL_STORE_BACKEND=postgres each version is also archived in the ml_models BYTEA table
+# and unpacked into MODEL_DIR the first time it is loaded on a machine.
+MODEL_DIR = os.getenv("MODEL_DIR", "models")
+MODEL_STORE_BACKEND = os.getenv("MODEL_STORE_BACKEND", "local")
+LATEST_POINTER = 'LATEST'
+DB_MODEL_TABLE_NAME = "ml_models"
+
+
+class CentroidModel:
+    """
+    Transform-only stand-in for a fitted KMeans: assigns each document to its nearest saved
+    centroid, which is what KMeans.predict does.
+    """
+
+    def __init__(self, cluster_centers, cluster_counts=None):
+        self.cluster_centers_ = cluster_centers
+        self.cluster_counts_ = cluster_counts
+        self.n_clusters = cluster_centers.shape[0]
+
+    def predict(self, document_vectors):
+        return pairwise_distances_argmin(document_vectors, self.cluster_centers_)
+
+
+def _vectorizer_params(vectorizer):
+    """JSON-serializable constructor parameters of a TfidfVectorizer."""
+    params = vectorizer.get_params()
+    params['dtype'] = np.dtype(params['dtype']).name
+    params['ngram_range'] = list(params['ngram_range'])
+    for key, value in params.items():
+        if callable(value):
+            raise ValueError(f"TfidfVectorizer parameter '{key}' is a callable and cannot be saved.")
+    return params
+
+
+def _version_dir(version):
+    return os.path.join(MODEL_DIR, version)
+
+
+def latest_version():
+    """Returns the newest saved version, or None if no model was saved yet."""
+    if MODEL_STORE_BACKEND == 'postgres':
+        return _latest_version_from_db()
+    pointer = os.path.join(MODEL_DIR, LATEST_POINTER)
+    if not os.path.exists(pointer):
+        return None
+    with open(pointer) as f:
+        return f.read().strip()
+
+
+def save_models(vectorizer, kmeans, metadata=None, cluster_counts=None):
+    """
+    Saves a fitted TfidfVectorizer (or HashingFeatureExtractor) and a clustering model (anything with cluster_centers_) as a new
+    version and marks it as the latest. Returns the version name.
+    """
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    # Timestamped to the microsecond; the directory is created exclusively, so two saves can never
+    # write into the same version
+    while True:
+        version = datetime.now().strftime('v%Y%m%d_%H%M%S_%f')
+        version_dir = _version_dir(version)
+        try:
+            os.mkdir(version_dir)
+            break
+        except FileExistsError:
+            continue
+
+    if isinstance(vectorizer, HashingFeatureExtractor):
+        saved_vectorizer = {'type': 'hashing', 'params': vectorizer.get_config()}
+        n_features = vectorizer.n_features
+    else:
+        saved_vectorizer = {
+            'type': 'tfidf',
+            'params': _vectorizer_params(vectorizer),
+            'vocabulary': {term: int(index) for term, index in vectorizer.vocabulary_.items()},
+        }
+        n_features = len(vectorizer.vocabulary_)
+    with open(os.path.join(version_dir, 'vectorizer.json'), 'w') as f:
+        json.dump(saved_vectorizer, f)
+    if vectorizer.idf_ is not None:
+        np.save(os.path.join(version_dir, 'idf.npy'), np.asarray(vectorizer.idf_, dtype=np.float64))
+    np.save(os.path.join(version_dir, 'centroids.npy'), np.asarray(kmeans.cluster_centers_))
+    if cluster_counts is not None:
+        np.save(os.path.join(version_dir, 'cluster_counts.npy'), np.asarray(cluster_counts, dtype=np.int64))
+
+    full_metadata = {
+        'version': version,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'sklearn_version': sklearn.__version__,
+        'feature_extractor': saved_vectorizer['type'],
+        'n_features': n_features,
+        'n_clusters': int(kmeans.cluster_centers_.shape[0]),
+    }
+    full_metadata.update(metadata or {})
+    with open(os.path.join(version_dir, 'metadata.json'), 'w') as f:
+        json.dump(full_metadata, f, indent=2)
+
+    if MODEL_STORE_BACKEND == 'postgres':
+        _save_version_to_db(version)
+
+    with open(os.path.join(MODEL_DIR, LATEST_POINTER), 'w') as f:
+        f.write(version)
+    return version
+
+
+def load_models(version=None, mmap=True):
+    """
+    Loads a saved version (the latest by default) for transform-only use.
+    Returns (vectorizer, cluster_model, metadata). IDF weights and centroids are memory-mapped.
+    """
+    version = version or latest_version()
+    if version is None:
+        raise FileNotFoundError(f"No saved model found in '{MODEL_DIR}'. Run model.py in fit mode first.")
+
+    version_dir = _version_dir(version)
+    if not os.path.isdir(version_dir):
+        if MODEL_STORE_BACKEND != 'postgres':
+            raise FileNotFoundError(f"Model version '{version}' not found in '{MODEL_DIR}'.")
+        _fetch_version_from_db(version)
+
+    mmap_mode = 'r' if mmap else None
+    with open(os.path.join(version_dir, 'vectorizer.json')) as f:
+        saved_vectorizer = json.load(f)
+    params = saved_vectorizer['params']
+    idf_path = os.path.join(version_dir, 'idf.npy')
+    idf = np.load(idf_path, mmap_mode=mmap_mode) if os.path.exists(idf_path) else None
+
+    if saved_vectorizer.get('type') == 'hashing':
+        vectorizer = HashingFeatureExtractor(params['n_features'], params['use_idf'], idf=idf)
+    else:
+        params['dtype'] = np.dtype(params['dtype']).type
+        params['ngram_range'] = tuple(params['ngram_range'])
+        vectorizer = TfidfVectorizer(**params)
+        vectorizer.vocabulary_ = saved_vectorizer['vocabulary']
+        vectorizer.idf_ = idf
+
+    counts_path = os.path.join(version_dir, 'cluster_counts.npy')
+    cluster_model = CentroidModel(np.load(os.path.join(version_dir, 'centroids.npy'), mmap_mode=mmap_mode),
+                                  np.load(counts_path) if os.path.exists(counts_path) else None)
+
+    with open(os.path.join(version_dir, 'metadata.json')) as f:
+        metadata = json.load(f)
+    return vectorizer, cluster_model, metadata
+
+
+# --- PostgreSQL backend (ml_models table) ---
+def _connect():
+    from db import get_engine
+
+    # A pooled DB-API connection, close() returns it to the pool
+    return get_engine().raw_connection()
+
+
+def _save_version_to_db(version):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as archive:
+        archive.add(_version_dir(version), arcname=version)
+
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {DB_MODEL_TABLE_NAME} (
+                    id SERIAL PRIMARY KEY,
+                    model_name VARCHAR(255) NOT NULL,
+                    model_data BYTEA NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+            """)
+            cur.execute(f"INSERT INTO {DB_MODEL_TABLE_NAME} (model_name, model_data) VALUES (%s, %s);",
+                        (version, buffer.getvalue()))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _latest_version_from_db():
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT model_name FROM {DB_MODEL_TABLE_NAME} ORDER BY created_at DESC, id DESC LIMIT 1;")
+            row = cur.fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+def _fetch_version_from_db(version):
+    conn = _connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT model_data FROM {DB_MODEL_TABLE_NAME} WHERE model_name = %s "
+                        f"ORDER BY id DESC LIMIT 1;", (version,))
+            row = cur.fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        raise FileNotFoundError(f"Model version '{version}' not found in table '{DB_MODEL_TABLE_NAME}'.")
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    with tarfile.open(fileobj=io.BytesIO(bytes(row[0])), mode='r') as archive:
+        for member in archive.getmembers():
+            if not (member.isfile() or member.isdir()) or member.name.split('/')[0] != version or '..' in member.name:
+                raise ValueError(f"Unexpected entry '{member.name}' in archived model '{version}'.")
+        archive.extractall(MODEL_DIR)
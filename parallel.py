@@ -0,0 +1,14 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def worker_pool(n_workers, initializer=None):
+    """
+    Returns a process pool for the pipeline's CPU-bound stages. The pipeline scripts do their work
+    at import time, so workers are forked rather than spawned (spawn would re-import and re-run
+    the calling script in every worker).
+    """
+    start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else None
+    return ProcessPoolExecutor(max_workers=n_workers,
+                               mp_context=multiprocessing.get_context(start_method),
+                               initializer=initializer)
@@ -0,0 +1,133 @@
+import os
+import json
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from storage import STAGE_FILES, STAGE_SCHEMAS, STORAGE_DIR, FrameWriter, iter_frames, to_dataframe
+from incremental import INCREMENTAL_MODE, get_watermark
+
+
+# --- Partitioned Raw Snapshot ---
+# With RAW_LAYOUT=partitioned (default) the raw snapshot is exported as one Parquet file per
+# publication month, <stage file>_partitions/year=YYYY/month=MM/part.parquet, described by a
+# _manifest.json listing every partition with its row count and pub_date range. The bucket holds
+# the same layout, so aws.download.py and data_cleaning.py only fetch and read the partitions
+# overlapping the requested window. RAW_LAYOUT=single keeps the previous monolithic snapshot.
+RAW_LAYOUT = os.getenv("RAW_LAYOUT", "partitioned")
+MANIFEST_NAME = '_manifest.json'
+
+# Requested pub_date window (ISO dates, UTC): RAW_WINDOW_START inclusive, RAW_WINDOW_END exclusive.
+# Either end may be left open. In INCREMENTAL_MODE the window starts at the watermark.
+RAW_WINDOW_START = os.getenv("RAW_WINDOW_START")
+RAW_WINDOW_END = os.getenv("RAW_WINDOW_END")
+
+
+def partition_dir(stage):
+    """Local directory of a partitioned stage hand-off, also its key prefix in the bucket."""
+    return os.path.join(STORAGE_DIR, STAGE_FILES[stage] + '_partitions')
+
+
+def partition_path(year, month):
+    """Path of a month's partition relative to the partition directory."""
+    return f"year={year:04d}/month={month:02d}/part.parquet"
+
+
+def load_manifest(stage):
+    with open(os.path.join(partition_dir(stage), MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def save_manifest(stage, manifest):
+    # Written last and atomically: a reader never sees partitions that are not complete yet
+    path = os.path.join(partition_dir(stage), MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def export_partitions(stage='raw'):
+    """
+    Splits a stage hand-off into monthly Parquet partitions (streamed, one writer per month) and
+    writes their manifest. Returns the manifest.
+    """
+    directory = partition_dir(stage)
+    writers, partitions = {}, {}
+    try:
+        for chunk in iter_frames(stage, categorical=False):
+            pub_date = pd.to_datetime(chunk['pub_date'], utc=True)
+            chunk = chunk.assign(pub_date=pub_date)
+            for (year, month), part in chunk.groupby([pub_date.dt.year, pub_date.dt.month]):
+                if (year, month) not in writers:
+                    path = os.path.join(directory, partition_path(year, month))
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    writers[(year, month)] = FrameWriter(stage, fmt='parquet', path=path)
+                    partitions[(year, month)] = {'year': int(year), 'month': int(month), 'path': partition_path(year, month),
+                                                 'rows': 0, 'min_pub_date': part['pub_date'].min(),
+                                                 'max_pub_date': part['pub_date'].max()}
+                writers[(year, month)].write(part)
+                entry = partitions[(year, month)]
+                entry['rows'] += len(part)
+                entry['min_pub_date'] = min(entry['min_pub_date'], part['pub_date'].min())
+                entry['max_pub_date'] = max(entry['max_pub_date'], part['pub_date'].max())
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    entries = []
+    for key in sorted(partitions):
+        entry = partitions[key]
+        entries.append({**entry, 'min_pub_date': entry['min_pub_date'].isoformat(),
+                        'max_pub_date': entry['max_pub_date'].isoformat(),
+                        'bytes': os.path.getsize(os.path.join(directory, entry['path']))})
+    manifest = {'stage': stage, 'format': 'parquet', 'rows': sum(entry['rows'] for entry in entries),
+                'partitions': entries}
+    save_manifest(stage, manifest)
+    print(f"Exported {manifest['rows']} rows of '{stage}' into {len(entries)} monthly partitions in '{directory}'")
+    return manifest
+
+
+# --- Window selection ---
+def requested_window():
+    """(start, end) pub_date window of the download and cleaning stages, None for an open end."""
+    start = pd.Timestamp(RAW_WINDOW_START, tz='UTC') if RAW_WINDOW_START else None
+    end = pd.Timestamp(RAW_WINDOW_END, tz='UTC') if RAW_WINDOW_END else None
+    watermark = get_watermark() if INCREMENTAL_MODE else None
+    if watermark is not None:
+        watermark = watermark.tz_localize('UTC') if watermark.tzinfo is None else watermark
+        start = watermark if start is None else max(start, watermark)
+    return start, end
+
+
+def window_filters(start, end):
+    """Storage filters selecting the rows of the window."""
+    filters = []
+    if start is not None:
+        filters.append(('pub_date', '>=', start))
+    if end is not None:
+        filters.append(('pub_date', '<', end))
+    return filters
+
+
+def overlapping_partitions(manifest, start, end):
+    """Manifest entries whose pub_date range overlaps [start, end)."""
+    return [entry for entry in manifest['partitions']
+            if (start is None or pd.Timestamp(entry['max_pub_date']) >= start) and
+               (end is None or pd.Timestamp(entry['min_pub_date']) < end)]
+
+
+def read_partitions(stage, start=None, end=None, filters=None):
+    """
+    Reads the rows of the window (and filters) from the local partitions overlapping it, as a
+    DataFrame with the stage's schema. Partitions outside the window are never opened.
+    """
+    directory = partition_dir(stage)
+    manifest = load_manifest(stage)
+    entries = overlapping_partitions(manifest, start, end)
+    row_filters = window_filters(start, end) + list(filters or [])
+    tables = [pq.read_table(os.path.join(directory, entry['path']), filters=row_filters or None)
+              for entry in entries]
+    schema = STAGE_SCHEMAS[stage]
+    table = pa.concat_tables(tables).unify_dictionaries() if tables else schema.empty_table()
+    print(f"Read {table.num_rows} rows from {len(entries)} of {len(manifest['partitions'])} partitions of '{stage}'")
+    return to_dataframe(table)
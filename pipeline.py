@@ -0,0 +1,309 @@
+"""
+Runs the pipeline stages in dependency order, skipping the ones that are up to date.
+
+    python pipeline.py                    # every stage that is out of date
+    python pipeline.py --stages clean model
+    python pipeline.py --force model      # rerun model (and whatever its new outputs invalidate)
+    python pipeline.py --dry-run          # only show what would run
+"""
+import os
+import sys
+import ast
+import json
+import time
+import hashlib
+import argparse
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from storage import stage_path
+from partitions import RAW_LAYOUT, partition_dir
+from incremental import INCREMENTAL_MODE
+
+
+# --- Pipeline Configuration ---
+# Every stage is one of the pipeline scripts, run in its own process, with declared input and output
+# files. A stage is skipped when its cache key is unchanged and its outputs are still the ones it
+# wrote. The key hashes the content of the inputs, the code version (the script and every local
+# module it imports) and the environment variables that code reads. Stages without local outputs
+# (the S3 upload, the database load) pass their key on to the stages that depend on them.
+# Stages whose dependencies are done run concurrently, up to PIPELINE_MAX_WORKERS at a time.
+PIPELINE_CACHE_PATH = os.getenv("PIPELINE_CACHE_PATH", "pipeline_cache.json")
+PIPELINE_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", "2"))
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class Stage:
+    """A pipeline script with the stages it depends on and the files it reads and writes."""
+
+    def __init__(self, name, script, after=(), inputs=(), outputs=()):
+        self.name = name
+        self.script = script
+        self.after = list(after)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+
+
+def raw_outputs(stage):
+    """Files of a raw snapshot stage: the partition directory or the single file (see partitions.py)."""
+    return [partition_dir(stage)] if RAW_LAYOUT == 'partitioned' else [stage_path(stage)]
+
+
+def pipeline_stages():
+    final_outputs = [stage_path('final'), stage_path('term_frequencies')]
+    if INCREMENTAL_MODE:
+        final_outputs.append(stage_path('final_increment'))
+    return [
+        Stage('collect', 'data_collection.py', inputs=['nyt-articles-21m-2000-present.zip'],
+              outputs=[stage_path('raw')] + (raw_outputs('raw') if RAW_LAYOUT == 'partitioned' else [])),
+        Stage('upload', 'aws_upload.py', after=['collect'], inputs=raw_outputs('raw')),
+        Stage('download', 'aws.download.py', after=['upload'], outputs=raw_outputs('downloaded')),
+        Stage('clean', 'data_cleaning.py', after=['download'], inputs=raw_outputs('downloaded'),
+              outputs=[stage_path('cleaned')]),
+        Stage('model', 'model.py', after=['clean'], inputs=[stage_path('cleaned')], outputs=final_outputs),
+        Stage('load', 'aws_db.py', after=['model'], inputs=final_outputs),
+    ]
+
+
+# --- Content hashes ---
+_hash_lock = threading.Lock()
+
+
+def file_hash(path, hash_cache):
+    """BLAKE2 hash of a file, reused from hash_cache while its size and modification time are unchanged."""
+    stat = os.stat(path)
+    signature = [stat.st_size, stat.st_mtime_ns]
+    with _hash_lock:
+        cached = hash_cache.get(path)
+    if cached and cached['signature'] == signature:
+        return cached['hash']
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 ** 2), b''):
+            digest.update(block)
+    with _hash_lock:
+        hash_cache[path] = {'signature': signature, 'hash': digest.hexdigest()}
+    return digest.hexdigest()
+
+
+def content_hash(path, hash_cache):
+    """Hash of a file or of every file of a directory (names included), None when it does not exist."""
+    if os.path.isfile(path):
+        return file_hash(path, hash_cache)
+    if not os.path.isdir(path):
+        return None
+    digest = hashlib.blake2b()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            digest.update(os.path.relpath(file_path, path).encode())
+            digest.update(file_hash(file_path, hash_cache).encode())
+    return digest.hexdigest()
+
+
+# --- Code versions ---
+def _local_imports(path):
+    """Source of a script, the local modules it imports and the environment variables it reads."""
+    with open(path) as f:
+        source = f.read()
+    modules, env_vars = set(), set()
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            modules.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            modules.add(node.module.split('.')[0])
+        elif (isinstance(node, ast.Call) and getattr(node.func, 'attr', getattr(node.func, 'id', None)) == 'getenv'
+              and node.args and isinstance(node.args[0], ast.Constant)):
+            env_vars.add(node.args[0].value)
+    local = {module for module in modules if os.path.exists(os.path.join(PROJECT_DIR, module + '.py'))}
+    return source, local, env_vars
+
+
+def code_version(script):
+    """
+    Hash of a script and of every local module it imports (transitively), plus the values of the
+    environment variables read by that code. Editing the dashboard changes no stage's version,
+    editing model.py only the model stage's.
+    """
+    digest = hashlib.blake2b()
+    env_vars, seen, pending = set(), set(), [os.path.join(PROJECT_DIR, script)]
+    while pending:
+        path = pending.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        source, modules, variables = _local_imports(path)
+        env_vars |= variables
+        pending.extend(os.path.join(PROJECT_DIR, module + '.py') for module in modules)
+    for path in sorted(seen):
+        with open(path, 'rb') as f:
+            digest.update(os.path.basename(path).encode() + f.read())
+    for name in sorted(env_vars):
+        digest.update(f"{name}={os.environ.get(name)}".encode())
+    return digest.hexdigest()
+
+
+# --- Stage runs ---
+def stage_key(stage, by_name, keys, hash_cache):
+    """Cache key of a stage: code version, input content and the keys of dependencies without outputs."""
+    digest = hashlib.blake2b(code_version(stage.script).encode())
+    for path in stage.inputs:
+        digest.update(f"{path}={content_hash(path, hash_cache)}".encode())
+    for name in stage.after:
+        if not by_name[name].outputs:
+            digest.update(f"{name}={keys[name]}".encode())
+    return digest.hexdigest()
+
+
+def is_up_to_date(stage, key, cache, hash_cache):
+    """True when the stage ran with this key and its outputs are unchanged since."""
+    previous = cache['stages'].get(stage.name)
+    if previous is None or previous['key'] != key:
+        return False
+    return all(content_hash(path, hash_cache) == previous['outputs'].get(path) for path in stage.outputs)
+
+
+# Runs a stage script as __main__ and writes its peak resident memory (VmHWM, kB) to the report file
+# on exit. The rusage of a forked child still carries the orchestrator's own high-water mark.
+STAGE_BOOTSTRAP = """
+import os, sys, runpy, atexit
+script, report = sys.argv[1], sys.argv[2]
+def write_peak():
+    with open('/proc/self/status') as status, open(report, 'w') as f:
+        f.write(next(line.split()[1] for line in status if line.startswith('VmHWM:')))
+atexit.register(write_peak)
+sys.argv = [script]
+sys.path.insert(0, os.path.dirname(script))
+runpy.run_path(script, run_name='__main__')
+"""
+
+
+def run_script(script):
+    """
+    Runs a stage script in its own process. Returns (exit code, wall seconds, CPU seconds, peak RSS in MB)
+    measured for that process alone, so concurrent stages are accounted separately.
+    """
+    path = os.path.join(PROJECT_DIR, script)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        report_path = os.path.join(tmp_dir, 'peak_rss')
+        command = [sys.executable, '-c', STAGE_BOOTSTRAP, path, report_path] if os.path.exists('/proc/self/status') \
+            else [sys.executable, path]
+        start = time.perf_counter()
+        process = subprocess.Popen(command)
+        _, status, usage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - start
+        # Decoded like Popen.returncode: the exit code, or minus the signal that killed the stage
+        process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+        if os.path.exists(report_path):
+            with open(report_path) as f:
+                peak_rss_mb = int(f.read()) / 1024
+        else:
+            # ru_maxrss is in kilobytes on Linux (bytes on macOS)
+            peak_rss_mb = usage.ru_maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+    return process.returncode, wall, usage.ru_utime + usage.ru_stime, peak_rss_mb
+
+
+def load_cache():
+    if not os.path.exists(PIPELINE_CACHE_PATH):
+        return {'stages': {}, 'hashes': {}}
+    with open(PIPELINE_CACHE_PATH) as f:
+        return json.load(f)
+
+
+def save_cache(cache):
+    tmp_path = PIPELINE_CACHE_PATH + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, PIPELINE_CACHE_PATH)
+
+
+def run_pipeline(stages, selected=None, force=(), dry_run=False):
+    """
+    Runs the selected stages (default: all) in dependency order, each as soon as its dependencies are
+    done. Stages outside the selection only contribute their last cache key. Returns the report rows.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    selected = set(selected or by_name)
+    cache = load_cache()
+    hash_cache = cache['hashes']
+    keys = {name: cache['stages'].get(name, {}).get('key') for name in by_name}
+    report, failed, would_run = [], set(), set()
+    done = {name for name in by_name if name not in selected}
+    pending = [stage for stage in stages if stage.name in selected]
+
+    def process(stage):
+        key = stage_key(stage, by_name, keys, hash_cache)
+        if dry_run and any(name in would_run for name in stage.after):
+            # A dependency would run first and change this stage's inputs
+            return stage, key, {'stage': stage.name, 'status': 'would run'}
+        if stage.name not in force and is_up_to_date(stage, key, cache, hash_cache):
+            return stage, key, {'stage': stage.name, 'status': 'skipped'}
+        if dry_run:
+            return stage, key, {'stage': stage.name, 'status': 'would run'}
+        print(f"--- Running stage '{stage.name}' ({stage.script}) ---")
+        returncode, wall, cpu, peak_rss_mb = run_script(stage.script)
+        row = {'stage': stage.name, 'status': 'ran' if returncode == 0 else f'failed ({returncode})',
+               'wall_seconds': round(wall, 2), 'cpu_seconds': round(cpu, 2), 'peak_rss_mb': round(peak_rss_mb, 1)}
+        return stage, key, row
+
+    with ThreadPoolExecutor(max_workers=PIPELINE_MAX_WORKERS) as executor:
+        running = {}
+        while pending or running:
+            for stage in [stage for stage in pending if all(name in done for name in stage.after)]:
+                pending.remove(stage)
+                if any(name in failed for name in stage.after):
+                    failed.add(stage.name)
+                    done.add(stage.name)
+                    report.append({'stage': stage.name, 'status': 'blocked'})
+                    continue
+                running[executor.submit(process, stage)] = stage
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                del running[future]
+                stage, key, row = future.result()
+                report.append(row)
+                done.add(stage.name)
+                if row['status'].startswith('failed'):
+                    failed.add(stage.name)
+                    continue
+                keys[stage.name] = key
+                if row['status'] == 'would run':
+                    would_run.add(stage.name)
+                if row['status'] == 'ran':
+                    cache['stages'][stage.name] = {
+                        'key': key, 'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                        'outputs': {path: content_hash(path, hash_cache) for path in stage.outputs}}
+                    save_cache(cache)
+    if not dry_run:
+        save_cache(cache)
+    return report
+
+
+def print_report(report):
+    print(f"\n{'Stage':<10} {'Status':<12} {'Wall (s)':>10} {'CPU (s)':>10} {'Peak RSS (MB)':>14}")
+    for row in report:
+        print(f"{row['stage']:<10} {row['status']:<12} {row.get('wall_seconds', ''):>10} "
+              f"{row.get('cpu_seconds', ''):>10} {row.get('peak_rss_mb', ''):>14}")
+
+
+def main():
+    stages = pipeline_stages()
+    names = [stage.name for stage in stages]
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stages', nargs='+', choices=names, help="Only consider these stages")
+    parser.add_argument('--force', nargs='+', choices=names, default=[], help="Run these stages even if up to date")
+    parser.add_argument('--dry-run', action='store_true', help="Report what would run without running it")
+    args = parser.parse_args()
+
+    report = run_pipeline(stages, args.stages, set(args.force), args.dry_run)
+    print_report(report)
+    if any(row['status'].startswith('failed') or row['status'] == 'blocked' for row in report):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
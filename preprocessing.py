@@ -0,0 +1,284 @@
+import os
+import time
+import pickle
+from collections import OrderedDict
+import pandas as pd
+from nltk.tokenize import word_tokenize
+from nltk.stem import WordNetLemmatizer
+from nltk.corpus import stopwords
+from parallel import worker_pool
+from instrumentation import run_recorder
+
+
+# --- Preprocessing Configuration ---
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", str(os.cpu_count() or 1)))
+PREPROCESS_CHUNK_SIZE = int(os.getenv("PREPROCESS_CHUNK_SIZE", "20000"))
+PREPROCESS_SERIAL = os.getenv("PREPROCESS_SERIAL", "0") == "1"   # Run shards in-process, e.g. for debugging
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "500000"))
+TOKEN_CACHE_PATH = os.getenv("TOKEN_CACHE_PATH", "token_cache.pkl")     # Set to '' to disable persistence
+
+
+# NLTK resources, loaded once per process by load_nltk_resources()
+stop_words = None
+lemmatizer = None
+
+
+def load_nltk_resources():
+    """Loads the stopword set and lemmatizer once per process."""
+    global stop_words, lemmatizer
+    if stop_words is None:
+        stop_words = set(stopwords.words('english'))
+        lemmatizer = WordNetLemmatizer()
+        # WordNet is read lazily on the first lemmatize call, do it here so each worker pays it once
+        lemmatizer.lemmatize('news')
+
+
+class TokenCache:
+    """
+    Bounded LRU memo of word.lower() and lemmatize(word.lower()) per raw token, shared by both
+    preprocessing functions. Lemmas are filled lazily since the sentiment path only needs lowercase.
+    """
+
+    def __init__(self, maxsize=TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()   # token -> [lowercase, lemma or None]
+        self._changed = {}              # entries added or completed since the last drain()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.lemma_hits = 0
+        self.lemma_misses = 0
+        self.lemma_seconds = 0.0   # Time spent in the lemmatizer on misses
+
+    def lookup(self, word):
+        """Returns the [lowercase, lemma] entry of a token, creating it on a miss."""
+        entry = self._entries.get(word)
+        if entry is None:
+            self.misses += 1
+            entry = [word.lower(), None]
+            self._entries[word] = entry
+            self._changed[word] = entry
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        else:
+            self.hits += 1
+            self._entries.move_to_end(word)
+        return entry
+
+    def lemmatize(self, word, entry):
+        """Returns the lemma of a looked-up token, lemmatizing it only the first time."""
+        if entry[1] is None:
+            self.lemma_misses += 1
+            start = time.perf_counter()
+            entry[1] = lemmatizer.lemmatize(entry[0])
+            self.lemma_seconds += time.perf_counter() - start
+            self._changed[word] = entry
+        else:
+            self.lemma_hits += 1
+        return entry[1]
+
+    def drain(self):
+        """Returns and clears the entries and counters accumulated since the last drain."""
+        delta = {
+            'entries': {word: tuple(entry) for word, entry in self._changed.items()},
+            'hits': self.hits, 'misses': self.misses,
+            'lemma_hits': self.lemma_hits, 'lemma_misses': self.lemma_misses,
+            'lemma_seconds': self.lemma_seconds,
+        }
+        self._changed = {}
+        self.reset_stats()
+        return delta
+
+    def merge(self, delta):
+        """Merges a drained delta from a worker process into this cache."""
+        for word, (lower, lemma) in delta['entries'].items():
+            entry = self._entries.get(word)
+            if entry is None:
+                self._entries[word] = [lower, lemma]
+                if len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+            elif entry[1] is None:
+                entry[1] = lemma
+        self.hits += delta['hits']
+        self.misses += delta['misses']
+        self.lemma_hits += delta['lemma_hits']
+        self.lemma_misses += delta['lemma_misses']
+        self.lemma_seconds += delta['lemma_seconds']
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        lemmatizations = self.lemma_hits + self.lemma_misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'lemma_hits': self.lemma_hits,
+            'lemma_misses': self.lemma_misses,
+            'lemma_hit_rate': self.lemma_hits / lemmatizations if lemmatizations else 0.0,
+            'lemma_seconds': self.lemma_seconds,
+        }
+
+    def save(self, path):
+        """Persists the cache (in LRU order) so the next run starts warm."""
+        with open(path, 'wb') as f:
+            pickle.dump([(word, tuple(entry)) for word, entry in self._entries.items()], f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, path):
+        """Loads a cache persisted by save(). Missing files are ignored."""
+        if not os.path.exists(path):
+            return False
+        with open(path, 'rb') as f:
+            items = pickle.load(f)
+        for word, (lower, lemma) in items[-self.maxsize:]:
+            self._entries[word] = [lower, lemma]
+        self._changed = {}
+        return True
+
+
+token_cache = TokenCache()
+
+
+# Views that can be requested from a token stream:
+#   'clustering': lemmatized, alphabetic, non-stopword tokens (TF-IDF / KMeans input)
+#   'sentiment':  lowercased non-stopword tokens (VADER input)
+VIEWS = ('clustering', 'sentiment')
+
+
+def build_views(text, views=VIEWS, tokens=None):
+    """
+    Tokenizes a text once and builds every requested view in a single pass over the tokens,
+    looking up each token's lowercase form only once. Returns a dict of view -> joined text.
+    tokens can pass word_tokenize(text) when the caller has already tokenized it.
+    """
+    if not isinstance(text, str):
+        return {view: "" for view in views}
+    want_clustering = 'clustering' in views
+    want_sentiment = 'sentiment' in views
+
+    clustering_words = []
+    sentiment_words = []
+    if tokens is None:
+        tokens = word_tokenize(text)
+    for word in tokens:
+        entry = token_cache.lookup(word)
+        if entry[0] in stop_words:
+            continue
+        if want_sentiment:
+            sentiment_words.append(entry[0])
+        if want_clustering and word.isalpha():
+            clustering_words.append(token_cache.lemmatize(word, entry))
+
+    result = {}
+    if want_clustering:
+        result['clustering'] = ' '.join(clustering_words)
+    if want_sentiment:
+        result['sentiment'] = ' '.join(sentiment_words)
+    return result
+
+
+def preprocess_text_for_ml(text):
+    return build_views(text, ('clustering',))['clustering']
+
+
+def clean_text_for_sentiment(text):
+    return build_views(text, ('sentiment',))['sentiment']
+
+
+def _init_worker():
+    """Pool initializer: loads NLTK once and starts the inherited token cache and recorder with fresh counters."""
+    load_nltk_resources()
+    token_cache.drain()
+    run_recorder.drain()
+
+
+def _process_shard(shard):
+    """
+    Preprocesses one shard of rows. Runs inside a worker process (or in-process in serial mode).
+    shard maps each source column to (texts, views), each source text is tokenized exactly once.
+    """
+    load_nltk_resources()
+    results = {}
+    # Tokenization is timed per text but recorded once per shard, off the hot loop
+    tokenize_seconds, tokenized = 0.0, 0
+    for source, (texts, views) in shard.items():
+        outputs = {view: [] for view in views}
+        for text in texts:
+            tokens = None
+            if isinstance(text, str):
+                start = time.perf_counter()
+                tokens = word_tokenize(text)
+                tokenize_seconds += time.perf_counter() - start
+                tokenized += 1
+            for view, value in build_views(text, views, tokens).items():
+                outputs[view].append(value)
+        results[source] = outputs
+    run_recorder.add_step('tokenize', tokenize_seconds, rows=tokenized)
+    return results, token_cache.drain(), run_recorder.drain()
+
+
+class PreprocessingEngine:
+    """
+    Splits the source text columns into shards of chunk_size rows and preprocesses them on a
+    process pool. Every source column is tokenized once and all views requested from it are
+    built from the same token stream. Output is identical to applying the functions row by row.
+
+    The token cache is loaded from cache_path before the workers are forked, so every worker
+    starts warm. New entries are sent back with each shard, merged and saved after the run.
+    """
+
+    def __init__(self, n_workers=None, chunk_size=None, serial=None, cache_path=None):
+        self.n_workers = n_workers or PREPROCESS_WORKERS
+        self.chunk_size = chunk_size or PREPROCESS_CHUNK_SIZE
+        self.serial = PREPROCESS_SERIAL if serial is None else serial
+        self.cache_path = TOKEN_CACHE_PATH if cache_path is None else cache_path
+        self._cache_loaded = False
+
+    def run(self, df, outputs):
+        """
+        Preprocesses df and returns a DataFrame (aligned with df's index) with one column per entry
+        of outputs, which maps output column -> (source column, view), e.g.
+        {'processed_text_for_clustering': ('full_text_for_clustering', 'clustering')}.
+        """
+        if self.cache_path and not self._cache_loaded:
+            token_cache.load(self.cache_path)
+            self._cache_loaded = True
+
+        views_by_source = {}
+        for source, view in outputs.values():
+            if view not in VIEWS:
+                raise ValueError(f"Unknown preprocessing view '{view}'. Expected one of {VIEWS}.")
+            views_by_source.setdefault(source, [])
+            if view not in views_by_source[source]:
+                views_by_source[source].append(view)
+
+        texts_by_source = {source: df[source].tolist() for source in views_by_source}
+        shards = [
+            {source: (texts[start:start + self.chunk_size], tuple(views_by_source[source]))
+             for source, texts in texts_by_source.items()}
+            for start in range(0, len(df), self.chunk_size)
+        ]
+
+        if self.serial or self.n_workers == 1 or len(shards) <= 1:
+            results = [_process_shard(shard) for shard in shards]
+        else:
+            with worker_pool(self.n_workers, _init_worker) as executor:
+                results = list(executor.map(_process_shard, shards))
+
+        collected = {(source, view): [] for source, views in views_by_source.items() for view in views}
+        for shard_results, cache_delta, recorder_delta in results:
+            for source, view_outputs in shard_results.items():
+                for view, values in view_outputs.items():
+                    collected[(source, view)].extend(values)
+            token_cache.merge(cache_delta)
+            run_recorder.merge(recorder_delta)
+
+        if self.cache_path:
+            token_cache.save(self.cache_path)
+
+        return pd.DataFrame({column: pd.Series(collected[(source, view)], index=df.index, dtype=object)
+                             for column, (source, view) in outputs.items()}, index=df.index)
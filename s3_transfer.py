@@ -0,0 +1,374 @@
+import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from partitions import MANIFEST_NAME, partition_dir, load_manifest, save_manifest, overlapping_partitions
+from instrumentation import run_recorder
+
+
+# --- S3 Transfer Configuration ---
+# Uploads and downloads of the stage snapshots (aws_upload.py, aws.download.py). Files larger than one
+# chunk are transferred as S3_CHUNK_SIZE_MB parts, S3_MAX_CONCURRENCY at a time. An interrupted
+# transfer resumes: uploads continue the pending multipart upload of the key, downloads continue the
+# ranged GETs recorded next to the partial file. Unchanged objects are skipped by comparing sizes and
+# (multipart) ETags. S3_ENDPOINT_URL points the client to a local S3 stand-in (moto server, MinIO).
+# Partitioned snapshots transfer S3_MAX_CONCURRENCY partitions at a time, each one part at a time, so
+# the requests in flight never exceed the client's connection pool.
+S3_BUCKET = os.getenv("S3_BUCKET", "senticonomy")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+S3_CHUNK_SIZE_MB = int(os.getenv("S3_CHUNK_SIZE_MB", "16"))        # S3 requires at least 5 MB per part
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", "8"))
+S3_MAX_ATTEMPTS = int(os.getenv("S3_MAX_ATTEMPTS", "5"))           # Per request, with exponential backoff
+# 'zstd' compresses uploads (key suffix .zst) and decompresses them again on download, 'none' disables it
+S3_COMPRESSION = os.getenv("S3_COMPRESSION", "none")
+S3_ZSTD_LEVEL = int(os.getenv("S3_ZSTD_LEVEL", "3"))
+AWS_SECRETS_PATH = '.vscode/secrets.json'
+
+COMPRESSION_SUFFIXES = {'none': '', 'zstd': '.zst'}
+PARTIAL_SUFFIX = '.part'
+PROGRESS_SUFFIX = '.part.json'
+
+
+def create_s3_client():
+    """S3 client with the credentials from .vscode/secrets.json (or the default AWS credential chain)."""
+    credentials = {}
+    if os.path.exists(AWS_SECRETS_PATH):
+        with open(AWS_SECRETS_PATH) as f:
+            secrets = json.load(f)
+        if 'AWS_ACCESS_KEY' in secrets:
+            credentials = {'aws_access_key_id': secrets['AWS_ACCESS_KEY'],
+                           'aws_secret_access_key': secrets['AWS_SECRET_KEY']}
+    config = Config(retries={'max_attempts': S3_MAX_ATTEMPTS, 'mode': 'standard'},
+                    max_pool_connections=max(10, S3_MAX_CONCURRENCY))
+    return boto3.client('s3', endpoint_url=S3_ENDPOINT_URL or None, config=config, **credentials)
+
+
+def transfer_config(chunk_size=None, concurrency=None):
+    """boto3 transfer settings of the single-request (smaller than one chunk) transfers."""
+    chunk_size = chunk_size or S3_CHUNK_SIZE_MB * 1024 ** 2
+    return TransferConfig(multipart_threshold=chunk_size, multipart_chunksize=chunk_size,
+                          max_concurrency=concurrency or S3_MAX_CONCURRENCY, use_threads=True)
+
+
+def object_key(path, compression=None):
+    """Key of a local file in the bucket: its base name, plus .zst when it is stored compressed."""
+    return os.path.basename(path) + COMPRESSION_SUFFIXES[compression or S3_COMPRESSION]
+
+
+# --- ETags ---
+def _read_chunk(path, offset, size):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read(size)
+
+
+def _chunk_offsets(size, chunk_size):
+    return [(number, offset, min(chunk_size, size - offset))
+            for number, offset in enumerate(range(0, size, chunk_size), start=1)]
+
+
+def file_etag(path, chunk_size):
+    """
+    The ETag S3 gives a file uploaded in parts of chunk_size: the MD5 of the file if it fits in one
+    part, otherwise the MD5 of the concatenated part MD5s followed by '-<number of parts>'.
+    """
+    size = os.path.getsize(path)
+    if size <= chunk_size:
+        md5 = hashlib.md5()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 ** 2), b''):
+                md5.update(block)
+        return md5.hexdigest()
+    digests = b''.join(hashlib.md5(_read_chunk(path, offset, length)).digest()
+                       for _, offset, length in _chunk_offsets(size, chunk_size))
+    return f"{hashlib.md5(digests).hexdigest()}-{len(digests) // 16}"
+
+
+def head_object(client, bucket, key):
+    """Object metadata, or None when the key does not exist."""
+    try:
+        return client.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+
+
+def matches_object(client, bucket, key, head, path):
+    """
+    True when the local file has the content of the object. Objects uploaded by upload_file carry the
+    size and ETag of the uncompressed source in their metadata. For other objects the part size of a
+    multipart ETag is read from the size of part 1.
+    """
+    if head is None or not os.path.exists(path):
+        return False
+    metadata = head.get('Metadata', {})
+    if 'source-etag' in metadata:
+        return (os.path.getsize(path) == int(metadata['source-size']) and
+                file_etag(path, int(metadata['source-part-size'])) == metadata['source-etag'])
+    if os.path.getsize(path) != head['ContentLength']:
+        return False
+    etag = head['ETag'].strip('"')
+    part_size = head['ContentLength']
+    if '-' in etag:
+        part_size = client.head_object(Bucket=bucket, Key=key, PartNumber=1)['ContentLength']
+    return file_etag(path, part_size) == etag
+
+
+# --- Compression ---
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("S3_COMPRESSION=zstd requires the 'zstandard' package.") from e
+    return zstandard
+
+
+def compress_file(path, compressed_path):
+    """Streams a file through zstd (multi-threaded) into compressed_path, written atomically."""
+    zstandard = _zstandard()
+    compressor = zstandard.ZstdCompressor(level=S3_ZSTD_LEVEL, threads=-1)
+    with open(path, 'rb') as source, open(compressed_path + '.tmp', 'wb') as target:
+        compressor.copy_stream(source, target)
+    os.replace(compressed_path + '.tmp', compressed_path)
+    return compressed_path
+
+
+def decompress_file(compressed_path, path):
+    """Streams a zstd file back into path, written atomically."""
+    zstandard = _zstandard()
+    with open(compressed_path, 'rb') as source, open(path + '.tmp', 'wb') as target:
+        zstandard.ZstdDecompressor().copy_stream(source, target)
+    os.replace(path + '.tmp', path)
+    return path
+
+
+# --- Upload ---
+def _pending_upload(client, bucket, key, path, chunk_size):
+    """
+    Upload id and completed parts of an interrupted multipart upload of this file, or (None, {}).
+    Parts are only reused when their ETag matches the local chunk, stale uploads are aborted.
+    """
+    uploads = client.list_multipart_uploads(Bucket=bucket, Prefix=key).get('Uploads', [])
+    chunks = {number: (offset, length) for number, offset, length in _chunk_offsets(os.path.getsize(path), chunk_size)}
+    for upload in (upload for upload in uploads if upload['Key'] == key):
+        parts = {}
+        for page in client.get_paginator('list_parts').paginate(Bucket=bucket, Key=key, UploadId=upload['UploadId']):
+            parts.update({part['PartNumber']: part for part in page.get('Parts', [])})
+        reusable = all(number in chunks and part['Size'] == chunks[number][1] and
+                       part['ETag'].strip('"') == hashlib.md5(_read_chunk(path, *chunks[number])).hexdigest()
+                       for number, part in parts.items())
+        if reusable:
+            return upload['UploadId'], {number: part['ETag'] for number, part in parts.items()}
+        client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload['UploadId'])
+    return None, {}
+
+
+def _multipart_upload(client, path, bucket, key, chunk_size, metadata, concurrency):
+    """Uploads the file in parts, concurrency at a time, continuing a pending upload of the key."""
+    upload_id, etags = _pending_upload(client, bucket, key, path, chunk_size)
+    if upload_id is None:
+        upload_id = client.create_multipart_upload(Bucket=bucket, Key=key, Metadata=metadata)['UploadId']
+    elif etags:
+        print(f"Resuming upload of {key}: {len(etags)} parts already uploaded")
+
+    def upload_part(number, offset, length):
+        response = client.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number,
+                                      Body=_read_chunk(path, offset, length))
+        return number, response['ETag']
+
+    # The upload is left pending on failure so the next run continues it
+    chunks = [chunk for chunk in _chunk_offsets(os.path.getsize(path), chunk_size) if chunk[0] not in etags]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in as_completed([executor.submit(upload_part, *chunk) for chunk in chunks]):
+            number, etag = future.result()
+            etags[number] = etag
+
+    client.complete_multipart_upload(
+        Bucket=bucket, Key=key, UploadId=upload_id,
+        MultipartUpload={'Parts': [{'PartNumber': number, 'ETag': etags[number]} for number in sorted(etags)]})
+
+
+def upload_file(client, path, bucket=None, key=None, compression=None, concurrency=None):
+    """
+    Uploads a file unless the object already holds the same content. Returns True if it was uploaded.
+    With compression='zstd' the file is compressed to a local .zst spool first (kept until the upload
+    completes, so a resumed upload sends the same bytes). concurrency limits the parts in flight
+    (default S3_MAX_CONCURRENCY).
+    """
+    bucket = bucket or S3_BUCKET
+    concurrency = concurrency or S3_MAX_CONCURRENCY
+    compression = compression or S3_COMPRESSION
+    key = key or object_key(path, compression)
+    chunk_size = S3_CHUNK_SIZE_MB * 1024 ** 2
+
+    if matches_object(client, bucket, key, head_object(client, bucket, key), path):
+        print(f"s3://{bucket}/{key} is up to date, skipping upload of {path}")
+        run_recorder.count('objects_skipped')
+        return False
+
+    metadata = {'source-size': str(os.path.getsize(path)), 'source-etag': file_etag(path, chunk_size),
+                'source-part-size': str(chunk_size), 'compression': compression}
+    body_path = path
+    if compression == 'zstd':
+        body_path = path + COMPRESSION_SUFFIXES['zstd']
+        if not os.path.exists(body_path) or os.path.getmtime(body_path) < os.path.getmtime(path):
+            compress_file(path, body_path)
+        print(f"Compressed {path}: {os.path.getsize(path) / 1024 ** 2:.1f} MB -> {os.path.getsize(body_path) / 1024 ** 2:.1f} MB")
+
+    if os.path.getsize(body_path) <= chunk_size:
+        client.upload_file(body_path, bucket, key, ExtraArgs={'Metadata': metadata},
+                           Config=transfer_config(chunk_size, concurrency))
+    else:
+        _multipart_upload(client, body_path, bucket, key, chunk_size, metadata, concurrency)
+    run_recorder.count('objects_uploaded')
+    run_recorder.count('bytes_uploaded', os.path.getsize(body_path))
+    if body_path != path:
+        os.remove(body_path)
+    return True
+
+
+# --- Download ---
+def _ranged_download(client, bucket, key, etag, size, path, chunk_size, concurrency):
+    """
+    Downloads the object in ranged GETs, concurrency at a time, into path + '.part'. Completed
+    parts are recorded in path + '.part.json', so an interrupted download continues where it stopped
+    as long as the object (its ETag) did not change.
+    """
+    partial_path, progress_path = path + PARTIAL_SUFFIX, path + PROGRESS_SUFFIX
+    progress = {'etag': etag, 'size': size, 'chunk_size': chunk_size, 'done': []}
+    if os.path.exists(progress_path) and os.path.exists(partial_path):
+        with open(progress_path) as f:
+            previous = json.load(f)
+        if {k: previous.get(k) for k in ('etag', 'size', 'chunk_size')} == {'etag': etag, 'size': size, 'chunk_size': chunk_size}:
+            progress = previous
+            print(f"Resuming download of {key}: {len(progress['done'])} parts already downloaded")
+    if not progress['done']:
+        with open(partial_path, 'wb') as f:
+            f.truncate(size)
+
+    def download_part(number, offset, length):
+        response = client.get_object(Bucket=bucket, Key=key, IfMatch=etag, Range=f"bytes={offset}-{offset + length - 1}")
+        data = response['Body'].read()
+        with open(partial_path, 'r+b') as f:
+            f.seek(offset)
+            f.write(data)
+        return number
+
+    def save_progress():
+        with open(progress_path + '.tmp', 'w') as f:
+            json.dump(progress, f)
+        os.replace(progress_path + '.tmp', progress_path)
+
+    # Every part that arrives is recorded before the first failure is raised
+    errors = []
+    chunks = [chunk for chunk in _chunk_offsets(size, chunk_size) if chunk[0] not in progress['done']]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in as_completed([executor.submit(download_part, *chunk) for chunk in chunks]):
+            try:
+                progress['done'].append(future.result())
+            except Exception as e:
+                errors.append(e)
+                continue
+            save_progress()
+    if errors:
+        raise errors[0]
+
+    os.replace(partial_path, path)
+    os.remove(progress_path)
+
+
+def download_file(client, path, bucket=None, key=None, concurrency=None):
+    """
+    Downloads an object unless path already holds the same content. Returns True if it was downloaded.
+    Objects uploaded compressed (metadata compression=zstd) are decompressed into path. concurrency
+    limits the ranged GETs in flight (default S3_MAX_CONCURRENCY).
+    """
+    bucket = bucket or S3_BUCKET
+    concurrency = concurrency or S3_MAX_CONCURRENCY
+    key = key or object_key(path)
+    head = client.head_object(Bucket=bucket, Key=key)
+    if matches_object(client, bucket, key, head, path):
+        print(f"{path} is up to date with s3://{bucket}/{key}, skipping download")
+        run_recorder.count('objects_skipped')
+        return False
+
+    compression = head.get('Metadata', {}).get('compression', 'none')
+    target = path + COMPRESSION_SUFFIXES[compression]
+    chunk_size = S3_CHUNK_SIZE_MB * 1024 ** 2
+    if head['ContentLength'] <= chunk_size:
+        client.download_file(bucket, key, target + PARTIAL_SUFFIX, Config=transfer_config(chunk_size, concurrency))
+        os.replace(target + PARTIAL_SUFFIX, target)
+    else:
+        _ranged_download(client, bucket, key, head['ETag'], head['ContentLength'], target, chunk_size, concurrency)
+    run_recorder.count('objects_downloaded')
+    run_recorder.count('bytes_downloaded', head['ContentLength'])
+
+    if target != path:
+        decompress_file(target, path)
+        os.remove(target)
+    return True
+
+
+# --- Partitioned snapshots ---
+def _transfer_in_parallel(transfer, entries):
+    """
+    Runs transfer(entry) for every partition, S3_MAX_CONCURRENCY at a time. Returns how many moved.
+    The transfers move their parts one at a time, so this pool bounds the requests in flight.
+    """
+    with ThreadPoolExecutor(max_workers=S3_MAX_CONCURRENCY) as executor:
+        return sum(future.result() for future in [executor.submit(transfer, entry) for entry in entries])
+
+
+def upload_partitions(client, stage='raw', bucket=None):
+    """
+    Uploads the partitions of a stage (see partitions.py) in parallel, skipping unchanged ones,
+    and the manifest last so readers never see partitions that are not uploaded yet.
+    """
+    bucket = bucket or S3_BUCKET
+    directory = partition_dir(stage)
+    prefix = os.path.basename(directory)
+    manifest = load_manifest(stage)
+    uploaded = _transfer_in_parallel(
+        lambda entry: upload_file(client, os.path.join(directory, entry['path']), bucket, f"{prefix}/{entry['path']}",
+                                  concurrency=1),
+        manifest['partitions'])
+    client.upload_file(os.path.join(directory, MANIFEST_NAME), bucket, f"{prefix}/{MANIFEST_NAME}")
+    print(f"Uploaded {uploaded} of {len(manifest['partitions'])} partitions to s3://{bucket}/{prefix}/")
+
+
+def download_partitions(client, source_stage='raw', stage='downloaded', start=None, end=None, bucket=None):
+    """
+    Downloads the partitions of source_stage overlapping the [start, end) pub_date window in
+    parallel into the partition directory of stage, skipping the ones already up to date.
+    """
+    bucket = bucket or S3_BUCKET
+    prefix = os.path.basename(partition_dir(source_stage))
+    directory = partition_dir(stage)
+    manifest = json.loads(client.get_object(Bucket=bucket, Key=f"{prefix}/{MANIFEST_NAME}")['Body'].read())
+    entries = overlapping_partitions(manifest, start, end)
+
+    def download(entry):
+        path = os.path.join(directory, entry['path'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return download_file(client, path, bucket, f"{prefix}/{entry['path']}", concurrency=1)
+
+    downloaded = _transfer_in_parallel(download, entries)
+    # The local manifest lists only the partitions present on disk: the ones of this window plus the
+    # ones of earlier downloads that are still unchanged in the snapshot
+    try:
+        previous = load_manifest(stage)['partitions']
+    except FileNotFoundError:
+        previous = []
+    local = {entry['path']: entry for entry in previous
+             if entry in manifest['partitions'] and os.path.exists(os.path.join(directory, entry['path']))}
+    local.update((entry['path'], entry) for entry in entries)
+    local_entries = sorted(local.values(), key=lambda entry: (entry['year'], entry['month']))
+    save_manifest(stage, {**manifest, 'stage': stage, 'rows': sum(entry['rows'] for entry in local_entries),
+                          'partitions': local_entries})
+    print(f"Downloaded {downloaded} of the {len(entries)} partitions overlapping the window "
+          f"({len(manifest['partitions'])} in the snapshot)")
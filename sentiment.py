@@ -0,0 +1,68 @@
+import os
+import numpy as np
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
+from parallel import worker_pool
+from instrumentation import run_recorder
+
+
+# --- Sentiment Configuration ---
+SENTIMENT_WORKERS = int(os.getenv("SENTIMENT_WORKERS", str(os.cpu_count() or 1)))
+SENTIMENT_CHUNK_SIZE = int(os.getenv("SENTIMENT_CHUNK_SIZE", "20000"))
+SENTIMENT_SERIAL = os.getenv("SENTIMENT_SERIAL", "0") == "1"   # Score in-process, e.g. for debugging
+
+# Column order of the score arrays returned by score_texts()
+SENTIMENT_COLUMNS = ['neg', 'neu', 'pos', 'compound']
+
+
+# VADER analyzer, loaded once per process by load_analyzer()
+sia = None
+
+
+def load_analyzer():
+    """Loads the VADER lexicon once per process."""
+    global sia
+    if sia is None:
+        sia = SentimentIntensityAnalyzer()
+
+
+def _init_worker():
+    """Pool initializer: loads VADER once and starts the inherited recorder with fresh counters."""
+    load_analyzer()
+    run_recorder.drain()
+
+
+def _score_chunk(texts):
+    """
+    Scores one chunk of texts into a float32 (n, 4) array of neg, neu, pos, compound.
+    Returns it with the recorder measurements of the chunk.
+    """
+    load_analyzer()
+    scores = np.empty((len(texts), len(SENTIMENT_COLUMNS)), dtype=np.float32)
+    with run_recorder.step('vader', rows=len(texts)):
+        for row, text in enumerate(texts):
+            polarity = sia.polarity_scores(text)
+            scores[row] = (polarity['neg'], polarity['neu'], polarity['pos'], polarity['compound'])
+    return scores, run_recorder.drain()
+
+
+def score_texts(texts, n_workers=None, chunk_size=None, serial=None):
+    """
+    Scores a list of texts with VADER and returns a float32 (n, 4) array with the columns in
+    SENTIMENT_COLUMNS order. Chunks are scored on a process pool unless serial is set.
+    """
+    n_workers = n_workers or SENTIMENT_WORKERS
+    chunk_size = chunk_size or SENTIMENT_CHUNK_SIZE
+    serial = SENTIMENT_SERIAL if serial is None else serial
+
+    chunks = [texts[start:start + chunk_size] for start in range(0, len(texts), chunk_size)]
+    if not chunks:
+        return np.empty((0, len(SENTIMENT_COLUMNS)), dtype=np.float32)
+
+    if serial or n_workers == 1 or len(chunks) == 1:
+        results = [_score_chunk(chunk) for chunk in chunks]
+    else:
+        with worker_pool(n_workers, _init_worker) as executor:
+            results = list(executor.map(_score_chunk, chunks))
+    for _, recorder_delta in results:
+        run_recorder.merge(recorder_delta)
+    return np.concatenate([scores for scores, _ in results])
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+
+# --- Sentiment Cube ---
+# Pre-aggregated sentiment per (date, category, cluster) cell. Every measure is additive (or a
+# min/max), so any coarser series (per year, per category, per week, ...) is a roll-up of the cube
+# instead of a groupby over the articles. The database serves the same cube as the
+# news_sentiment_daily materialized view (see db_schema.py).
+CUBE_KEYS = ['date', 'category', 'cluster']
+CUBE_MEASURES = ['n_articles', 'sum_compound', 'sumsq_compound', 'min_compound', 'max_compound',
+                 'sum_neg', 'sum_neu', 'sum_pos']
+# Columns of the articles needed to build the cube
+CUBE_SOURCE_COLUMNS = CUBE_KEYS + ['compound', 'neg', 'neu', 'pos']
+
+
+def build_cube(df):
+    """Aggregates articles (with CUBE_SOURCE_COLUMNS) into cube cells."""
+    compound = df['compound'].astype(np.float64)
+    cube = df.assign(compound=compound, compound_sq=compound * compound).groupby(
+        CUBE_KEYS, observed=True, sort=False).agg(
+            n_articles=('compound', 'size'),
+            sum_compound=('compound', 'sum'),
+            sumsq_compound=('compound_sq', 'sum'),
+            min_compound=('compound', 'min'),
+            max_compound=('compound', 'max'),
+            sum_neg=('neg', 'sum'),
+            sum_neu=('neu', 'sum'),
+            sum_pos=('pos', 'sum'),
+        ).reset_index()
+    return add_calendar_columns(cube)
+
+
+def add_calendar_columns(cube):
+    """Adds the year/month/quarter roll-up keys derived from the date."""
+    cube['date'] = pd.to_datetime(cube['date'])
+    cube['year'] = cube['date'].dt.year
+    cube['month'] = cube['date'].dt.month
+    cube['quarter'] = cube['date'].dt.quarter
+    return cube
+
+
+def filter_cube(cube, start_date, end_date, categories, clusters):
+    """Cells inside the dashboard's global filters."""
+    mask = ((cube['date'] >= pd.Timestamp(start_date)) & (cube['date'] <= pd.Timestamp(end_date)) &
+            cube['category'].isin(list(categories)) & cube['cluster'].isin(list(clusters)))
+    cells = cube[mask]
+    if isinstance(cells['category'].dtype, pd.CategoricalDtype):
+        # Deselected categories must not show up as empty groups in the charts
+        cells = cells.assign(category=cells['category'].cat.remove_unused_categories())
+    return cells
+
+
+def rollup(cube, by):
+    """
+    Rolls cube cells up to the given keys. Returns one row per group with n_articles and the
+    mean/std/min/max of compound and the mean neg/neu/pos scores.
+    """
+    grouped = cube.groupby(by, observed=True).agg(
+        n_articles=('n_articles', 'sum'),
+        sum_compound=('sum_compound', 'sum'),
+        sumsq_compound=('sumsq_compound', 'sum'),
+        min_compound=('min_compound', 'min'),
+        max_compound=('max_compound', 'max'),
+        sum_neg=('sum_neg', 'sum'),
+        sum_neu=('sum_neu', 'sum'),
+        sum_pos=('sum_pos', 'sum'),
+    )
+    n = grouped['n_articles'].astype(np.float64)
+    mean = grouped['sum_compound'] / n
+    result = pd.DataFrame({
+        'n_articles': grouped['n_articles'].astype(np.int64),
+        'mean_compound': mean,
+        # Population standard deviation from the sum of squares (clipped against round-off)
+        'std_compound': np.sqrt((grouped['sumsq_compound'] / n - mean * mean).clip(lower=0)),
+        'min_compound': grouped['min_compound'],
+        'max_compound': grouped['max_compound'],
+        'mean_neg': grouped['sum_neg'] / n,
+        'mean_neu': grouped['sum_neu'] / n,
+        'mean_pos': grouped['sum_pos'] / n,
+    })
+    return result.reset_index()
+
+
+# --- Chart series ---
+# Each chart rolls the cube up once to all of its (trace, x) keys and then picks the traces in the
+# order the user selected them, instead of re-masking the data once per selected year x period.
+def _groups_in_order(rolled, keys, ordered_keys):
+    """Splits a roll-up into its groups and returns the existing ones in the given key order."""
+    groups = dict(iter(rolled.groupby(keys, observed=True, sort=False)))
+    return [(key, groups[key]) for key in ordered_keys if key in groups]
+
+
+def category_means_by_period(cube, period, years, periods):
+    """
+    Mean compound per category for every selected (year, period) pair, period being 'month' or
+    'quarter'. Returns [((year, period), frame), ...] in selection order, skipping empty pairs.
+    """
+    cells = cube[cube['year'].isin(years) & cube[period].isin(periods)]
+    rolled = rollup(cells, ['year', period, 'category'])
+    return _groups_in_order(rolled, ['year', period], [(year, p) for year in years for p in periods])
+
+
+def monthly_means_by_category_year(cube, categories, years):
+    """
+    Mean compound per month for every selected (category, year) pair.
+    Returns [((category, year), frame), ...] in selection order, skipping empty pairs.
+    """
+    cells = cube[cube['category'].isin(categories) & cube['year'].isin(years)]
+    rolled = rollup(cells, ['category', 'year', 'month'])
+    return _groups_in_order(rolled, ['category', 'year'], [(category, year) for category in categories for year in years])
+
+
+def category_means_by_year(cube, years, categories):
+    """Year x category table of the mean compound rounded to 2 decimals, 0 where there is no data."""
+    rolled = rollup(cube[cube['year'].isin(years)], ['year', 'category'])
+    table = rolled.pivot(index='year', columns='category', values='mean_compound')
+    return table.reindex(index=list(years), columns=list(categories)).round(2).fillna(0)
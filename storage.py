@@ -0,0 +1,337 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+
+# --- Storage Configuration ---
+# Format used for the hand-offs between pipeline stages: 'parquet' (default), 'arrow' (IPC file,
+# zero-copy memory-mapped reads) or 'csv' (legacy, untyped).
+STORAGE_FORMAT = os.getenv("STORAGE_FORMAT", "parquet")
+STORAGE_DIR = os.getenv("STORAGE_DIR", ".")
+ROW_GROUP_SIZE = int(os.getenv("STORAGE_ROW_GROUP_SIZE", "100000"))
+
+FILE_EXTENSIONS = {'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow'}
+
+# Base file name of each stage hand-off
+STAGE_FILES = {
+    'raw': 'raw_data',                  # data_collection.py -> aws_upload.py
+    'downloaded': 'downloaded_data',    # aws.download.py -> data_cleaning.py
+    'cleaned': 'cleaned_news_data',     # data_cleaning.py -> model.py
+    'final': 'news_data_final',         # model.py -> aws_db.py / dashboard
+    'final_increment': 'news_data_final_increment',  # model.py -> aws_db.py (INCREMENTAL_MODE batch)
+    'term_frequencies': 'news_term_frequencies',     # model.py -> aws_db.py / dashboard word clouds
+}
+
+
+# --- Explicit Schemas ---
+CATEGORY_TYPE = pa.dictionary(pa.int32(), pa.string())
+
+RAW_SCHEMA = pa.schema([
+    ('pub_date', pa.timestamp('ns', tz='UTC')),
+    ('headline', pa.string()),
+    ('abstract', pa.string()),
+    ('lead_paragraph', pa.string()),
+    ('section_name', CATEGORY_TYPE),
+    ('web_url', pa.string()),
+])
+
+CLEANED_SCHEMA = pa.schema([
+    ('date', pa.date32()),
+    ('time', pa.time64('us')),
+    ('headline', pa.string()),
+    ('content', pa.string()),
+    ('web_url', pa.string()),
+    ('category', CATEGORY_TYPE),
+    ('day', pa.int8()),
+    ('month', pa.int8()),
+    ('day_of_week', CATEGORY_TYPE),
+    ('year', pa.int16()),
+])
+
+FINAL_SCHEMA = pa.schema([
+    ('date', pa.date32()),
+    ('headline', pa.string()),
+    ('content', pa.string()),
+    ('web_url', pa.string()),
+    ('category', CATEGORY_TYPE),
+    ('day_of_week', CATEGORY_TYPE),
+    ('year', pa.int16()),
+    ('cluster', pa.int16()),
+    ('neg', pa.float32()),
+    ('neu', pa.float32()),
+    ('pos', pa.float32()),
+    ('compound', pa.float32()),
+])
+
+TERM_FREQUENCY_SCHEMA = pa.schema([
+    ('source', CATEGORY_TYPE),
+    ('year', pa.int16()),
+    ('category', CATEGORY_TYPE),
+    ('cluster', pa.int16()),
+    ('sentiment', CATEGORY_TYPE),
+    ('term', pa.string()),
+    ('count', pa.int32()),
+])
+
+STAGE_SCHEMAS = {
+    'raw': RAW_SCHEMA,
+    'downloaded': RAW_SCHEMA,
+    'cleaned': CLEANED_SCHEMA,
+    'final': FINAL_SCHEMA,
+    'final_increment': FINAL_SCHEMA,
+    'term_frequencies': TERM_FREQUENCY_SCHEMA,
+}
+
+
+def stage_path(stage, fmt=None):
+    """Returns the file path of a stage hand-off for the given storage format."""
+    fmt = fmt or STORAGE_FORMAT
+    if fmt not in FILE_EXTENSIONS:
+        raise ValueError(f"Unknown storage format '{fmt}'. Expected one of {sorted(FILE_EXTENSIONS)}.")
+    return os.path.join(STORAGE_DIR, STAGE_FILES[stage] + FILE_EXTENSIONS[fmt])
+
+
+def to_arrow_table(df, schema):
+    """
+    Converts a DataFrame to an Arrow table with the given schema.
+    Columns not in the schema are dropped, dictionary columns are encoded as categoricals.
+    """
+    arrays = []
+    for field in schema:
+        series = df[field.name]
+        if pa.types.is_dictionary(field.type):
+            series = series.astype('category').cat.remove_unused_categories()
+            arrays.append(pa.array(series, from_pandas=True).cast(field.type))
+            continue
+        if pa.types.is_timestamp(field.type):
+            series = pd.to_datetime(series, utc=field.type.tz is not None)
+        elif pa.types.is_date(field.type):
+            series = pd.to_datetime(series).dt.date
+        elif pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+            series = series.astype(field.type.to_pandas_dtype())
+        arrays.append(pa.array(series, type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def to_dataframe(table, categorical=True):
+    """Converts an Arrow table to pandas, with native datetime64 dates."""
+    df = table.to_pandas(date_as_object=False)
+    if not categorical:
+        for col in df.select_dtypes(include='category').columns:
+            df[col] = df[col].astype(object)
+    return df
+
+
+def filter_dataframe(df, filters):
+    """Applies pyarrow-style (column, op, value) filters to a pandas DataFrame."""
+    mask = pd.Series(True, index=df.index)
+    for col, op, value in filters:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            # Dates are compared as timestamps, like Arrow compares date32 columns with date values
+            value = [pd.Timestamp(v) for v in value] if op in ('in', 'not in') else pd.Timestamp(value)
+        if op in ('=', '=='):
+            mask &= df[col] == value
+        elif op == '!=':
+            mask &= df[col] != value
+        elif op == '<':
+            mask &= df[col] < value
+        elif op == '<=':
+            mask &= df[col] <= value
+        elif op == '>':
+            mask &= df[col] > value
+        elif op == '>=':
+            mask &= df[col] >= value
+        elif op == 'in':
+            mask &= df[col].isin(value)
+        elif op == 'not in':
+            mask &= ~df[col].isin(value)
+        else:
+            raise ValueError(f"Unsupported filter operator '{op}'.")
+    return df[mask]
+
+
+def read_table(stage, columns=None, filters=None, row_groups=None, memory_map=True, fmt=None):
+    """
+    Reads a stage hand-off as an Arrow table.
+
+    Only the requested columns are decoded. Filters are (column, op, value) tuples and are pushed
+    down to Parquet row-group statistics so non-matching row groups are skipped. For the 'arrow'
+    format the file is memory-mapped and the returned table references the mapped buffers
+    without copying them.
+    """
+    fmt = fmt or STORAGE_FORMAT
+    path = stage_path(stage, fmt)
+
+    if fmt == 'parquet':
+        if row_groups is not None:
+            table = pq.ParquetFile(path, memory_map=memory_map).read_row_groups(row_groups, columns=columns)
+            if filters:
+                table = table.filter(pq.filters_to_expression(filters))
+            return table
+        return pq.read_table(path, columns=columns, filters=filters, memory_map=memory_map)
+
+    if fmt == 'arrow':
+        source = pa.memory_map(path, 'r') if memory_map else pa.OSFile(path, 'rb')
+        table = pa.ipc.open_file(source).read_all()
+        if filters:
+            table = table.filter(pq.filters_to_expression(filters))
+        if columns is not None:
+            table = table.select(columns)
+        return table
+
+    return pa.Table.from_pandas(read_frame(stage, columns=columns, filters=filters, fmt=fmt), preserve_index=False)
+
+
+def read_frame(stage, columns=None, filters=None, row_groups=None, memory_map=True, categorical=True, fmt=None):
+    """Reads a stage hand-off into a pandas DataFrame. See read_table for the arguments."""
+    fmt = fmt or STORAGE_FORMAT
+    if fmt == 'csv':
+        # Legacy hand-off: the first column is the index written by DataFrame.to_csv
+        date_columns = [field.name for field in STAGE_SCHEMAS[stage]
+                        if pa.types.is_timestamp(field.type) or pa.types.is_date(field.type)]
+        df = pd.read_csv(stage_path(stage, fmt), index_col=0, parse_dates=date_columns)
+        if filters:
+            df = filter_dataframe(df, filters)
+        if columns is not None:
+            df = df[columns]
+        return df
+
+    table = read_table(stage, columns=columns, filters=filters, row_groups=row_groups,
+                       memory_map=memory_map, fmt=fmt)
+    return to_dataframe(table, categorical=categorical)
+
+
+def take_rows(stage, row_indices, columns=None, fmt=None):
+    """
+    Reads the rows at the given positions (in that order) as a DataFrame. Positions count rows in
+    file order; for CSV they are not the saved index labels. For Parquet only the row
+    groups containing them are decoded, so a few rows of a wide text column cost a few row groups.
+    """
+    fmt = fmt or STORAGE_FORMAT
+    row_indices = np.asarray(row_indices, dtype=np.int64)
+
+    if fmt == 'csv':
+        return read_frame(stage, fmt=fmt, columns=columns).iloc[row_indices]
+    if fmt == 'arrow':
+        return to_dataframe(read_table(stage, columns=columns, fmt=fmt).take(row_indices), categorical=False)
+
+    parquet_file = pq.ParquetFile(stage_path(stage, fmt), memory_map=True)
+    group_sizes = [parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.num_row_groups)]
+    group_starts = np.concatenate([[0], np.cumsum(group_sizes)[:-1]]).astype(np.int64)
+    row_groups = np.searchsorted(group_starts, row_indices, side='right') - 1
+    selected_groups = np.unique(row_groups)
+    table = parquet_file.read_row_groups(selected_groups.tolist(), columns=columns)
+
+    # Position of every requested row inside the concatenation of the selected row groups
+    selected_sizes = np.asarray(group_sizes, dtype=np.int64)[selected_groups]
+    selected_starts = np.concatenate([[0], np.cumsum(selected_sizes)[:-1]]).astype(np.int64)
+    local_indices = selected_starts[np.searchsorted(selected_groups, row_groups)] + row_indices - group_starts[row_groups]
+    return to_dataframe(table.take(local_indices), categorical=False)
+
+
+def iter_frames(stage, batch_size=None, columns=None, categorical=True, fmt=None):
+    """
+    Yields a stage hand-off as DataFrames of at most batch_size rows, so consumers such as the
+    database loader never hold the whole file in memory.
+    """
+    fmt = fmt or STORAGE_FORMAT
+    batch_size = batch_size or ROW_GROUP_SIZE
+    path = stage_path(stage, fmt)
+
+    if fmt == 'csv':
+        for chunk in pd.read_csv(path, index_col=0, chunksize=batch_size):
+            yield chunk[columns] if columns is not None else chunk
+    elif fmt == 'parquet':
+        for batch in pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=batch_size, columns=columns):
+            yield to_dataframe(pa.Table.from_batches([batch]), categorical=categorical)
+    else:
+        table = read_table(stage, columns=columns, fmt=fmt)
+        for batch in table.to_batches(max_chunksize=batch_size):
+            yield to_dataframe(pa.Table.from_batches([batch]), categorical=categorical)
+
+
+def write_frame(df, stage, fmt=None):
+    """Writes a DataFrame as a stage hand-off using the stage's schema."""
+    with FrameWriter(stage, fmt=fmt) as writer:
+        writer.write(df)
+    return writer.path
+
+
+class FrameWriter:
+    """
+    Appends DataFrame chunks to a stage hand-off without holding the whole frame in memory.
+    Parquet chunks become row groups and CSV chunks are appended. Arrow chunks are written as record
+    batches; the IPC file format only allows a dictionary to grow, so dictionary columns are encoded
+    against the values seen so far and new values are written as dictionary deltas.
+    path overrides the stage's file (used for the partitions of a stage, see partitions.py).
+    """
+
+    def __init__(self, stage, fmt=None, path=None):
+        self.stage = stage
+        self.fmt = fmt or STORAGE_FORMAT
+        self.path = path or stage_path(stage, self.fmt)
+        self.schema = STAGE_SCHEMAS[stage]
+        self.rows_written = 0
+        self._started = False
+        self._parquet_writer = None
+        self._sink = None
+        self._ipc_writer = None
+        self._dictionaries = {field.name: pa.array([], type=field.type.value_type)
+                              for field in self.schema if pa.types.is_dictionary(field.type)}
+
+    def _open_ipc_writer(self):
+        self._sink = pa.OSFile(self.path, 'wb')
+        self._ipc_writer = pa.ipc.new_file(self._sink, self.schema,
+                                           options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+
+    def _encode_dictionaries(self, table):
+        """Re-encodes the dictionary columns against the values written so far, new values appended."""
+        columns = []
+        for field, column in zip(self.schema, table.columns):
+            if pa.types.is_dictionary(field.type):
+                values = column.cast(field.type.value_type)
+                seen = pc.unique(values.drop_null())
+                known = self._dictionaries[field.name]
+                known = pa.concat_arrays([known, seen.filter(pc.invert(pc.is_in(seen, value_set=known)))])
+                self._dictionaries[field.name] = known
+                indices = pc.index_in(values, value_set=known).cast(field.type.index_type)
+                column = pa.chunked_array([pa.DictionaryArray.from_arrays(chunk, known) for chunk in indices.chunks],
+                                          type=field.type)
+            columns.append(column)
+        return pa.Table.from_arrays(columns, schema=self.schema)
+
+    def write(self, df):
+        if self.fmt == 'csv':
+            df.to_csv(self.path, mode='a' if self._started else 'w', header=not self._started)
+        elif self.fmt == 'parquet':
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, self.schema)
+            self._parquet_writer.write_table(to_arrow_table(df, self.schema), row_group_size=ROW_GROUP_SIZE)
+        else:
+            if self._ipc_writer is None:
+                self._open_ipc_writer()
+            self._ipc_writer.write_table(self._encode_dictionaries(to_arrow_table(df, self.schema)))
+        self._started = True
+        self.rows_written += len(df)
+
+    def close(self):
+        if self.fmt == 'parquet':
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, self.schema)
+            self._parquet_writer.close()
+        elif self.fmt == 'arrow':
+            if self._ipc_writer is None:
+                self._open_ipc_writer()
+            self._ipc_writer.close()
+            self._sink.close()
+        elif not self._started:
+            pd.DataFrame(columns=self.schema.names).to_csv(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,88 @@
+import os
+import numpy as np
+import pandas as pd
+from wordcloud import WordCloud
+
+
+# --- Term Frequency Configuration ---
+# Word clouds are rendered from term counts computed once in the model stage instead of joining
+# and re-tokenizing the article text on every dashboard rerun. Counts are kept per
+# (source, year, category, cluster, sentiment) group, where source is the text column ('headline'
+# or 'content') and sentiment the compound bucket used by the sentiment word cloud. Only the
+# TERM_FREQUENCY_TOP_N most frequent terms of each group are kept (a word cloud shows 200 words).
+TERM_FREQUENCY_TOP_N = int(os.getenv("TERM_FREQUENCY_TOP_N", "200"))
+TERM_SOURCES = ['headline', 'content']
+TERM_GROUP_KEYS = ['year', 'category', 'cluster', 'sentiment']
+TERM_FREQUENCY_COLUMNS = ['source'] + TERM_GROUP_KEYS + ['term', 'count']
+
+# Compound score buckets of the sentiment word cloud
+POSITIVE_THRESHOLD = 0.5
+NEGATIVE_THRESHOLD = -0.5
+SENTIMENT_BUCKETS = ['positive', 'negative', 'neutral']
+
+
+def sentiment_buckets(compound):
+    """Maps compound scores to 'positive' (> 0.5), 'negative' (< -0.5) or 'neutral'."""
+    compound = np.asarray(compound)
+    return np.where(compound > POSITIVE_THRESHOLD, 'positive',
+                    np.where(compound < NEGATIVE_THRESHOLD, 'negative', 'neutral'))
+
+
+def build_term_frequencies(df, top_n=None):
+    """
+    Counts the terms of every text source per group with WordCloud's own tokenizer and stopwords.
+    df needs date (or year), category, cluster, compound and the TERM_SOURCES columns.
+    """
+    top_n = top_n or TERM_FREQUENCY_TOP_N
+    # Collocations (bigrams) and plural folding are not additive across groups: only single words
+    # are counted and plurals are folded after summing (see normalize_terms)
+    tokenizer = WordCloud(collocations=False, normalize_plurals=False)
+    groups = df.assign(year=df['date'].dt.year if 'year' not in df.columns else df['year'],
+                       sentiment=sentiment_buckets(df['compound']))
+
+    records = []
+    for source in TERM_SOURCES:
+        for key, texts in groups.groupby(TERM_GROUP_KEYS, observed=True, sort=True)[source]:
+            counts = tokenizer.process_text(" ".join(texts.dropna().astype(str)))
+            top_terms = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:top_n]
+            records.extend((source, *key, term, count) for term, count in top_terms)
+
+    frequencies = pd.DataFrame.from_records(records, columns=TERM_FREQUENCY_COLUMNS)
+    return frequencies.astype({'year': np.int16, 'cluster': np.int16, 'count': np.int32})
+
+
+def update_term_frequencies(previous, df, years, top_n=None):
+    """
+    Recomputes the groups of the given years from df (the full merged articles) and keeps the
+    previous counts of every other year. Used by incremental runs, which only touch recent years.
+    """
+    recomputed = build_term_frequencies(df[df['date'].dt.year.isin(years)], top_n)
+    kept = previous[~previous['year'].isin(years)]
+    return pd.concat([kept, recomputed], ignore_index=True)
+
+
+def normalize_terms(counts):
+    """
+    Folds summed term counts the way WordCloud.process_text folds the words of one text: case
+    variants are merged under their most frequent spelling, and a plural ending in 's' (not 'ss')
+    is merged into its singular when the singular occurs too.
+    """
+    variants = {}
+    for term, count in counts.items():
+        variants.setdefault(term.lower(), {})[term] = count
+    merged = {lower: [max(spellings, key=spellings.get), sum(spellings.values())]
+              for lower, spellings in variants.items()}
+    for lower in list(merged):
+        singular = lower[:-1]
+        if lower.endswith('s') and not lower.endswith('ss') and singular in merged:
+            merged[singular][1] += merged.pop(lower)[1]
+    return {spelling: int(count) for spelling, count in merged.values()}
+
+
+def sum_term_frequencies(frequencies, by):
+    """
+    Adds up term counts over the groups of a (filtered) frequency table, per value of the 'by' column.
+    Returns {value: {term: count}} ready for WordCloud.generate_from_frequencies.
+    """
+    summed = frequencies.groupby([by, 'term'], observed=True)['count'].sum()
+    return {value: normalize_terms(group.droplevel(0).to_dict()) for value, group in summed.groupby(level=0)}
@@ -0,0 +1,18 @@
+import os
+import sys
+import pytest
+
+# The pipeline modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def raw_conn():
+    """psycopg2 connection of the pipeline engine. The database tests only run with DB_HOST set."""
+    if 'DB_HOST' not in os.environ:
+        pytest.skip("set DB_HOST (and DB_NAME, DB_USER, DB_PORT) to run the database tests")
+    from db import get_engine
+    conn = get_engine().raw_connection()
+    yield conn
+    conn.rollback()
+    conn.close()
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+from bulk_loader import copy_frames
+
+COLUMNS = ['headline', 'cluster', 'compound']
+
+
+def frame_with_missing_values():
+    return pd.DataFrame({
+        'headline': ['complete', None, ''],
+        'cluster': pd.array([1, None, 3], dtype='Int16'),
+        'compound': [0.5, np.nan, -0.25],
+    })
+
+
+class RecordingCursor:
+    """Stands in for a psycopg2 cursor and keeps what copy_expert was given."""
+
+    def __init__(self):
+        self.copies = []
+
+    def copy_expert(self, sql, buffer):
+        self.copies.append((sql, buffer.read()))
+
+
+def test_missing_values_are_written_as_the_null_marker():
+    cur = RecordingCursor()
+    assert copy_frames(cur, 'articles', COLUMNS, [frame_with_missing_values()]) == 3
+
+    sql, data = cur.copies[0]
+    assert "NULL '\\N'" in sql and 'FORCE_NULL ("headline", "cluster", "compound")' in sql
+    rows = data.splitlines()
+    assert rows[0] == '"complete",1,0.5'
+    assert rows[1].split(',') == ['"\\N"', '"\\N"', '"\\N"']
+    assert rows[2] == '"",3,-0.25'
+
+
+def test_copy_loads_missing_values_as_null(raw_conn):
+    cur = raw_conn.cursor()
+    cur.execute("CREATE TEMP TABLE test_copy_nulls (headline TEXT, cluster SMALLINT, compound REAL);")
+    copy_frames(cur, 'test_copy_nulls', COLUMNS, [frame_with_missing_values()])
+    cur.execute("SELECT headline, cluster, compound FROM test_copy_nulls ORDER BY compound NULLS FIRST;")
+    assert cur.fetchall() == [(None, None, None), ('', 3, -0.25), ('complete', 1, 0.5)]
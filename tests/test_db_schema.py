@@ -0,0 +1,79 @@
+import datetime
+import pandas as pd
+import pytest
+from psycopg2.errors import CheckViolation
+import db_schema
+from bulk_loader import copy_frames
+
+TABLE = 'test_news_data_final'
+VIEW_SUFFIX = '_test'
+
+
+def articles():
+    return pd.DataFrame({
+        'date': [datetime.date(2024, 1, 5), datetime.date(2024, 1, 5), datetime.date(2024, 5, 2)],
+        'year': [2024, 2024, 2024],
+        'headline': ['a', 'b', 'c'],
+        'content': ['x', 'y', 'z'],
+        'web_url': ['https://example.com/a', 'https://example.com/b', 'https://example.com/c'],
+        'category': ['Science', 'Science', 'Travel'],
+        'day_of_week': ['Friday', 'Friday', 'Thursday'],
+        'cluster': [0, 0, 1],
+        'neg': [0.1, 0.0, 0.2],
+        'neu': [0.8, 0.5, 0.7],
+        'pos': [0.1, 0.5, 0.1],
+        'compound': [0.25, 0.75, -0.5],
+    })[db_schema.LOADED_COLUMNS]
+
+
+def create_schema(raw_conn):
+    """Builds the managed table, its indexes and its views under test names (rolled back by the fixture)."""
+    cur = raw_conn.cursor()
+    # New enum values have to be committed before rows can use them
+    db_schema.ensure_types(cur, ['Science', 'Travel'])
+    raw_conn.commit()
+    cur.execute(db_schema.create_table_sql(TABLE))
+    copy_frames(cur, TABLE, db_schema.LOADED_COLUMNS, [articles()])
+    for statement in db_schema.create_indexes_sql(TABLE) + db_schema.create_views_sql(TABLE, VIEW_SUFFIX):
+        cur.execute(statement)
+    return cur
+
+
+def test_indexes_use_their_access_methods(raw_conn):
+    cur = create_schema(raw_conn)
+    cur.execute("SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s;", (TABLE,))
+    indexes = dict(cur.fetchall())
+    assert set(indexes) == {f"{TABLE}_{suffix}_idx" for suffix in db_schema.TABLE_INDEXES}
+    assert 'USING brin (date)' in indexes[f"{TABLE}_date_brin_idx"]
+    assert 'USING btree (category, date)' in indexes[f"{TABLE}_category_date_idx"]
+
+
+def test_generated_calendar_columns(raw_conn):
+    cur = create_schema(raw_conn)
+    cur.execute(f"SELECT month, quarter FROM {TABLE} ORDER BY date, web_url;")
+    assert cur.fetchall() == [(1, 1), (1, 1), (5, 2)]
+
+
+def test_views_aggregate_per_grain_and_refresh(raw_conn):
+    cur = create_schema(raw_conn)
+    cur.execute(f"""SELECT date, category::TEXT, cluster, n_articles, mean_compound, min_compound, max_compound,
+                           sum_compound, sumsq_compound
+                    FROM news_sentiment_daily{VIEW_SUFFIX} ORDER BY date;""")
+    assert cur.fetchall() == [
+        (datetime.date(2024, 1, 5), 'Science', 0, 2, 0.5, 0.25, 0.75, 1.0, 0.625),
+        (datetime.date(2024, 5, 2), 'Travel', 1, 1, -0.5, -0.5, -0.5, -0.5, 0.25),
+    ]
+    cur.execute(f"SELECT year, quarter, n_articles FROM news_sentiment_quarterly{VIEW_SUFFIX} ORDER BY quarter;")
+    assert cur.fetchall() == [(2024, 1, 2), (2024, 2, 1)]
+
+    cur.execute(f"DELETE FROM {TABLE} WHERE web_url = 'https://example.com/b';")
+    cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY news_sentiment_monthly{VIEW_SUFFIX};")
+    cur.execute(f"SELECT month, n_articles, max_compound FROM news_sentiment_monthly{VIEW_SUFFIX} ORDER BY month;")
+    assert cur.fetchall() == [(1, 1, 0.25), (5, 1, -0.5)]
+
+
+def test_compound_is_checked(raw_conn):
+    cur = create_schema(raw_conn)
+    with pytest.raises(CheckViolation):
+        cur.execute(f"""INSERT INTO {TABLE} (date, year, web_url, category, cluster, compound)
+                        VALUES ('2024-01-01', 2024, 'u', 'Science', 0, 1.5);""")
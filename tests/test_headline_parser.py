@@ -0,0 +1,39 @@
+import ast
+import pandas as pd
+import pytest
+from headline_parser import extract_main_headlines
+
+# Headline dicts as they appear in nyt-metadata.csv, including the quoting and escaping variants
+SAMPLE_HEADLINES = [
+    "{'main': 'Apple Unveils a Bigger iPhone', 'kicker': None, 'content_kicker': None, 'print_headline': 'Apple Unveils a Bigger iPhone', 'name': None, 'seo': None, 'sub': None}",
+    "{'main': 'A Chef’s Guide to Summer Tomatoes', 'kicker': 'Eat', 'content_kicker': None, 'print_headline': 'Summer Tomatoes', 'name': None, 'seo': None, 'sub': None}",
+    "{'main': \"Serena Williams's Comeback Bid Ends in Paris\", 'kicker': None, 'content_kicker': None, 'print_headline': None, 'name': None, 'seo': None, 'sub': None}",
+    "{'main': 'The \"Best\" Time to Visit Japan\\'s Temples', 'kicker': None, 'content_kicker': None, 'print_headline': None, 'name': None, 'seo': None, 'sub': None}",
+    "{'main': 'Measles Cases Rise Again\\nIn 2019', 'kicker': None, 'content_kicker': None, 'print_headline': None, 'name': None, 'seo': None, 'sub': None}",
+    "{'main': 'Backslash \\\\ in a Headline', 'kicker': None}",
+    "{'main': \"Quote \\\" Escaped\", 'kicker': None}",
+    "{'main': None, 'kicker': None, 'content_kicker': None, 'print_headline': 'Corrections', 'name': None, 'seo': None, 'sub': None}",
+    "{'main': '', 'kicker': None, 'content_kicker': None, 'print_headline': None, 'name': None, 'seo': None, 'sub': None}",
+    "{'print_headline': 'Keys in a Different Order', 'main': 'Keys in a Different Order', 'kicker': None}",
+    "{'main': 'Ünïcödé — Headline', 'kicker': None}",
+]
+
+
+def previous_behaviour(headlines):
+    """The per-row parsing data_cleaning.py used before the vectorized extract."""
+    return headlines.apply(lambda x: ast.literal_eval(x)['main'])
+
+
+@pytest.mark.parametrize('headline', SAMPLE_HEADLINES)
+def test_each_headline_matches_literal_eval(headline):
+    headlines = pd.Series([headline])
+    assert extract_main_headlines(headlines).tolist() == previous_behaviour(headlines).tolist()
+
+
+def test_mixed_series_matches_literal_eval():
+    # Fast-path and fallback rows interleaved, with the gappy index of a filtered frame
+    headlines = pd.Series(SAMPLE_HEADLINES * 3, index=range(7, 7 + 5 * len(SAMPLE_HEADLINES) * 3, 5))
+    actual = extract_main_headlines(headlines)
+    expected = previous_behaviour(headlines)
+    assert actual.index.equals(expected.index)
+    assert actual.tolist() == expected.tolist()
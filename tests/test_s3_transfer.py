@@ -0,0 +1,140 @@
+import os
+import pytest
+import s3_transfer
+from s3_transfer import create_s3_client, upload_file, download_file, object_key
+
+moto = pytest.importorskip('moto')
+
+BUCKET = 'test-bucket'
+CHUNK_SIZE_MB = 5   # The smallest part size S3 accepts
+CHUNK_SIZE = CHUNK_SIZE_MB * 1024 ** 2
+
+
+@pytest.fixture
+def s3(monkeypatch, tmp_path):
+    """moto S3 client with an empty bucket, working in tmp_path."""
+    for name in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY'):
+        monkeypatch.setenv(name, 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(s3_transfer, 'S3_ENDPOINT_URL', None)
+    monkeypatch.setattr(s3_transfer, 'S3_CHUNK_SIZE_MB', CHUNK_SIZE_MB)
+    monkeypatch.setattr(s3_transfer, 'S3_COMPRESSION', 'none')
+    with moto.mock_aws():
+        client = create_s3_client()
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def write_file(path, size):
+    data = os.urandom(size)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return data
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def record_calls(monkeypatch, client, method, failing_call=None):
+    """Records the calls of a client method, the failing_call-th one (1-based) raises. Returns the calls."""
+    original = getattr(client, method)
+    calls = []
+
+    def wrapper(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == failing_call:
+            raise ConnectionError(f"{method} interrupted")
+        return original(**kwargs)
+
+    monkeypatch.setattr(client, method, wrapper)
+    return calls
+
+
+def test_multipart_upload_and_skip_when_unchanged(s3, tmp_path):
+    path = str(tmp_path / 'raw_data.parquet')
+    data = write_file(path, 2 * CHUNK_SIZE + 1000)
+
+    assert upload_file(s3, path, BUCKET) is True
+    head = s3.head_object(Bucket=BUCKET, Key='raw_data.parquet')
+    assert head['ETag'].strip('"').endswith('-3')
+    assert s3.get_object(Bucket=BUCKET, Key='raw_data.parquet')['Body'].read() == data
+
+    assert upload_file(s3, path, BUCKET) is False
+    write_file(path, 2 * CHUNK_SIZE + 1000)
+    assert upload_file(s3, path, BUCKET) is True
+
+
+def test_ranged_download_and_skip_when_local_matches(s3, tmp_path, monkeypatch):
+    source = str(tmp_path / 'raw_data.parquet')
+    data = write_file(source, 2 * CHUNK_SIZE + 1000)
+    upload_file(s3, source, BUCKET)
+
+    target = str(tmp_path / 'downloaded_data.parquet')
+    get_calls = record_calls(monkeypatch, s3, 'get_object')
+    assert download_file(s3, target, BUCKET, 'raw_data.parquet') is True
+    assert read_file(target) == data
+    assert len(get_calls) == 3   # One ranged GET per part
+    assert not os.path.exists(target + s3_transfer.PARTIAL_SUFFIX)
+
+    assert download_file(s3, target, BUCKET, 'raw_data.parquet') is False
+
+
+def test_zstd_round_trip(s3, tmp_path):
+    pytest.importorskip('zstandard')
+    path = str(tmp_path / 'raw_data.csv')
+    data = b'pub_date,headline\n' + b'2024-01-01,"{\'main\': \'Some headline\'}"\n' * 200000
+    with open(path, 'wb') as f:
+        f.write(data)
+
+    assert upload_file(s3, path, BUCKET, compression='zstd') is True
+    key = object_key(path, 'zstd')
+    assert key == 'raw_data.csv.zst'
+    head = s3.head_object(Bucket=BUCKET, Key=key)
+    assert head['ContentLength'] < len(data) and head['Metadata']['compression'] == 'zstd'
+    assert not os.path.exists(path + '.zst')
+    assert upload_file(s3, path, BUCKET, compression='zstd') is False
+
+    target = str(tmp_path / 'downloaded_data.csv')
+    assert download_file(s3, target, BUCKET, key) is True
+    assert read_file(target) == data
+    assert download_file(s3, target, BUCKET, key) is False
+
+
+def test_interrupted_upload_resumes_with_the_missing_parts(s3, tmp_path, monkeypatch):
+    path = str(tmp_path / 'raw_data.parquet')
+    data = write_file(path, 3 * CHUNK_SIZE + 1000)
+
+    calls = record_calls(monkeypatch, s3, 'upload_part', failing_call=3)
+    with pytest.raises(ConnectionError):
+        upload_file(s3, path, BUCKET, concurrency=1)
+    uploads = s3.list_multipart_uploads(Bucket=BUCKET).get('Uploads', [])
+    assert [upload['Key'] for upload in uploads] == ['raw_data.parquet']
+
+    calls.clear()
+    assert upload_file(s3, path, BUCKET, concurrency=1) is True
+    # The parts submitted with the failed one still completed, only that part is sent again
+    assert [call['PartNumber'] for call in calls] == [3]
+    assert s3.get_object(Bucket=BUCKET, Key='raw_data.parquet')['Body'].read() == data
+    assert not s3.list_multipart_uploads(Bucket=BUCKET).get('Uploads')
+
+
+def test_interrupted_download_resumes_with_the_missing_parts(s3, tmp_path, monkeypatch):
+    source = str(tmp_path / 'raw_data.parquet')
+    data = write_file(source, 3 * CHUNK_SIZE + 1000)
+    upload_file(s3, source, BUCKET)
+
+    target = str(tmp_path / 'downloaded_data.parquet')
+    calls = record_calls(monkeypatch, s3, 'get_object', failing_call=2)
+    with pytest.raises(ConnectionError):
+        download_file(s3, target, BUCKET, 'raw_data.parquet', concurrency=1)
+    assert not os.path.exists(target)
+    assert os.path.exists(target + s3_transfer.PROGRESS_SUFFIX)
+
+    calls.clear()
+    assert download_file(s3, target, BUCKET, 'raw_data.parquet', concurrency=1) is True
+    assert [call['Range'] for call in calls] == [f"bytes={CHUNK_SIZE}-{2 * CHUNK_SIZE - 1}"]   # Part 2 only
+    assert read_file(target) == data
+    assert not os.path.exists(target + s3_transfer.PROGRESS_SUFFIX)
@@ -0,0 +1,56 @@
+import os
+import pandas as pd
+import pyarrow as pa
+import pytest
+import storage
+from storage import FrameWriter, read_frame, read_table
+
+
+@pytest.fixture(autouse=True)
+def storage_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(storage, 'STORAGE_DIR', str(tmp_path))
+
+
+def raw_chunk(sections, start):
+    return pd.DataFrame({
+        'pub_date': pd.date_range('2024-01-01', periods=len(sections), freq='h', tz='UTC') + pd.Timedelta(days=start),
+        'headline': [f"headline {start + i}" for i in range(len(sections))],
+        'abstract': ['abstract'] * len(sections),
+        'lead_paragraph': ['lead'] * len(sections),
+        'section_name': sections,
+        'web_url': [f"https://example.com/{start + i}" for i in range(len(sections))],
+    })
+
+
+@pytest.mark.parametrize('fmt', ['arrow', 'parquet'])
+def test_chunks_with_different_categories_round_trip(fmt):
+    chunks = [raw_chunk(['World', 'Arts', None], 0), raw_chunk(['Sports', 'World'], 3), raw_chunk([], 5),
+              raw_chunk(['Arts', 'Travel'], 5)]
+    with FrameWriter('raw', fmt=fmt) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    assert writer.rows_written == 7
+
+    expected = pd.concat(chunks, ignore_index=True)
+    df = read_frame('raw', fmt=fmt, categorical=False)
+    assert df['section_name'].tolist() == expected['section_name'].tolist()
+    assert df['headline'].tolist() == expected['headline'].tolist()
+    assert read_table('raw', fmt=fmt).schema.field('section_name').type == storage.CATEGORY_TYPE
+
+
+def test_arrow_chunks_are_written_as_they_arrive():
+    path = storage.stage_path('raw', 'arrow')
+    with FrameWriter('raw', fmt='arrow') as writer:
+        writer.write(raw_chunk(['World', 'Arts'], 0))
+        size = os.path.getsize(path)
+        writer.write(raw_chunk(['Sports'], 2))
+        assert os.path.getsize(path) > size > 0
+    reader = pa.ipc.open_file(path)
+    assert reader.num_record_batches == 2
+    # Every batch shares the dictionary of the file, new values were appended to it
+    assert reader.get_batch(1).column('section_name').dictionary.to_pylist() == ['World', 'Arts', 'Sports']
+
+
+def test_empty_arrow_writer_writes_the_schema():
+    FrameWriter('raw', fmt='arrow').close()
+    assert read_table('raw', fmt='arrow').schema == storage.RAW_SCHEMA
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+import storage
+from dashboard_queries import read_top_articles
+
+
+def final_frame(n=40):
+    """A final hand-off whose index has gaps, like the filtered frames model.py writes."""
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'date': pd.date_range('2024-01-01', periods=n, freq='D').date,
+        'headline': [f"headline {i}" for i in range(n)],
+        'content': [f"content {i}" for i in range(n)],
+        'web_url': [f"https://example.com/{i}" for i in range(n)],
+        'category': np.where(np.arange(n) % 2 == 0, 'Science', 'Travel'),
+        'day_of_week': 'Monday',
+        'year': 2024,
+        'cluster': np.arange(n) % 3,
+        'neg': 0.0,
+        'neu': 1.0,
+        'pos': 0.0,
+        'compound': rng.uniform(-1, 1, n).round(4),
+    }, index=np.arange(5, 5 + 3 * n, 3))
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow', 'csv'])
+@pytest.mark.parametrize('ascending', [False, True])
+def test_read_top_articles_with_non_contiguous_index(tmp_path, monkeypatch, fmt, ascending):
+    monkeypatch.setattr(storage, 'STORAGE_DIR', str(tmp_path))
+    monkeypatch.setattr(storage, 'STORAGE_FORMAT', fmt)
+    df = final_frame()
+    storage.write_frame(df, 'final')
+
+    top = read_top_articles(['headline', 'compound'], [('category', '==', 'Travel')], 5, ascending=ascending)
+
+    expected = df[df['category'] == 'Travel'].sort_values('compound', ascending=ascending).head(5)
+    assert top['headline'].tolist() == expected['headline'].tolist()
+    assert np.allclose(top['compound'], expected['compound'])